@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""Benchmark: lobby operations with 10k players waiting.
+
+Compares the Matchmaker (per-rule FIFO + player index) against the old
+list-of-dicts lobby that lobby_join used to scan, sort and rebuild.
+
+    python backend/bench/bench_matchmaking.py [waiting]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from matchmaking import Matchmaker  # noqa: E402
+
+RULES = ('classic', 'speed', 'challenge')
+
+
+class LegacyLobby:
+    # the previous WAITING_BY_RULE handling from main.py
+    def __init__(self, group_size):
+        self.group_size = group_size
+        self.waiting = {}
+
+    def position(self, pid):
+        for r, entries in self.waiting.items():
+            for i, e in enumerate(entries):
+                if e['player_id'] == pid:
+                    return r, i + 1, len(entries)
+        return None
+
+    def join(self, pid, rule, now):
+        if self.position(pid):
+            return False
+        self.waiting.setdefault(rule, []).append({'player_id': pid, 'joined_at': now})
+        return True
+
+    def leave(self, pid):
+        removed = False
+        for rule, lst in list(self.waiting.items()):
+            newlst = [e for e in lst if e['player_id'] != pid]
+            if len(newlst) != len(lst):
+                removed = True
+                self.waiting[rule] = newlst
+        return removed
+
+    def pop_groups(self, rule):
+        lst = self.waiting.get(rule, [])
+        groups = []
+        while len(lst) >= self.group_size:
+            lst.sort(key=lambda e: e['joined_at'])
+            groups.append(lst[:self.group_size])
+            lst = lst[self.group_size:]
+        self.waiting[rule] = lst
+        return groups
+
+
+def timed(label, fn, ops):
+    t0 = time.perf_counter()
+    fn()
+    dt = time.perf_counter() - t0
+    print(f"  {label:<28} {dt * 1e6 / ops:>10.2f} us/op  ({ops} ops)")
+
+
+def run(name, lobby, waiting):
+    print(f"{name}:")
+    pids = [f"p{i}" for i in range(waiting)]
+    rules = [random.choice(RULES) for _ in pids]
+
+    def fill():
+        for i, pid in enumerate(pids):
+            lobby.join(pid, rules[i], float(i))
+    timed('join (fill to N)', fill, waiting)
+
+    sample = random.sample(pids, 1000)
+    timed('position / duplicate check', lambda: [lobby.position(p) for p in sample], len(sample))
+    leavers = sample[:200]
+    timed('leave', lambda: [lobby.leave(p) for p in leavers], len(leavers))
+    timed('rejoin', lambda: [lobby.join(p, 'classic', 1e9) for p in leavers], len(leavers))
+
+    # batch game creation once groups become possible
+    lobby.group_size = 3
+    created = []
+    timed('pop_groups (all rules)', lambda: [created.extend(lobby.pop_groups(r)) for r in RULES], waiting)
+    print(f"  games created: {len(created)}")
+
+
+def main():
+    waiting = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    random.seed(1)
+    # group size above N keeps everyone waiting during the join/position/leave phase
+    run('Matchmaker', Matchmaker(group_size=waiting + 1), waiting)
+    random.seed(1)
+    run('legacy lists', LegacyLobby(group_size=waiting + 1), waiting)
+
+
+if __name__ == '__main__':
+    main()
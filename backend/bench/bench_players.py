@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""Microbenchmark: session_token -> player_id lookup as the player count grows.
+
+Compares PlayerRegistry's token index against the old linear scan over PLAYERS.
+
+    python backend/bench/bench_players.py
+"""
+import os
+import sys
+import timeit
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from players import PlayerRegistry  # noqa: E402
+
+
+def linear_scan(players: dict, token: str):
+    for pid, pdata in players.items():
+        if pdata.get('session_token') == token:
+            return pid
+    return None
+
+
+def main():
+    print(f"{'players':>8} {'registry us/op':>15} {'linear us/op':>13}")
+    for n in (100, 1_000, 10_000, 100_000):
+        registry = PlayerRegistry()
+        legacy = {}
+        tokens = []
+        for i in range(n):
+            p = registry.register(f"player{i}")
+            legacy[p.player_id] = {'nickname': p.nickname, 'last_seen': p.last_seen, 'session_token': p.session_token}
+            tokens.append(p.session_token)
+        # worst case for the scan: the most recently registered player
+        token = tokens[-1]
+        assert registry.resolve(None, token) == linear_scan(legacy, token)
+        loops = 100_000
+        reg = timeit.timeit(lambda: registry.resolve(None, token), number=loops) / loops * 1e6
+        scan_loops = max(10, 1_000_000 // n)
+        lin = timeit.timeit(lambda: linear_scan(legacy, token), number=scan_loops) / scan_loops * 1e6
+        print(f"{n:>8} {reg:>15.3f} {lin:>13.1f}")
+    # unknown tokens are also O(1)
+    registry.resolve(None, uuid.uuid4().hex)
+
+
+if __name__ == '__main__':
+    main()
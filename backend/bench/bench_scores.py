@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""Benchmark: score submit latency as the score history grows.
+
+Compares ScoreJournal.append (in-memory append + hand-off to the background
+writer) against the old full scores.json rewrite with indent=2 per submit.
+
+    python backend/bench/bench_scores.py
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from score_journal import ScoreJournal  # noqa: E402
+
+
+def record(i: int) -> dict:
+    return {'player': f"player{i % 500}", 'score': (i * 37) % 1100, 'time': 300,
+            'meta': {'correct': 10, 'total': 10, 'wrong': 0, 'accuracy': 1.0}}
+
+
+def legacy_submit(scores: dict, path: str, rec: dict):
+    scores['solo'].append(rec)
+    with open(path, 'w', encoding='utf-8') as sf:
+        json.dump(scores, sf, ensure_ascii=False, indent=2)
+
+
+def main():
+    submits = 200
+    tmp = tempfile.mkdtemp(prefix='bench_scores_')
+    try:
+        print(f"{'history':>8} {'journal us/submit':>18} {'rewrite us/submit':>18} {'fsyncs':>7}")
+        for history in (1_000, 10_000, 100_000):
+            path = os.path.join(tmp, f"scores_{history}.json")
+            with open(path, 'w', encoding='utf-8') as sf:
+                json.dump({'solo': [record(i) for i in range(history)], 'rta': [], 'vs': []}, sf)
+            journal = ScoreJournal(path, compact_lines=0)
+            journal.load()
+            journal.start()
+            t0 = time.perf_counter()
+            for i in range(submits):
+                journal.append('solo', record(history + i))
+            jr = (time.perf_counter() - t0) / submits * 1e6
+            journal.stop()
+            assert journal.appended == submits
+
+            legacy = {'solo': [record(i) for i in range(history)], 'rta': [], 'vs': []}
+            legacy_path = os.path.join(tmp, f"legacy_{history}.json")
+            loops = max(3, min(submits, 200_000 // history))
+            t0 = time.perf_counter()
+            for i in range(loops):
+                legacy_submit(legacy, legacy_path, record(history + i))
+            lr = (time.perf_counter() - t0) / loops * 1e6
+            print(f"{history:>8} {jr:>18.1f} {lr:>18.1f} {journal.flushes:>7}")
+
+        # startup cost: snapshot + journal replay, then compaction back to a single snapshot
+        journal = ScoreJournal(path, compact_lines=0)
+        t0 = time.perf_counter()
+        journal.load()
+        load_ms = (time.perf_counter() - t0) * 1e3
+        t0 = time.perf_counter()
+        journal.compact()
+        compact_ms = (time.perf_counter() - t0) * 1e3
+        journal.stop()
+        print(f"replay of {len(journal.scores['solo'])} records: {load_ms:.1f} ms, compaction: {compact_ms:.1f} ms")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+"""End-to-end load test: a swarm of virtual players against the backend.
+
+Each virtual player follows the frontend's call pattern and timings:
+
+    /register -> /heartbeat every 15s, /server/stats every 5s
+    /lobby/join polled every 3s until matched
+    per question: /game/{id}/question, /ask_ai (SSE, like the frontend),
+                  /game/{id}/submit_answer, /game/{id}/state every other answer
+    done -> /game/{id}/state polled every 2s until final_ranking
+    /scores/submit, then back to the lobby
+
+/ask_ai goes to a mock OpenAI-compatible LM (mock_lm.py) with configurable
+latency and failure rates. By default the backend runs in this process under
+uvicorn on a free port, with its stdout silenced; with --url it targets an
+already running server (start it with LMSTUDIO_API_URL pointing at a mock
+LM, or let this script start one and pass it via the lm_server field).
+
+    python backend/bench/loadtest.py --players 200 --duration 60
+    python backend/bench/loadtest.py --players 200 --save-baseline bench/baseline.json
+    python backend/bench/loadtest.py --players 200 --baseline bench/baseline.json   # exit 1 on regression
+    python backend/bench/loadtest.py --url http://127.0.0.1:8000 --players 1000 --lm-latency-ms 800
+
+--pace scales every client interval (0.1 = ten times the frontend's rate).
+In-process numbers include the load generator's own CPU use; run the server
+separately (--url) when measuring absolute capacity.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from mock_lm import MockLM  # noqa: E402
+
+# frontend timings (seconds)
+HEARTBEAT_INTERVAL = 15.0
+STATS_INTERVAL = 5.0
+LOBBY_POLL_INTERVAL = 3.0
+STATE_POLL_INTERVAL = 2.0
+MAX_FINAL_POLLS = 60
+
+# relative regression thresholds for --baseline
+P95_FLOOR_MS = 2.0  # ignore p95 changes smaller than this (noise on sub-ms routes)
+
+PROMPTS = [
+    'この国の首都はどこにありますか？',
+    '日本で一番高い山について教えてください。',
+    'この動物は何を食べて生きていますか？',
+    'その出来事は何年に起きましたか？',
+    'この料理の主な材料は何ですか？',
+]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    idx = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}  # endpoint -> [ms]
+        self.errors = {}  # endpoint -> count
+        self.games_finished = 0
+        self.started = None
+        self.stopped = None
+
+    def record(self, endpoint: str, ms: float, ok: bool):
+        self.latencies.setdefault(endpoint, []).append(ms)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self) -> dict:
+        elapsed = (self.stopped or time.monotonic()) - self.started
+        out = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            vals = sorted(values)
+            out[endpoint] = {
+                'count': len(vals),
+                'errors': self.errors.get(endpoint, 0),
+                'rps': len(vals) / elapsed,
+                'p50_ms': percentile(vals, 50),
+                'p95_ms': percentile(vals, 95),
+                'p99_ms': percentile(vals, 99),
+                'max_ms': vals[-1],
+            }
+        total = sum(len(v) for v in self.latencies.values())
+        return {
+            'elapsed_s': elapsed,
+            'requests': total,
+            'rps': total / elapsed,
+            'errors': sum(self.errors.values()),
+            'games_finished': self.games_finished,
+            'endpoints': out,
+        }
+
+
+class VirtualPlayer:
+    def __init__(self, index: int, client: httpx.AsyncClient, rec: Recorder, args, lm_url: str, deadline: float):
+        self.index = index
+        self.client = client
+        self.rec = rec
+        self.args = args
+        self.lm_url = lm_url
+        self.deadline = deadline
+        self.rng = random.Random(index)
+        self.player_id = None
+        self.token = None
+
+    def running(self) -> bool:
+        return time.monotonic() < self.deadline
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(seconds * self.args.pace * self.rng.uniform(0.8, 1.2))
+
+    async def call(self, endpoint: str, method: str, path: str, **kwargs):
+        start = time.perf_counter()
+        ok = False
+        data = None
+        try:
+            res = await self.client.request(method, path, **kwargs)
+            ok = res.status_code < 400
+            if ok:
+                data = res.json()
+        except (httpx.HTTPError, ValueError):
+            pass
+        self.rec.record(endpoint, (time.perf_counter() - start) * 1000.0, ok)
+        return data or {}
+
+    async def ask_ai(self):
+        # streamed like the frontend; latency is measured until the final `done` event
+        if self.rng.random() < self.args.cache_hit_ratio:
+            question = self.rng.choice(PROMPTS)
+        else:
+            question = f"{self.rng.choice(PROMPTS)}（{self.index}-{self.rng.randrange(10 ** 9)}）"
+        body = {'question': question, 'target_answer': '東京', 'mode': 'vs', 'stream': True}
+        if self.lm_url:
+            body['lm_server'] = self.lm_url
+        start = time.perf_counter()
+        ok = False
+        try:
+            async with self.client.stream('POST', '/ask_ai', json=body) as res:
+                async for line in res.aiter_lines():
+                    if line.startswith('event: done'):
+                        ok = res.status_code < 400
+        except httpx.HTTPError:
+            pass
+        self.rec.record('POST /ask_ai', (time.perf_counter() - start) * 1000.0, ok)
+
+    async def background(self, interval: float, fn):
+        while self.running():
+            await self.sleep(interval)
+            await fn()
+
+    def auth(self, **extra) -> dict:
+        return dict(player_id=self.player_id, session_token=self.token, **extra)
+
+    async def run(self):
+        await asyncio.sleep(self.args.ramp * self.index / max(1, self.args.players))
+        reg = await self.call('POST /register', 'POST', '/register', json={'nickname': f'vp{self.index}'})
+        if not reg.get('player_id'):
+            return
+        self.player_id, self.token = reg['player_id'], reg.get('session_token')
+        tasks = [
+            asyncio.ensure_future(self.background(HEARTBEAT_INTERVAL, lambda: self.call('POST /heartbeat', 'POST', '/heartbeat', json=self.auth()))),
+            asyncio.ensure_future(self.background(STATS_INTERVAL, lambda: self.call('GET /server/stats', 'GET', '/server/stats'))),
+        ]
+        try:
+            while self.running():
+                game_id = await self.find_game()
+                if game_id:
+                    await self.play(game_id)
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    async def find_game(self):
+        while self.running():
+            res = await self.call('POST /lobby/join', 'POST', '/lobby/join', json=self.auth(rule=self.args.rule))
+            if res.get('game_id'):
+                return res['game_id']
+            await self.sleep(LOBBY_POLL_INTERVAL)
+        return None
+
+    async def play(self, game_id: str):
+        base = f'/game/{game_id}'
+        started = time.monotonic()
+        correct = 0
+        for k in range(self.args.questions):
+            await self.call('GET /game/{id}/question', 'GET', f'{base}/question', params={'player_id': self.player_id})
+            if self.rng.random() < self.args.ask_ratio:
+                await self.ask_ai()
+            hit = self.rng.random() < 0.6
+            correct += hit
+            await self.call('POST /game/{id}/submit_answer', 'POST', f'{base}/submit_answer',
+                            json=self.auth(correct=False, score_delta=10 if hit else 0))
+            if k % 2:
+                await self.call('GET /game/{id}/state', 'GET', f'{base}/state')
+            await self.sleep(self.args.think)
+        await self.call('POST /game/{id}/submit_answer', 'POST', f'{base}/submit_answer', json=self.auth(done=True))
+        # keep polling past the deadline so games in progress finish and get counted
+        for _ in range(MAX_FINAL_POLLS):
+            state = await self.call('GET /game/{id}/state', 'GET', f'{base}/state')
+            if state.get('final_ranking') or state.get('error'):
+                self.rec.games_finished += 1
+                break
+            await self.sleep(STATE_POLL_INTERVAL)
+        await self.call('POST /scores/submit', 'POST', '/scores/submit', json=self.auth(
+            mode='solo', correct_count=correct, total_questions=self.args.questions,
+            time_seconds=int(time.monotonic() - started)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_inprocess_server(args):
+    # the real app under uvicorn on loopback, same process, its own thread and event loop
+    os.environ.setdefault('SCORES_FILE', os.path.join(tempfile.mkdtemp(prefix='loadtest-'), 'scores.json'))
+    os.environ.setdefault('LM_READ_TIMEOUT', str(args.lm_timeout))
+    import uvicorn
+    with contextlib.redirect_stdout(open(os.devnull, 'w')) if not args.verbose else contextlib.nullcontext():
+        import main as server
+    port = free_port()
+    config = uvicorn.Config(server.app, host='127.0.0.1', port=port, log_level='warning', lifespan='on')
+    srv = uvicorn.Server(config)
+    thread = threading.Thread(target=srv.run, name='backend', daemon=True)
+    thread.start()
+    while not srv.started:
+        time.sleep(0.05)
+    return f'http://127.0.0.1:{port}', srv, thread
+
+
+async def run_swarm(base_url: str, lm_url: str, args) -> Recorder:
+    rec = Recorder()
+    limits = httpx.Limits(max_connections=args.players * 2 + 10, max_keepalive_connections=args.players * 2 + 10)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=httpx.Timeout(60.0)) as client:
+        rec.started = time.monotonic()
+        deadline = rec.started + args.duration
+        players = [VirtualPlayer(i, client, rec, args, lm_url, deadline) for i in range(args.players)]
+        await asyncio.gather(*(p.run() for p in players), return_exceptions=True)
+        rec.stopped = time.monotonic()
+    return rec
+
+
+def print_report(summary: dict, lm_counts: dict = None):
+    print(f"\n{summary['requests']} requests in {summary['elapsed_s']:.1f}s = {summary['rps']:.1f} req/s, "
+          f"{summary['errors']} errors, {summary['games_finished']} games finished")
+    print(f"{'endpoint':<34}{'count':>8}{'err':>6}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for endpoint, s in summary['endpoints'].items():
+        print(f"{endpoint:<34}{s['count']:>8}{s['errors']:>6}{s['rps']:>9.1f}"
+              f"{s['p50_ms']:>9.1f}{s['p95_ms']:>9.1f}{s['p99_ms']:>9.1f}{s['max_ms']:>9.1f}")
+    if lm_counts:
+        print(f"mock LM: {lm_counts}")
+
+
+def compare(summary: dict, baseline: dict, tolerance: float) -> list:
+    # regressions: p95 up by more than tolerance (and P95_FLOOR_MS), throughput down by more than tolerance
+    problems = []
+    print(f"\nvs baseline (tolerance {tolerance:.0%}):")
+    for endpoint, base in baseline.get('endpoints', {}).items():
+        cur = summary['endpoints'].get(endpoint)
+        if cur is None:
+            problems.append(f"{endpoint}: no requests in this run")
+            continue
+        dp95 = cur['p95_ms'] - base['p95_ms']
+        drps = (cur['rps'] - base['rps']) / base['rps'] if base['rps'] else 0.0
+        flag = ''
+        if dp95 > P95_FLOOR_MS and cur['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            flag = '  REGRESSION (p95)'
+            problems.append(f"{endpoint}: p95 {base['p95_ms']:.1f} -> {cur['p95_ms']:.1f} ms")
+        elif drps < -tolerance:
+            flag = '  REGRESSION (rps)'
+            problems.append(f"{endpoint}: rps {base['rps']:.1f} -> {cur['rps']:.1f}")
+        print(f"  {endpoint:<34} p95 {base['p95_ms']:>8.1f} -> {cur['p95_ms']:>8.1f} ms   rps {drps:+7.1%}{flag}")
+    base_err = baseline.get('errors', 0) / max(1, baseline.get('requests', 1))
+    cur_err = summary['errors'] / max(1, summary['requests'])
+    if cur_err > base_err + 0.01:
+        problems.append(f"error rate {base_err:.2%} -> {cur_err:.2%}")
+    return problems
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--url', help='target a running backend instead of starting one in-process')
+    ap.add_argument('--players', type=int, default=100)
+    ap.add_argument('--duration', type=float, default=60.0, help='seconds; games in progress are played out')
+    ap.add_argument('--ramp', type=float, default=10.0, help='seconds over which players arrive')
+    ap.add_argument('--pace', type=float, default=1.0, help='multiplier for every client interval')
+    ap.add_argument('--think', type=float, default=2.0, help='seconds between answers')
+    ap.add_argument('--questions', type=int, default=5, help='answers per player per game')
+    ap.add_argument('--ask-ratio', type=float, default=1.0, help='share of answers that call /ask_ai')
+    ap.add_argument('--cache-hit-ratio', type=float, default=0.2, help='share of /ask_ai prompts repeated')
+    ap.add_argument('--rule', default='classic')
+    ap.add_argument('--lm-url', help='use this LM instead of starting the mock')
+    ap.add_argument('--lm-latency-ms', type=float, default=300)
+    ap.add_argument('--lm-jitter-ms', type=float, default=100)
+    ap.add_argument('--lm-fail-rate', type=float, default=0.0)
+    ap.add_argument('--lm-bad-json-rate', type=float, default=0.0)
+    ap.add_argument('--lm-hang-rate', type=float, default=0.0)
+    ap.add_argument('--lm-timeout', type=float, default=10.0, help='backend LM read timeout (in-process only)')
+    ap.add_argument('--save-baseline', help='write this run as a baseline JSON')
+    ap.add_argument('--baseline', help='compare against a saved baseline; exit 1 on regression')
+    ap.add_argument('--tolerance', type=float, default=0.2)
+    ap.add_argument('--verbose', action='store_true', help="keep the in-process server's output")
+    args = ap.parse_args()
+
+    mock = None
+    lm_url = args.lm_url
+    if not lm_url:
+        mock = MockLM(args.lm_latency_ms, args.lm_jitter_ms, args.lm_fail_rate, args.lm_bad_json_rate,
+                      args.lm_hang_rate, hang_seconds=args.lm_timeout + 5, seed=1)
+        lm_url = mock.start_in_thread()
+
+    srv = None
+    base_url = args.url
+    if not base_url:
+        base_url, srv, thread = start_inprocess_server(args)
+    print(f"{args.players} players for {args.duration:.0f}s against {base_url} (LM {lm_url})")
+
+    quiet = contextlib.redirect_stdout(open(os.devnull, 'w')) if srv and not args.verbose else contextlib.nullcontext()
+    with quiet:
+        rec = asyncio.run(run_swarm(base_url, lm_url, args))
+    if srv:
+        srv.should_exit = True
+        thread.join(timeout=10)
+
+    summary = rec.summary()
+    summary['config'] = {k: v for k, v in vars(args).items() if k not in ('save_baseline', 'baseline', 'verbose')}
+    print_report(summary, mock.counts if mock else None)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        print(f"baseline saved to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            problems = compare(summary, json.load(f), args.tolerance)
+        if problems:
+            print('\nregressions:\n  ' + '\n  '.join(problems))
+            sys.exit(1)
+        print('no regressions')
+
+
+if __name__ == '__main__':
+    main()
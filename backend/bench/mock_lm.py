@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""Mock OpenAI-compatible chat completion server for load tests.
+
+Answers POST /v1/chat/completions (plain JSON or `stream: true` SSE) with a
+grading JSON in the format /ask_ai expects, after a configurable latency.
+A configurable share of calls fails (HTTP 500), returns text that is not
+JSON, or hangs long enough to hit the backend's read timeout.
+
+    python backend/bench/mock_lm.py --port 1234 --latency-ms 400 --fail-rate 0.02
+    LMSTUDIO_API_URL=http://127.0.0.1:1234/v1/chat/completions uvicorn main:app
+
+loadtest.py starts one in-process on a background thread.
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+
+
+class MockLM:
+    def __init__(self, latency_ms: float = 300, jitter_ms: float = 100, fail_rate: float = 0.0,
+                 bad_json_rate: float = 0.0, hang_rate: float = 0.0, hang_seconds: float = 35.0,
+                 stream_chunks: int = 8, seed: int = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.fail_rate = fail_rate
+        self.bad_json_rate = bad_json_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.stream_chunks = max(1, stream_chunks)
+        self.rng = random.Random(seed)
+        self.counts = {'requests': 0, 'ok': 0, 'failed': 0, 'bad_json': 0, 'hung': 0, 'streamed': 0}
+        self.port = None
+        self._loop = None
+        self._server = None
+
+    def _content(self, bad_json: bool) -> str:
+        if bad_json:
+            return 'すみません、うまく答えられませんでした。'
+        score = self.rng.randint(0, 100)
+        return json.dumps({
+            'answer': 'サンプル回答',
+            'reasoning': '負荷試験用の固定応答です。',
+            'valid': True,
+            'invalid_reason': '',
+            'score': score,
+            'feedback': '特になし',
+        }, ensure_ascii=False)
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    k, _, v = line.decode('latin-1').partition(':')
+                    headers[k.strip().lower()] = v.strip()
+                body = await reader.readexactly(int(headers.get('content-length') or 0))
+                await self._respond(writer, request_line.split()[1].decode(), body)
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, path: str, body: bytes):
+        self.counts['requests'] += 1
+        if not path.endswith('/chat/completions'):
+            await self._send(writer, 404, b'{"error":"not found"}')
+            return
+        try:
+            payload = json.loads(body or b'{}')
+        except ValueError:
+            await self._send(writer, 400, b'{"error":"bad request"}')
+            return
+        roll = self.rng.random()
+        if roll < self.hang_rate:
+            self.counts['hung'] += 1
+            await asyncio.sleep(self.hang_seconds)
+        delay = max(0.0, self.rng.gauss(self.latency_ms, self.jitter_ms)) / 1000.0 if self.jitter_ms else self.latency_ms / 1000.0
+        roll = self.rng.random()
+        if roll < self.fail_rate:
+            await asyncio.sleep(delay)
+            self.counts['failed'] += 1
+            await self._send(writer, 500, b'{"error":"mock failure"}')
+            return
+        bad_json = roll < self.fail_rate + self.bad_json_rate
+        self.counts['bad_json' if bad_json else 'ok'] += 1
+        content = self._content(bad_json)
+        if payload.get('stream'):
+            self.counts['streamed'] += 1
+            await self._stream(writer, content, delay)
+            return
+        await asyncio.sleep(delay)
+        out = {'id': 'mock', 'object': 'chat.completion', 'model': payload.get('model', 'mock'),
+               'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}]}
+        await self._send(writer, 200, json.dumps(out, ensure_ascii=False).encode('utf-8'))
+
+    async def _send(self, writer, status: int, data: bytes):
+        head = (f'HTTP/1.1 {status} {"OK" if status == 200 else "Error"}\r\n'
+                f'Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n')
+        writer.write(head.encode('ascii') + data)
+        await writer.drain()
+
+    async def _stream(self, writer, content: str, delay: float):
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n')
+        step = max(1, len(content) // self.stream_chunks)
+        pieces = [content[i:i + step] for i in range(0, len(content), step)]
+        for piece in pieces:
+            await asyncio.sleep(delay / len(pieces))
+            event = {'choices': [{'index': 0, 'delta': {'content': piece}}]}
+            self._chunk(writer, f'data: {json.dumps(event, ensure_ascii=False)}\n\n'.encode('utf-8'))
+            await writer.drain()
+        self._chunk(writer, b'data: [DONE]\n\n')
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    @staticmethod
+    def _chunk(writer, data: bytes):
+        writer.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 0):
+        self._server = await asyncio.start_server(self._handle, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self._server
+
+    def start_in_thread(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        # run on a private event loop so the backend under test never shares a loop with it
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.serve(host, port))
+            ready.set()
+            self._loop.run_forever()
+
+        threading.Thread(target=run, name='mock-lm', daemon=True).start()
+        ready.wait()
+        return f'http://{host}:{self.port}/v1/chat/completions'
+
+
+async def main(args):
+    lm = MockLM(args.latency_ms, args.jitter_ms, args.fail_rate, args.bad_json_rate, args.hang_rate, args.hang_seconds)
+    server = await lm.serve(args.host, args.port)
+    print(f"mock LM listening on http://{args.host}:{lm.port}/v1/chat/completions")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=1234)
+    ap.add_argument('--latency-ms', type=float, default=300)
+    ap.add_argument('--jitter-ms', type=float, default=100)
+    ap.add_argument('--fail-rate', type=float, default=0.0)
+    ap.add_argument('--bad-json-rate', type=float, default=0.0)
+    ap.add_argument('--hang-rate', type=float, default=0.0)
+    ap.add_argument('--hang-seconds', type=float, default=35.0)
+    asyncio.run(main(ap.parse_args()))
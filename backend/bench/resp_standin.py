@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+"""In-memory stand-in for a Redis server, for local multi-worker runs without Redis.
+
+Implements only the commands backend/src/state_redis.py issues (strings, hashes,
+sets, lists, sorted sets, EXPIRE, WATCH/MULTI/EXEC, PUBLISH/SUBSCRIBE). Single process, no
+persistence: point every worker at it to share one lobby on a dev box.
+
+    python backend/bench/resp_standin.py --port 6390
+    STATE_STORE_URL=redis://127.0.0.1:6390 uvicorn main:app --workers 4
+"""
+import argparse
+import asyncio
+import bisect
+import time
+
+
+class WrongType(Exception):
+    pass
+
+
+class Store:
+    def __init__(self):
+        self.data = {}
+        self.expires = {}  # key -> monotonic deadline
+        self.versions = {}  # key -> write counter, for WATCH
+
+    def _live(self, key):
+        at = self.expires.get(key)
+        if at is not None and at <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+            self.touch(key)
+        return self.data.get(key)
+
+    def touch(self, key):
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+    def version(self, key):
+        self._live(key)
+        return self.versions.get(key, 0)
+
+    def typed(self, key, kind, create=False):
+        v = self._live(key)
+        if v is None:
+            if not create:
+                return None
+            v = self.data[key] = kind()
+        elif not isinstance(v, kind):
+            raise WrongType()
+        return v
+
+    def drop_if_empty(self, key):
+        if not self.data.get(key):
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+
+
+class ZSet:
+    def __init__(self):
+        self.scores = {}
+        self.order = []  # sorted (score, member)
+
+    def __len__(self):
+        return len(self.scores)
+
+    def add(self, score, member):
+        old = self.scores.get(member)
+        if old is not None:
+            self.order.remove((old, member))
+        self.scores[member] = score
+        bisect.insort(self.order, (score, member))
+        return old is None
+
+    def rem(self, member):
+        old = self.scores.pop(member, None)
+        if old is None:
+            return False
+        self.order.remove((old, member))
+        return True
+
+
+def _slice(seq, start, stop):
+    n = len(seq)
+    start, stop = int(start), int(stop)
+    if start < 0:
+        start += n
+    if stop < 0:
+        stop += n
+    return seq[max(0, start):stop + 1]
+
+
+def run(store: Store, cmd: str, a: list):
+    s = store
+    if cmd == 'PING':
+        return 'PONG'
+    if cmd in ('AUTH', 'SELECT'):
+        return 'OK'
+    # strings
+    if cmd == 'GET':
+        return s.typed(a[0], str)
+    if cmd == 'SET':
+        s._live(a[0])
+        s.data[a[0]] = a[1]
+        s.expires.pop(a[0], None)
+        if len(a) >= 4 and a[2].upper() == 'EX':
+            s.expires[a[0]] = time.monotonic() + int(a[3])
+        s.touch(a[0])
+        return 'OK'
+    if cmd == 'INCR':
+        v = int(s.typed(a[0], str) or 0) + 1
+        s.data[a[0]] = str(v)
+        s.touch(a[0])
+        return v
+    if cmd == 'DEL':
+        n = 0
+        for k in a:
+            if s._live(k) is not None:
+                del s.data[k]
+                s.expires.pop(k, None)
+                s.touch(k)
+                n += 1
+        return n
+    if cmd == 'EXISTS':
+        return sum(1 for k in a if s._live(k) is not None)
+    if cmd == 'EXPIRE':
+        if s._live(a[0]) is None:
+            return 0
+        s.expires[a[0]] = time.monotonic() + int(a[1])
+        return 1
+    # hashes
+    if cmd == 'HSET':
+        h = s.typed(a[0], dict, create=True)
+        n = 0
+        for f, v in zip(a[1::2], a[2::2]):
+            n += f not in h
+            h[f] = v
+        s.touch(a[0])
+        return n
+    if cmd == 'HSETNX':
+        h = s.typed(a[0], dict, create=True)
+        if a[1] in h:
+            return 0
+        h[a[1]] = a[2]
+        s.touch(a[0])
+        return 1
+    if cmd == 'HGET':
+        return (s.typed(a[0], dict) or {}).get(a[1])
+    if cmd == 'HMGET':
+        h = s.typed(a[0], dict) or {}
+        return [h.get(f) for f in a[1:]]
+    if cmd == 'HGETALL':
+        h = s.typed(a[0], dict) or {}
+        return [x for kv in h.items() for x in kv]
+    if cmd == 'HDEL':
+        h = s.typed(a[0], dict) or {}
+        n = sum(1 for f in a[1:] if h.pop(f, None) is not None)
+        if n:
+            s.drop_if_empty(a[0])
+            s.touch(a[0])
+        return n
+    if cmd == 'HEXISTS':
+        return int(a[1] in (s.typed(a[0], dict) or {}))
+    if cmd == 'HLEN':
+        return len(s.typed(a[0], dict) or {})
+    if cmd == 'HINCRBY':
+        h = s.typed(a[0], dict, create=True)
+        v = int(h.get(a[1]) or 0) + int(a[2])
+        h[a[1]] = str(v)
+        s.touch(a[0])
+        return v
+    # sets
+    if cmd == 'SADD':
+        st = s.typed(a[0], set, create=True)
+        n = sum(1 for m in a[1:] if m not in st)
+        st.update(a[1:])
+        s.touch(a[0])
+        return n
+    if cmd == 'SREM':
+        st = s.typed(a[0], set) or set()
+        n = sum(1 for m in a[1:] if m in st)
+        st.difference_update(a[1:])
+        if n:
+            s.drop_if_empty(a[0])
+            s.touch(a[0])
+        return n
+    if cmd == 'SISMEMBER':
+        return int(a[1] in (s.typed(a[0], set) or ()))
+    if cmd == 'SCARD':
+        return len(s.typed(a[0], set) or ())
+    if cmd == 'SMEMBERS':
+        return list(s.typed(a[0], set) or ())
+    # lists
+    if cmd == 'RPUSH':
+        lst = s.typed(a[0], list, create=True)
+        lst.extend(a[1:])
+        s.touch(a[0])
+        return len(lst)
+    if cmd == 'LRANGE':
+        return _slice(s.typed(a[0], list) or [], a[1], a[2])
+    if cmd == 'LREM':
+        lst = s.typed(a[0], list) or []
+        count, value = int(a[1]), a[2]
+        kept, n = [], 0
+        for x in lst:
+            if x == value and (count == 0 or n < abs(count)):
+                n += 1
+            else:
+                kept.append(x)
+        if n:
+            lst[:] = kept
+            s.drop_if_empty(a[0])
+            s.touch(a[0])
+        return n
+    # sorted sets
+    if cmd == 'ZADD':
+        z = s.typed(a[0], ZSet, create=True)
+        n = sum(z.add(float(sc), m) for sc, m in zip(a[1::2], a[2::2]))
+        s.touch(a[0])
+        return n
+    if cmd == 'ZREM':
+        z = s.typed(a[0], ZSet) or ZSet()
+        n = sum(z.rem(m) for m in a[1:])
+        if n:
+            s.drop_if_empty(a[0])
+            s.touch(a[0])
+        return n
+    if cmd == 'ZCARD':
+        return len(s.typed(a[0], ZSet) or ())
+    if cmd == 'ZRANK':
+        z = s.typed(a[0], ZSet)
+        if z is None or a[1] not in z.scores:
+            return None
+        return bisect.bisect_left(z.order, (z.scores[a[1]], a[1]))
+    if cmd == 'ZSCORE':
+        z = s.typed(a[0], ZSet)
+        score = z.scores.get(a[1]) if z is not None else None
+        return None if score is None else repr(score)
+    if cmd == 'ZRANGE':
+        z = s.typed(a[0], ZSet)
+        picked = _slice(z.order if z else [], a[1], a[2])
+        if len(a) > 3 and a[3].upper() == 'WITHSCORES':
+            return [x for sc, m in picked for x in (m, repr(sc))]
+        return [m for _, m in picked]
+    if cmd == 'ZREMRANGEBYSCORE':
+        z = s.typed(a[0], ZSet)
+        lo, hi = float(a[1]), float(a[2])
+        gone = [m for sc, m in (z.order if z else []) if lo <= sc <= hi]
+        for m in gone:
+            z.rem(m)
+        if gone:
+            s.drop_if_empty(a[0])
+            s.touch(a[0])
+        return len(gone)
+    if cmd == 'ZRANGEBYSCORE':
+        z = s.typed(a[0], ZSet)
+        lo, hi = float(a[1]), float(a[2])
+        picked = [m for sc, m in (z.order if z else []) if lo <= sc <= hi]
+        if len(a) > 5 and a[3].upper() == 'LIMIT':
+            off, count = int(a[4]), int(a[5])
+            picked = picked[off:] if count < 0 else picked[off:off + count]
+        return picked
+    raise KeyError(cmd)
+
+
+def encode(reply) -> bytes:
+    if reply is None:
+        return b'$-1\r\n'
+    if isinstance(reply, Exception):
+        return b'-%s\r\n' % str(reply).encode('utf-8')
+    if isinstance(reply, bool):
+        reply = int(reply)
+    if isinstance(reply, int):
+        return b':%d\r\n' % reply
+    if isinstance(reply, list):
+        return b'*%d\r\n' % len(reply) + b''.join(encode(r) for r in reply)
+    if reply in ('OK', 'PONG', 'QUEUED'):
+        return b'+%s\r\n' % reply.encode('ascii')
+    b = str(reply).encode('utf-8')
+    return b'$%d\r\n%s\r\n' % (len(b), b)
+
+
+async def read_command(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    n = int(line[1:-2])
+    args = []
+    for _ in range(n):
+        size = int((await reader.readline())[1:-2])
+        args.append((await reader.readexactly(size + 2))[:-2].decode('utf-8'))
+    return args
+
+
+def serve(store: Store):
+    channels = {}  # channel -> set of subscribed writers
+
+    async def handle(reader, writer):
+        watched = {}  # key -> version seen at WATCH
+        queued = None  # list while inside MULTI
+        subscribed = set()
+        try:
+            while True:
+                args = await read_command(reader)
+                if args is None:
+                    break
+                cmd, a = args[0].upper(), args[1:]
+                if cmd == 'SUBSCRIBE':
+                    for ch in a:
+                        channels.setdefault(ch, set()).add(writer)
+                        subscribed.add(ch)
+                        writer.write(encode(['subscribe', ch, len(subscribed)]))
+                    await writer.drain()
+                    continue
+                if cmd == 'PUBLISH':
+                    targets = channels.get(a[0], ())
+                    for w in targets:
+                        w.write(encode(['message', a[0], a[1]]))
+                    reply = len(targets)
+                elif cmd == 'WATCH':
+                    for k in a:
+                        watched.setdefault(k, store.version(k))
+                    reply = 'OK'
+                elif cmd == 'UNWATCH':
+                    watched.clear()
+                    reply = 'OK'
+                elif cmd == 'MULTI':
+                    queued = []
+                    reply = 'OK'
+                elif cmd == 'EXEC':
+                    if queued is None:
+                        reply = Exception('ERR EXEC without MULTI')
+                    elif any(store.version(k) != v for k, v in watched.items()):
+                        reply = None
+                    else:
+                        reply = []
+                        for c, ca in queued:
+                            try:
+                                reply.append(run(store, c, ca))
+                            except WrongType:
+                                reply.append(Exception('WRONGTYPE Operation against a key holding the wrong kind of value'))
+                            except KeyError:
+                                reply.append(Exception(f"ERR unknown command '{c}'"))
+                    queued = None
+                    watched.clear()
+                elif queued is not None:
+                    queued.append((cmd, a))
+                    reply = 'QUEUED'
+                else:
+                    try:
+                        reply = run(store, cmd, a)
+                    except WrongType:
+                        reply = Exception('WRONGTYPE Operation against a key holding the wrong kind of value')
+                    except KeyError:
+                        reply = Exception(f"ERR unknown command '{cmd}'")
+                writer.write(encode(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for ch in subscribed:
+                channels.get(ch, set()).discard(writer)
+            writer.close()
+    return handle
+
+
+async def main(host: str, port: int):
+    server = await asyncio.start_server(serve(Store()), host, port)
+    print(f"RESP stand-in listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=6390)
+    args = ap.parse_args()
+    asyncio.run(main(args.host, args.port))
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""Stress test: lobby, room and game handlers hammered from many threads.
+
+Calls the real sync handlers from main.py (the same functions FastAPI runs in
+its threadpool) concurrently and checks the invariants the striped locks are
+there to protect, while reporting throughput for each phase:
+
+  lobby  every player ends up in exactly one game, every game has MIN_PLAYERS
+  rooms  no room overfills, each full room starts exactly one game
+  games  every question is served once, no score delta is lost, each game
+         is finalized exactly once
+
+    python backend/bench/stress_state.py [players] [threads]
+    STATE_LOCK_STRIPES=1 python backend/bench/stress_state.py   # one global lock, for comparison
+"""
+import collections
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+os.environ.setdefault('SCORES_FILE', os.path.join(tempfile.mkdtemp(prefix='stress-'), 'scores.json'))
+
+import main as server  # noqa: E402
+
+ROOM_SIZE = 4
+ROOM_OVERBOOK = 3  # extra joiners per room that must be turned away
+MAX_POLLS = 200
+
+
+def run_parallel(fn, items, threads):
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(threads) as ex:
+        results = list(ex.map(fn, items))
+    elapsed = time.perf_counter() - t0
+    return results, elapsed
+
+
+def report(label, ops, elapsed, failures):
+    status = 'ok' if not failures else 'FAILED'
+    print(f"{label:<7} {ops:>8} calls  {elapsed:7.2f}s  {ops / elapsed:>9.0f} calls/s  {status}")
+    for f in failures[:10]:
+        print(f"    {f}")
+    return not failures
+
+
+def register(n, prefix):
+    return [server.register(server.RegisterRequest(nickname=f"{prefix}{i}"))['player_id'] for i in range(n)]
+
+
+def stress_lobby(players, threads):
+    calls = collections.Counter()
+    lock = threading.Lock()
+
+    def poll_until_matched(pid):
+        n = 0
+        for _ in range(MAX_POLLS):
+            n += 1
+            res = server.lobby_join(server.JoinLobbyRequest(player_id=pid, rule='classic'))
+            if res.get('game_id'):
+                break
+            time.sleep(0.001)
+        with lock:
+            calls['lobby_join'] += n
+        return pid, res.get('game_id'), res.get('players')
+
+    results, elapsed = run_parallel(poll_until_matched, players, threads)
+    failures = []
+    by_game = collections.defaultdict(set)
+    for pid, gid, members in results:
+        if not gid:
+            failures.append(f"{pid} never matched")
+            continue
+        if pid not in members:
+            failures.append(f"{pid} got game {gid} it is not part of")
+        by_game[gid].add(pid)
+    for gid, pids in by_game.items():
+        g = server.GAMES.get(gid)
+        if g is None or set(g['players']) != pids or len(g['players']) != server.MIN_PLAYERS:
+            failures.append(f"game {gid}: reported by {sorted(pids)}, holds {g and g['players']}")
+    if server.MATCHMAKER.waiting_count():
+        failures.append(f"{server.MATCHMAKER.waiting_count()} players left waiting")
+    report('lobby', sum(calls.values()), elapsed, failures)
+    return list(by_game), not failures
+
+
+def stress_rooms(rooms, threads):
+    creators = register(rooms, 'owner')
+    room_ids = [server.room_create(server.RoomCreateRequest(player_id=p, max_players=ROOM_SIZE, password='pw'))['room_id']
+                for p in creators]
+    joiners = register(rooms * (ROOM_SIZE - 1 + ROOM_OVERBOOK), 'guest')
+    jobs = [(room_ids[i % rooms], pid) for i, pid in enumerate(joiners)]
+
+    def join(job):
+        rid, pid = job
+        return rid, pid, server.room_join(server.RoomJoinRequest(player_id=pid, room_id=rid, password='pw'))
+
+    results, elapsed = run_parallel(join, jobs, threads)
+    failures = []
+    started = collections.defaultdict(list)
+    for rid, pid, res in results:
+        if res.get('game_id'):
+            started[rid].append(res)
+        elif res.get('error') not in ('room_full', 'unknown_room') and not res.get('waiting'):
+            failures.append(f"{pid} -> {rid}: {res}")
+    seen = set()
+    for rid in room_ids:
+        games = started.get(rid, [])
+        if len(games) != 1:
+            failures.append(f"room {rid} started {len(games)} games")
+            continue
+        members = games[0]['players']
+        if len(members) != ROOM_SIZE or len(set(members)) != ROOM_SIZE:
+            failures.append(f"room {rid} started with {members}")
+        if seen & set(members):
+            failures.append(f"players {seen & set(members)} started in two rooms")
+        seen.update(members)
+    if len(server.ROOMS):
+        failures.append(f"{len(server.ROOMS)} rooms still open")
+    report('rooms', len(jobs), elapsed, failures)
+    return not failures
+
+
+def stress_games(game_ids, threads):
+    finalized = collections.Counter()
+    record_game = server.SCORE_STORE.record_game
+
+    def counting_record_game(gid, *args, **kwargs):
+        finalized[gid] += 1
+        return record_game(gid, *args, **kwargs)
+
+    server.SCORE_STORE.record_game = counting_record_game
+    served = collections.defaultdict(list)
+    lock = threading.Lock()
+    jobs = [(gid, pid) for gid in game_ids for pid in server.GAMES.get(gid)['players']]
+    expected = {gid: {p: 0 for p in server.GAMES.get(gid)['players']} for gid in game_ids}
+
+    def play(job):
+        gid, pid = job
+        n = 0
+        got = []
+        for i in range(4):
+            q = server.game_question(gid, pid)
+            n += 1
+            if 'question_id' in q:
+                got.append(q['question_id'])
+            server.game_submit_answer(gid, {'player_id': pid, 'score_delta': i + 1, 'correct': False})
+            n += 1
+        server.game_submit_answer(gid, {'player_id': pid, 'done': True})
+        with lock:
+            served[gid].extend(got)
+            expected[gid][pid] += 10
+        return n + 1
+
+    try:
+        counts, elapsed = run_parallel(play, jobs, threads)
+    finally:
+        server.SCORE_STORE.record_game = record_game
+    failures = []
+    for gid in game_ids:
+        g = server.GAMES.get(gid)
+        if len(served[gid]) != len(set(served[gid])):
+            failures.append(f"game {gid} served a question twice")
+        if g['scores'] != expected[gid]:
+            failures.append(f"game {gid} scores {g['scores']} != {expected[gid]}")
+        if finalized[gid] != 1:
+            failures.append(f"game {gid} finalized {finalized[gid]} times")
+    report('games', sum(counts), elapsed, failures)
+    return not failures
+
+
+def main():
+    players = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    players -= players % server.MIN_PLAYERS
+    # switch threads far more often than the 5ms default so races surface quickly
+    sys.setswitchinterval(1e-5)
+    server.SCORE_STORE.start()
+    try:
+        print(f"{players} players, {threads} threads, state={server.STATE.name}")
+        game_ids, ok_lobby = stress_lobby(register(players, 'p'), threads)
+        ok_rooms = stress_rooms(max(1, players // 20), threads)
+        ok_games = stress_games(game_ids, threads)
+    finally:
+        server.SCORE_STORE.stop()
+    print(server.STATE.stats())
+    sys.exit(0 if ok_lobby and ok_rooms and ok_games else 1)
+
+
+if __name__ == '__main__':
+    main()
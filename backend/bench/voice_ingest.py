@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Per-chunk CPU cost of the voice server's two ingestion paths.
+
+  wav  convert_audio_to_wav: int16 -> float32 -> (resample) -> int16 -> WAV
+       encode into a BytesIO, header and all fed to AcceptWaveform
+  raw  to_recognizer_pcm + accept_audio: 16 kHz int16 goes to the recognizer
+       as a memoryview over the received buffer; other input is converted once
+       (polyphase StreamResampler carried across chunks)
+
+Without --model only the preparation step is timed. With a Vosk model
+directory the recognizer is fed as well, so the numbers include decoding.
+
+    python backend/bench/voice_ingest.py [--chunk-ms 100] [--chunks 2000] [--model /app/models/vosk-model-small-ja-0.22]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import voice_server  # noqa: E402
+
+
+def make_chunks(rate: int, chunk_ms: int, count: int):
+    # speech-band tone sweep with a little noise, split into socket-sized chunks
+    n = rate * chunk_ms // 1000
+    t = np.arange(n * count) / rate
+    signal = 0.3 * np.sin(2 * np.pi * (200 + 600 * (t % 1.0)) * t) + 0.01 * np.random.default_rng(0).standard_normal(len(t))
+    pcm = (signal * 32767).astype(np.int16).tobytes()
+    step = n * 2
+    return [pcm[i:i + step] for i in range(0, len(pcm), step)]
+
+
+def run_path(path: str, chunks, rate: int, rec):
+    # the raw path resamples with a per-stream resampler, like a socket session does
+    resampler = voice_server.StreamResampler(rate) if rate != voice_server.VOICE_SAMPLE_RATE else None
+
+    def prepare(chunk):
+        if path == 'wav':
+            return voice_server.convert_audio_to_wav(chunk, rate)
+        return voice_server.to_recognizer_pcm(chunk, rate, resampler=resampler)
+
+    # allocation per chunk, measured on a separate pass so tracing doesn't skew the timing
+    tracemalloc.start()
+    for chunk in chunks[:50]:
+        prepare(chunk)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    cpu0 = time.process_time()
+    wall0 = time.perf_counter()
+    for chunk in chunks:
+        audio = prepare(chunk)
+        if rec is not None:
+            voice_server.accept_audio(rec, audio)
+    cpu = time.process_time() - cpu0
+    wall = time.perf_counter() - wall0
+    return cpu / len(chunks) * 1e6, wall / len(chunks) * 1e6, peak
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--chunk-ms', type=int, default=100)
+    ap.add_argument('--chunks', type=int, default=2000)
+    ap.add_argument('--rates', default='16000,48000')
+    ap.add_argument('--model', default=None, help='Vosk model directory; also time AcceptWaveform')
+    args = ap.parse_args()
+
+    model = voice_server.vosk.Model(args.model) if args.model else None
+    print(f"{args.chunks} chunks of {args.chunk_ms} ms, recognizer {'on' if model else 'off'}")
+    print(f"{'rate':>6} {'path':<4} {'cpu us/chunk':>13} {'wall us/chunk':>14} {'peak alloc':>11}")
+    for rate in (int(r) for r in args.rates.split(',')):
+        chunks = make_chunks(rate, args.chunk_ms, args.chunks)
+        results = {}
+        for path in ('wav', 'raw'):
+            rec = voice_server.vosk.KaldiRecognizer(model, voice_server.VOICE_SAMPLE_RATE) if model else None
+            results[path] = run_path(path, chunks, rate, rec)
+            cpu_us, wall_us, peak = results[path]
+            print(f"{rate:>6} {path:<4} {cpu_us:>13.1f} {wall_us:>14.1f} {peak / 1024:>9.1f}KB")
+        print(f"{'':>6} raw/wav cpu {results['raw'][0] / results['wav'][0]:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
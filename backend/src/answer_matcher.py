@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# Server-side answer matching built from the question bank.
+#
+# Decides only the certain cases locally; anything else is left to the LM / the client:
+#  - a player input that contains an accepted answer as a whole word is rejected up
+#    front (the model would just echo it back), and
+#  - a model answer that is, or contains as a whole word, an accepted answer is a hit.
+# A near miss is never decided here: no typo tolerance, no raw substring test.
+from normalize import normalize_answer, match_form
+
+# single-character answers are too short to test for containment ("赤" in "赤道")
+ANSWER_MATCH_CONTAIN_MIN_LEN = 2
+
+
+def contains_answer(form, answer: str) -> bool:
+    # answer occurs in match_form() text without cutting through a word: on each side there is
+    # a separator, a change of script (ペリー|です, 1853|年) or the end of the text, so
+    # "ぺりー" is not found in "ぺりかん", "200" not in "2000" and "os" not in "microsoft"
+    text, scripts, gaps = form
+    start = text.find(answer)
+    while start != -1:
+        end = start + len(answer)
+        left = start == 0 or gaps[start] or scripts[start - 1] != scripts[start]
+        right = end == len(text) or gaps[end] or scripts[end] != scripts[end - 1]
+        if left and right:
+            return True
+        start = text.find(answer, start + 1)
+    return False
+
+
+class AnswerMatcher:
+    def __init__(self, questions):
+        self._by_id = {}  # str(question id) -> frozenset of normalized answers
+        self._by_answer = {}  # normalized answer -> frozenset of normalized answers of its question(s)
+        for q in questions or []:
+            answers = q.get('answers') or ([q.get('answer')] if q.get('answer') else [])
+            normed = frozenset(a for a in (normalize_answer(str(x)) for x in answers) if a)
+            if not normed:
+                continue
+            if q.get('id') is not None:
+                self._by_id[str(q.get('id'))] = normed
+            for a in normed:
+                self._by_answer[a] = self._by_answer.get(a, frozenset()) | normed
+        self.lm_calls_avoided = 0
+        self.local_hits = 0
+        self.local_misses = 0
+        self.undecided = 0
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def answers_for(self, question_id=None, target_answer=None) -> frozenset:
+        if question_id is not None:
+            found = self._by_id.get(str(question_id))
+            if found:
+                return found
+        if target_answer:
+            key = normalize_answer(target_answer)
+            # unknown targets (e.g. client-side question sets) still match on their own text
+            return self._by_answer.get(key) or (frozenset([key]) if key else frozenset())
+        return frozenset()
+
+    def is_match(self, text: str, answers) -> bool:
+        # text is an accepted answer, or contains one as a whole word
+        form = match_form(text)
+        if not form[0]:
+            return False
+        return any(form[0] == a or (len(a) >= ANSWER_MATCH_CONTAIN_MIN_LEN and contains_answer(form, a))
+                   for a in answers)
+
+    def precheck(self, text: str, answers):
+        # returns False for an input decided locally as a miss, None when the LM has to judge it
+        if answers and self.is_match(text, answers):
+            self.lm_calls_avoided += 1
+            self.local_misses += 1
+            return False
+        return None
+
+    def judge(self, response: str, answers):
+        # True for a certain hit, None when the client / LM has to decide
+        if self.is_match(response, answers):
+            self.local_hits += 1
+            return True
+        self.undecided += 1
+        return None
+
+    def stats(self) -> dict:
+        return {
+            'questions_indexed': len(self._by_id),
+            'answers_indexed': len(self._by_answer),
+            'lm_calls_avoided': self.lm_calls_avoided,
+            'local_hits': self.local_hits,
+            'local_misses': self.local_misses,
+            'undecided': self.undecided,
+        }
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# Background deadline scheduler (binary heap of due times).
+#
+# Keys are small tuples such as ('player', player_id) or ('game', game_id).
+# Re-scheduling a key just pushes a new heap entry; superseded entries are
+# skipped when popped, so schedule/cancel/fire are all O(log n).
+#
+# Handlers run in a worker thread: they touch the state store, which may be
+# Redis behind a blocking client, and must not stall the event loop.
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+
+# upper bound on one sleep so clock jumps or missed wake-ups self-correct
+MAX_SLEEP_SECONDS = 5.0
+
+
+class DeadlineScheduler:
+    def __init__(self):
+        self._heap = []  # (due, seq, key)
+        self._due = {}  # key -> current due time
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._wake = None
+        self.fired = 0
+
+    def __len__(self):
+        return len(self._due)
+
+    def schedule(self, key, due: float):
+        with self._lock:
+            self._due[key] = due
+            heapq.heappush(self._heap, (due, next(self._seq), key))
+            earliest = self._heap[0][2] == key and self._heap[0][0] == due
+        if earliest:
+            self._notify()
+
+    def cancel(self, key):
+        with self._lock:
+            self._due.pop(key, None)
+
+    def due_at(self, key):
+        return self._due.get(key)
+
+    def pop_due(self, now: float):
+        fired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due, _, key = heapq.heappop(self._heap)
+                if self._due.get(key) != due:
+                    continue  # cancelled or re-scheduled
+                del self._due[key]
+                fired.append(key)
+            # drop superseded entries once they dominate the heap
+            if len(self._heap) > 2 * len(self._due) + 1024:
+                self._heap = [(d, next(self._seq), k) for k, d in self._due.items()]
+                heapq.heapify(self._heap)
+        return fired
+
+    def next_due(self):
+        with self._lock:
+            while self._heap and self._due.get(self._heap[0][2]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    def _notify(self):
+        loop, wake = self._loop, self._wake
+        if loop is None or wake is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            wake.set()
+        else:
+            loop.call_soon_threadsafe(wake.set)
+
+    def _fire(self, keys, handler):
+        for key in keys:
+            self.fired += 1
+            try:
+                handler(key)
+            except Exception as e:
+                print(f"deadline handler failed for {key}: {e}")
+
+    def _tick(self, handler):
+        # fire what has passed; -> due time of the next deadline (None when there is none)
+        self._fire(self.pop_due(time.time()), handler)
+        return self.next_due()
+
+    async def run(self, handler):
+        # handler(key) is called in a worker thread, one batch of passed deadlines at a time
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        while True:
+            # cleared first, so a deadline scheduled while the batch runs still wakes us
+            self._wake.clear()
+            try:
+                nxt = await asyncio.to_thread(self._tick, handler)
+            except Exception as e:
+                print(f"deadline scheduler tick failed: {e}")
+                nxt = None
+            timeout = MAX_SLEEP_SECONDS if nxt is None else min(MAX_SLEEP_SECONDS, max(0.0, nxt - time.time()))
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> dict:
+        nxt = self.next_due()
+        return {
+            'scheduled': len(self._due),
+            'heap_entries': len(self._heap),
+            'fired': self.fired,
+            'next_due_in': (nxt - time.time()) if nxt is not None else None,
+        }
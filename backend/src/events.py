@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# Per-player push channel fan-out.
+#
+# Handlers (including the sync ones FastAPI runs in its threadpool) publish
+# events here; each connected WebSocket drains its own bounded queue.
+import asyncio
+import threading
+
+EVENT_QUEUE_SIZE = 256
+
+
+class EventHub:
+    def __init__(self, queue_size: int = EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subs = {}  # player_id -> set of asyncio.Queue
+        self._lock = threading.Lock()
+        self._loop = None
+        self.published = 0
+        self.dropped = 0
+
+    def bind_loop(self, loop):
+        self._loop = loop
+
+    def subscribe(self, player_id: str) -> asyncio.Queue:
+        q = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subs.setdefault(player_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, player_id: str, q: asyncio.Queue):
+        with self._lock:
+            subs = self._subs.get(player_id)
+            if subs is None:
+                return
+            subs.discard(q)
+            if not subs:
+                self._subs.pop(player_id, None)
+
+    def is_connected(self, player_id: str) -> bool:
+        return player_id in self._subs
+
+    def connection_count(self) -> int:
+        return sum(len(s) for s in self._subs.values())
+
+    def publish(self, player_ids, event: str, data: dict):
+        # safe to call from the event loop or from threadpool handlers
+        self._fan_out(player_ids, event, data)
+
+    def _fan_out(self, player_ids, event: str, data: dict):
+        # hand the event to this process's subscribers
+        with self._lock:
+            targets = [q for pid in player_ids for q in self._subs.get(pid, ())]
+        if not targets or self._loop is None:
+            return
+        message = {'event': event, 'data': data}
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._deliver(targets, message)
+        else:
+            self._loop.call_soon_threadsafe(self._deliver, targets, message)
+
+    def _deliver(self, targets, message):
+        for q in targets:
+            if q.full():
+                # slow consumer: drop its oldest event rather than block publishers
+                try:
+                    q.get_nowait()
+                    self.dropped += 1
+                except asyncio.QueueEmpty:
+                    pass
+            q.put_nowait(message)
+            self.published += 1
+
+    def stats(self) -> dict:
+        return {
+            'connected_players': len(self._subs),
+            'connections': self.connection_count(),
+            'published': self.published,
+            'dropped': self.dropped,
+        }
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+# Game lifecycle: live games by id plus a bounded archive of finished ones.
+#
+#   pending    -> created by matchmaking, players have not picked it up yet
+#   active     -> a player fetched it / asked for a question / submitted
+#   finalizing -> first player finished, end-of-game countdown running
+#   archived   -> finished; kept (size + TTL bounded) so late /state polls still work
+#
+# Locking: every mutation of one game runs under its stripe ('game', game_id),
+# so answers for different games never wait on each other and finish() is a
+# compare-and-set. The pending pointers and the archive share one small leaf
+# lock that is only ever taken last.
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from locks import LockTable
+
+PENDING = 'pending'
+ACTIVE = 'active'
+FINALIZING = 'finalizing'
+ARCHIVED = 'archived'
+
+GAME_ARCHIVE_MAX = int(os.getenv('GAME_ARCHIVE_MAX', '2000'))
+GAME_ARCHIVE_TTL = float(os.getenv('GAME_ARCHIVE_TTL', '900'))
+
+
+class GameStore:
+    def __init__(self, archive_max: int = GAME_ARCHIVE_MAX, archive_ttl: float = GAME_ARCHIVE_TTL, locks: LockTable = None):
+        self.archive_max = max(0, archive_max)
+        self.archive_ttl = archive_ttl
+        self._live = {}  # game_id -> game dict
+        self._archive = OrderedDict()  # game_id -> (archived_at, game dict), oldest first
+        self._pending = {}  # player_id -> game_id matched but not yet picked up by that player
+        self._locks = locks or LockTable()
+        self._index_lock = threading.Lock()  # leaf: _pending, _archive and the counters
+        self.created = 0
+        self.archived = 0
+        self.evicted = 0
+
+    def __contains__(self, game_id):
+        return self.get(game_id) is not None
+
+    def live_count(self) -> int:
+        return len(self._live)
+
+    def archive_count(self) -> int:
+        return len(self._archive)
+
+    def add(self, game_id: str, game: dict):
+        # record the pending game for each chosen player so they receive it on next poll
+        game['state'] = PENDING
+        self._live[game_id] = game
+        with self._index_lock:
+            for p in game['players']:
+                self._pending[p] = game_id
+            self.created += 1
+
+    def pending_for(self, player_id: str):
+        game_id = self._pending.get(player_id)
+        return game_id if game_id in self._live else None
+
+    def take_pending(self, player_id: str):
+        # deliver-once: clears the pointer (stale pointers to finished games are dropped too)
+        with self._index_lock:
+            game_id = self._pending.pop(player_id, None)
+        return game_id if game_id in self._live else None
+
+    def drop_pending(self, player_id: str):
+        with self._index_lock:
+            self._pending.pop(player_id, None)
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def get(self, game_id: str):
+        g = self._live.get(game_id)
+        if g is not None:
+            return g
+        item = self._archive.get(game_id)
+        if item is None:
+            return None
+        if time.time() - item[0] > self.archive_ttl:
+            with self._index_lock:
+                self._evict_expired()
+            return None
+        return item[1]
+
+    def get_live(self, game_id: str):
+        return self._live.get(game_id)
+
+    def set_state(self, game_id: str, state: str):
+        with self._locks.hold(('game', game_id)):
+            g = self._live.get(game_id)
+            if g is not None and g.get('state') != state:
+                g['state'] = state
+
+    def activate(self, game_id: str):
+        with self._locks.hold(('game', game_id)):
+            g = self._live.get(game_id)
+            if g is not None and g.get('state') == PENDING:
+                g['state'] = ACTIVE
+
+    def next_question(self, game_id: str):
+        # (pointer, question) and advance, question is None once the game ran out; None for unknown games
+        with self._locks.hold(('game', game_id)):
+            g = self.get(game_id)
+            if g is None:
+                return None
+            ptr = g.get('pointer', 0)
+            if ptr >= len(g['questions']):
+                return ptr, None
+            g['pointer'] = ptr + 1
+            return ptr, g['questions'][ptr]
+
+    def record_answer(self, game_id: str, player_id: str, delta: int, done: bool, now: int):
+        with self._locks.hold(('game', game_id)):
+            return self._record_answer(game_id, player_id, delta, done, now)
+
+    def _record_answer(self, game_id: str, player_id: str, delta: int, done: bool, now: int):
+        g = self._live.get(game_id)
+        if g is None:
+            return None if self.get(game_id) is None else {'finished': True}
+        if g.get('finished'):
+            return {'finished': True}
+        if g.get('state') == PENDING:
+            g['state'] = ACTIVE
+        changed = bool(delta)
+        if delta:
+            g['scores'][player_id] = g['scores'].get(player_id, 0) + delta
+        first = False
+        if done and not g['done'].get(player_id):
+            g['done'][player_id] = True
+            changed = True
+            if not g.get('first_finish_at'):
+                g['first_finish_at'] = now
+                g['state'] = FINALIZING
+                first = True
+        return {
+            'finished': False,
+            'changed': changed,
+            'first_finish': first,
+            'first_finish_at': g.get('first_finish_at'),
+            'all_done': all(g['done'].get(p) for p in g['players']),
+        }
+
+    def finish(self, game_id: str, now: int):
+        # marks the game finished with its final ranking; only the first caller gets the game back
+        with self._locks.hold(('game', game_id)):
+            g = self._live.get(game_id)
+            if g is None or g.get('finished'):
+                return None
+            g['finished'] = True
+            scores = g.get('scores', {})
+            ranking = sorted([(p, scores.get(p, 0)) for p in g['players']], key=lambda x: x[1], reverse=True)
+            g['final_ranking'] = [{'player': p, 'score': s} for p, s in ranking]
+            g['ended_at'] = now
+            return g
+
+    def archive(self, game_id: str):
+        with self._locks.hold(('game', game_id)):
+            g = self._live.get(game_id)
+            if g is None:
+                return None
+            g['state'] = ARCHIVED
+            with self._index_lock:
+                # archive before leaving _live so a concurrent get() always finds the game somewhere
+                if self.archive_max:
+                    self._archive[game_id] = (time.time(), g)
+                del self._live[game_id]
+                # drop pending-game pointers nobody picked up
+                for p in g['players']:
+                    if self._pending.get(p) == game_id:
+                        del self._pending[p]
+                self.archived += 1
+                if self.archive_max:
+                    self._evict_expired()
+                    while len(self._archive) > self.archive_max:
+                        self._archive.popitem(last=False)
+                        self.evicted += 1
+            return g
+
+    def _evict_expired(self):
+        # caller holds _index_lock
+        cutoff = time.time() - self.archive_ttl
+        while self._archive:
+            archived_at = next(iter(self._archive.values()))[0]
+            if archived_at > cutoff:
+                break
+            self._archive.popitem(last=False)
+            self.evicted += 1
+
+    def stats(self) -> dict:
+        with self._index_lock:
+            self._evict_expired()
+        by_state = {PENDING: 0, ACTIVE: 0, FINALIZING: 0}
+        for g in list(self._live.values()):
+            state = g.get('state', ACTIVE)
+            by_state[state] = by_state.get(state, 0) + 1
+        by_state[ARCHIVED] = len(self._archive)
+        return {
+            'by_state': by_state,
+            'archive_max': self.archive_max,
+            'archive_ttl_seconds': self.archive_ttl,
+            'created': self.created,
+            'archived': self.archived,
+            'evicted': self.evicted,
+        }
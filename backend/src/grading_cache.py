@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# Bounded LRU + TTL cache for parsed /ask_ai results.
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from normalize import fold_text
+
+GRADING_CACHE_SIZE = int(os.getenv('GRADING_CACHE_SIZE', '4096'))
+GRADING_CACHE_TTL = float(os.getenv('GRADING_CACHE_TTL', '3600'))
+
+
+def grading_key(question: str, mode, model: str, lm_url: str):
+    # whitespace/width-folded so "ＡＩ  とは" and "AI とは" share an entry
+    return (fold_text(question).lower(), mode or '', model or '', lm_url or '')
+
+
+class GradingCache:
+    def __init__(self, maxsize: int = GRADING_CACHE_SIZE, ttl: float = GRADING_CACHE_TTL):
+        self.maxsize = max(0, maxsize)
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, value = item
+            if expires_at <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return dict(value)
+
+    def put(self, key, value: dict):
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, dict(value))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, mode=None) -> int:
+        # drop everything, or only entries for one mode
+        with self._lock:
+            if mode is None:
+                removed = len(self._data)
+                self._data.clear()
+                return removed
+            keys = [k for k in self._data if k[1] == mode]
+            for k in keys:
+                del self._data[k]
+            return len(keys)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl_seconds': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / total) if total else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# Per-mode leaderboards kept sorted on insert.
+#
+# Only each player's personal best is ranked (records are keyed on the
+# nickname stored in SCORES), so repeated identical runs don't crowd the board.
+# Ranks come from bisect over the sorted keys (O(log n)) and a top-K page is a
+# slice (O(K)); nothing is re-sorted per request.
+import bisect
+import itertools
+import threading
+
+
+class Leaderboard:
+    def __init__(self):
+        self._keys = []  # sorted (-score, seq, player): best first, earlier run wins ties
+        self._best = {}  # player -> (key, record)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()  # submits arrive from threadpool handlers
+        self.submissions = 0
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, rec: dict) -> bool:
+        # True when rec is a new personal best for its player
+        player = rec.get('player')
+        try:
+            score = int(rec.get('score') or 0)
+        except (TypeError, ValueError):
+            return False
+        with self._lock:
+            self.submissions += 1
+            current = self._best.get(player)
+            if current is not None:
+                if -current[0][0] >= score:
+                    return False
+                del self._keys[bisect.bisect_left(self._keys, current[0])]
+            key = (-score, next(self._seq), player)
+            bisect.insort(self._keys, key)
+            self._best[player] = (key, rec)
+        return True
+
+    def top(self, limit: int = 10, offset: int = 0):
+        offset = max(0, offset)
+        with self._lock:
+            return [self._best[k[2]][1] for k in self._keys[offset:offset + max(0, limit)]]
+
+    def best(self, player: str):
+        current = self._best.get(player)
+        return current[1] if current else None
+
+    def rank(self, player: str):
+        # 1-based rank of the player's personal best, None if they have no score
+        with self._lock:
+            current = self._best.get(player)
+            if current is None:
+                return None
+            return bisect.bisect_left(self._keys, current[0]) + 1
+
+    def rank_of_score(self, score: int) -> int:
+        # rank a new run with this score would get (ties go after existing entries)
+        return bisect.bisect_right(self._keys, (-score, float('inf'))) + 1
+
+    def percentile(self, player: str):
+        # share of ranked players this player is at or above, 0-100
+        r = self.rank(player)
+        if r is None:
+            return None
+        n = len(self._keys)
+        return round((n - r + 1) / n * 100, 2)
+
+
+class Leaderboards:
+    def __init__(self, scores: dict = None):
+        self._boards = {}
+        for mode, records in (scores or {}).items():
+            if not isinstance(records, list):
+                continue
+            board = self.board(mode)
+            for rec in records:
+                if isinstance(rec, dict):
+                    board.add(rec)
+
+    def board(self, mode: str) -> Leaderboard:
+        b = self._boards.get(mode)
+        if b is None:
+            b = self._boards[mode] = Leaderboard()
+        return b
+
+    def get(self, mode: str):
+        return self._boards.get(mode)
+
+    def add(self, mode: str, rec: dict) -> bool:
+        return self.board(mode).add(rec)
+
+    def modes(self):
+        return list(self._boards.keys())
+
+    def stats(self) -> dict:
+        return {mode: {'players': len(b), 'submissions': b.submissions} for mode, b in self._boards.items()}
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+# Shared async HTTP client for talking to LMStudio (OpenAI-compatible) servers.
+#
+# One httpx.AsyncClient is kept per LM host so that keep-alive connections are
+# reused between /ask_ai calls and each host gets its own connection limit.
+import asyncio
+import os
+import json
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse, parse_qs, urlunparse
+
+import httpx
+
+LMSTUDIO_API_URL = os.getenv("LMSTUDIO_API_URL", "http://host.docker.internal:1234/v1/chat/completions")
+
+# per-host pool sizing and timeouts (seconds)
+LM_MAX_CONNECTIONS_PER_HOST = int(os.getenv('LM_MAX_CONNECTIONS_PER_HOST', '32'))
+LM_MAX_KEEPALIVE_PER_HOST = int(os.getenv('LM_MAX_KEEPALIVE_PER_HOST', '16'))
+LM_KEEPALIVE_EXPIRY = float(os.getenv('LM_KEEPALIVE_EXPIRY', '30'))
+LM_CONNECT_TIMEOUT = float(os.getenv('LM_CONNECT_TIMEOUT', '5'))
+LM_READ_TIMEOUT = float(os.getenv('LM_READ_TIMEOUT', '30'))
+LM_POOL_TIMEOUT = float(os.getenv('LM_POOL_TIMEOUT', '10'))
+# pooled clients kept at once; least recently used idle ones are closed past this
+LM_MAX_CLIENTS = int(os.getenv('LM_MAX_CLIENTS', '32'))
+
+_CLIENTS = OrderedDict()  # "scheme://host:port" -> httpx.AsyncClient, least recently used first
+_IN_USE = {}  # "scheme://host:port" -> requests running on that host's client
+
+
+def resolve_lm_url(url=None):
+    # determine LMStudio URL: prefer the one provided by the client, otherwise use env/default
+    target_lm_url = url or LMSTUDIO_API_URL
+    # Special rule: domains under 'りん.com' (and its punycode xn--nbks) use ?p= for port and ?a= for path
+    try:
+        up = urlparse(target_lm_url)
+        host = up.hostname or ''
+        # convert unicode host to ascii punycode for comparison
+        try:
+            host_ascii = host.encode('idna').decode()
+        except Exception:
+            host_ascii = host
+        if host_ascii.endswith('りん.com') or host_ascii.endswith('xn--nbks') or host_ascii.endswith('.りん.com') or host_ascii.endswith('.xn--nbks'):
+            qs = parse_qs(up.query)
+            port_vals = qs.get('p') or qs.get('port') or []
+            a_vals = qs.get('a') or qs.get('path') or []
+            port = None
+            if port_vals:
+                try:
+                    port = int(port_vals[0])
+                except Exception:
+                    port = None
+            # rebuild netloc with explicit port if provided
+            netloc = up.hostname or ''
+            if port:
+                netloc = f"{netloc}:{port}"
+            # determine base path from 'a' param or default to v1/chat/completions
+            a_path = a_vals[0] if a_vals else 'v1/chat/completions'
+            # ensure a_path doesn't start with /
+            a_path = a_path.lstrip('/')
+            target_lm_url = urlunparse((up.scheme or 'http', netloc, '/' + a_path, '', '', ''))
+        else:
+            # normalize: if caller gave base URL without path, append the common LMStudio path
+            if 'v1' not in target_lm_url:
+                target_lm_url = target_lm_url.rstrip('/') + '/v1/chat/completions'
+    except Exception:
+        # fallback behavior
+        if 'v1' not in target_lm_url:
+            target_lm_url = target_lm_url.rstrip('/') + '/v1/chat/completions'
+    return target_lm_url
+
+
+def host_key(url: str) -> str:
+    up = urlparse(url)
+    scheme = up.scheme or 'http'
+    port = up.port or (443 if scheme == 'https' else 80)
+    return f"{scheme}://{up.hostname or ''}:{port}"
+
+
+def _new_client(**kwargs) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=LM_MAX_CONNECTIONS_PER_HOST,
+            max_keepalive_connections=LM_MAX_KEEPALIVE_PER_HOST,
+            keepalive_expiry=LM_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(LM_READ_TIMEOUT, connect=LM_CONNECT_TIMEOUT, pool=LM_POOL_TIMEOUT),
+        **kwargs,
+    )
+
+
+def _evict_idle_clients(keep: str):
+    excess = len(_CLIENTS) - max(1, LM_MAX_CLIENTS)
+    for key in [k for k in _CLIENTS if k != keep and k not in _IN_USE][:max(0, excess)]:
+        asyncio.ensure_future(_CLIENTS.pop(key).aclose())
+
+
+def get_client(url: str) -> httpx.AsyncClient:
+    # lazily create one pooled client per LM host; must be called from the event loop
+    key = host_key(url)
+    client = _CLIENTS.get(key)
+    if client is None or client.is_closed:
+        client = _new_client()
+        _CLIENTS[key] = client
+        _evict_idle_clients(key)
+    _CLIENTS.move_to_end(key)
+    return client
+
+
+@asynccontextmanager
+async def _client(url: str):
+    # pooled client for url's host, kept from eviction while the request runs
+    key = host_key(url)
+    client = get_client(url)
+    _IN_USE[key] = _IN_USE.get(key, 0) + 1
+    try:
+        yield client
+    finally:
+        _IN_USE[key] -= 1
+        if not _IN_USE[key]:
+            del _IN_USE[key]
+
+
+async def post_chat_completion(url: str, payload: dict) -> dict:
+    async with _client(url) as client:
+        response = await client.post(url, json=payload)
+    response.raise_for_status()
+    return response.json()
+
+
+async def stream_chat_completion(url: str, payload: dict):
+    # yields content deltas from an OpenAI-style `stream: true` completion (SSE lines)
+    async with _client(url) as client:
+        async with client.stream('POST', url, json=payload) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                line = line.strip()
+                if not line.startswith('data:'):
+                    continue
+                chunk = line[5:].strip()
+                if chunk == '[DONE]':
+                    break
+                try:
+                    data = json.loads(chunk)
+                except ValueError:
+                    continue
+                choices = data.get('choices') or []
+                if not choices:
+                    continue
+                content = (choices[0].get('delta') or {}).get('content')
+                if content:
+                    yield content
+
+
+def probe_urls(url: str):
+    # /v1/models first; any answer short of a 5xx means something is listening there
+    base = url.rstrip('/')
+    if '/v1/' in base + '/':
+        base = base[:(base + '/').index('/v1/')]
+    return [base + '/v1/models', base + '/v1/chat/completions', base]
+
+
+async def probe(url: str, timeout: float = 5.0) -> dict:
+    # a host without a pooled client (e.g. one typed into the settings screen) gets a
+    # throwaway client, so probing arbitrary URLs does not fill the pool
+    if host_key(url) in _CLIENTS:
+        async with _client(url) as client:
+            return await _probe(client, url, timeout)
+    async with _new_client() as client:
+        return await _probe(client, url, timeout)
+
+
+async def _probe(client: httpx.AsyncClient, url: str, timeout: float) -> dict:
+    last_err = None
+    for t in probe_urls(url):
+        try:
+            r = await client.get(t, timeout=timeout)
+            if 200 <= r.status_code < 500:
+                return {'ok': True, 'checked': t}
+            last_err = f"HTTP {r.status_code}"
+        except Exception as e:
+            last_err = str(e) or type(e).__name__
+    return {'ok': False, 'error': last_err}
+
+
+async def close_clients():
+    clients = list(_CLIENTS.values())
+    _CLIENTS.clear()
+    for client in clients:
+        try:
+            await client.aclose()
+        except Exception as e:
+            print(f"Failed to close LM client: {e}")
+
+
+def pool_stats():
+    return {
+        'hosts': sorted(_CLIENTS.keys()),
+        'max_clients': LM_MAX_CLIENTS,
+        'max_connections_per_host': LM_MAX_CONNECTIONS_PER_HOST,
+        'max_keepalive_per_host': LM_MAX_KEEPALIVE_PER_HOST,
+        'timeouts': {'connect': LM_CONNECT_TIMEOUT, 'read': LM_READ_TIMEOUT, 'pool': LM_POOL_TIMEOUT},
+    }
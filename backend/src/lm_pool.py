@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+# Pool of interchangeable LM endpoints (LM_ENDPOINTS, comma separated).
+#
+# Each /ask_ai call goes to the endpoint with the lowest expected cost:
+# (requests already queued or in flight there + 1) x its recent latency (EWMA).
+# A per-endpoint circuit breaker keeps traffic off a failing host:
+#
+#   closed     normal; LM_BREAKER_FAILURES consecutive failures -> open
+#   open       skipped; after LM_BREAKER_COOLDOWN seconds (or a good probe) -> half_open
+#   half_open  exactly one trial request; success -> closed, failure -> open again
+#
+# A background task probes every endpoint each LM_PROBE_INTERVAL seconds with the
+# same check as /probe_lm, so a dead host is opened before a player hits it and a
+# recovered one is let back in without waiting for real traffic.
+#
+# Failover: a connect error, timeout, 5xx or full admission queue on one endpoint
+# moves the call to the next best endpoint (streams only until the first delta has
+# been forwarded). An LM URL chosen by the client is only honoured when LM_ENDPOINTS
+# is not set; one of the pool's own endpoints always goes through the pool (breaker,
+# failover), and with LM_ENDPOINTS set any other client URL is ignored.
+#
+# Everything here runs on the event loop; no locking needed.
+import asyncio
+import os
+import random
+import time
+
+import httpx
+
+import lm_client
+from lm_scheduler import LMBusy
+
+LM_ENDPOINTS = os.getenv('LM_ENDPOINTS', '')
+LM_BREAKER_FAILURES = int(os.getenv('LM_BREAKER_FAILURES', '3'))
+LM_BREAKER_COOLDOWN = float(os.getenv('LM_BREAKER_COOLDOWN', '15'))
+LM_PROBE_INTERVAL = float(os.getenv('LM_PROBE_INTERVAL', '10'))
+LM_PROBE_TIMEOUT = float(os.getenv('LM_PROBE_TIMEOUT', '5'))
+LM_LATENCY_ALPHA = 0.2
+LM_INITIAL_LATENCY_MS = 1000.0
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class LMUnavailable(Exception):
+    # every endpoint's circuit is open
+    pass
+
+
+def error_outcome(e: httpx.HTTPError) -> str:
+    # metric label for a failed LM call
+    if isinstance(e, httpx.TimeoutException):
+        return 'timeout'
+    if isinstance(e, httpx.HTTPStatusError):
+        return 'http_status'
+    return 'connect_error'
+
+
+def _is_endpoint_failure(e: httpx.HTTPError) -> bool:
+    # a 4xx is our request's fault, not the host's
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code >= 500
+    return True
+
+
+class Endpoint:
+    def __init__(self, url: str):
+        self.url = url
+        self.state = CLOSED
+        self.failures = 0  # consecutive
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.latency_ms = None  # EWMA of successful calls
+        self.successes = 0
+        self.errors = 0
+        self.trips = 0
+        self.last_error = None
+        self.last_probe = None  # {'ok', 'checked'|'error', 'at'}
+
+    def available(self, now: float) -> bool:
+        if self.state == OPEN and now - self.opened_at >= LM_BREAKER_COOLDOWN:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            return not self.trial_in_flight
+        return self.state == CLOSED
+
+    def stats(self) -> dict:
+        return {
+            'state': self.state,
+            'consecutive_failures': self.failures,
+            'latency_ms': round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            'successes': self.successes,
+            'errors': self.errors,
+            'trips': self.trips,
+            'last_error': self.last_error,
+            'last_probe': self.last_probe,
+        }
+
+
+class LMPool:
+    def __init__(self, urls, scheduler, configured: bool = True):
+        self.scheduler = scheduler
+        # LM_ENDPOINTS given explicitly: clients don't get to pick an LM outside the pool
+        self.configured = configured
+        self._endpoints = {}  # resolved url -> Endpoint, in configured order
+        for url in urls:
+            url = lm_client.resolve_lm_url(url)
+            self._endpoints.setdefault(url, Endpoint(url))
+        self.failovers = 0
+        self.unavailable = 0
+
+    def __len__(self):
+        return len(self._endpoints)
+
+    def urls(self):
+        return list(self._endpoints)
+
+    def _cost(self, ep: Endpoint) -> float:
+        latency = ep.latency_ms if ep.latency_ms is not None else LM_INITIAL_LATENCY_MS
+        return (self.scheduler.load(ep.url) + 1) * latency
+
+    def pin(self, url: str = None):
+        # client-chosen LM URL -> URL to use as is, or None to let the pool pick
+        if not url:
+            return None
+        url = lm_client.resolve_lm_url(url)
+        if self.configured or url in self._endpoints:
+            return None
+        return url
+
+    def choose(self, exclude=()):
+        now = time.monotonic()
+        candidates = [ep for url, ep in self._endpoints.items() if url not in exclude and ep.available(now)]
+        if not candidates:
+            return None
+        # random tie-break so equally idle endpoints share the load
+        ep = min(candidates, key=lambda e: (self._cost(e), random.random()))
+        if ep.state == HALF_OPEN:
+            ep.trial_in_flight = True
+        return ep.url
+
+    def attempts(self, pinned: str = None):
+        # endpoints to try in order; the caller reports each outcome before asking for the next
+        if pinned:
+            yield pinned
+            return
+        tried = set()
+        while len(tried) < len(self._endpoints):
+            url = self.choose(tried)
+            if url is None:
+                break
+            if tried:
+                self.failovers += 1
+            tried.add(url)
+            yield url
+        if not tried:
+            self.unavailable += 1
+            raise LMUnavailable('no LM endpoint available (all circuits open)')
+
+    def record_success(self, url: str, latency_ms: float):
+        ep = self._endpoints.get(url)
+        if ep is None:
+            return
+        ep.successes += 1
+        ep.failures = 0
+        ep.trial_in_flight = False
+        if ep.state != CLOSED:
+            print(f"LM endpoint {url} recovered, circuit closed")
+        ep.state = CLOSED
+        if ep.latency_ms is None:
+            ep.latency_ms = latency_ms
+        else:
+            ep.latency_ms += LM_LATENCY_ALPHA * (latency_ms - ep.latency_ms)
+
+    def record_failure(self, url: str, error: str):
+        ep = self._endpoints.get(url)
+        if ep is None:
+            return
+        ep.errors += 1
+        ep.failures += 1
+        ep.last_error = error
+        if ep.state == HALF_OPEN or ep.failures >= LM_BREAKER_FAILURES:
+            self._trip(ep)
+
+    def release_trial(self, url: str):
+        # the trial ended without saying anything about the host (busy, cancelled, bad output)
+        ep = self._endpoints.get(url)
+        if ep is not None:
+            ep.trial_in_flight = False
+
+    def _trip(self, ep: Endpoint):
+        if ep.state != OPEN:
+            ep.trips += 1
+            print(f"LM endpoint {ep.url} circuit opened after {ep.failures} failures: {ep.last_error}")
+        ep.state = OPEN
+        ep.opened_at = time.monotonic()
+        ep.trial_in_flight = False
+
+    async def complete(self, payload: dict, priority: int, pinned: str = None, observe=None):
+        # -> (response json, url that answered); raises LMBusy / httpx.HTTPError / LMUnavailable
+        # when no endpoint could answer. observe(url, outcome, seconds) sees every failed attempt.
+        last_exc = None
+        busy = None
+        for url in self.attempts(pinned):
+            started = time.perf_counter()
+            try:
+                async with self.scheduler.slot(url, priority):
+                    data = await lm_client.post_chat_completion(url, payload)
+            except LMBusy as e:
+                self.release_trial(url)
+                busy = e
+                if observe:
+                    observe(url, 'busy', time.perf_counter() - started)
+                continue
+            except httpx.HTTPError as e:
+                self._failed(url, e, started, observe)
+                last_exc = e
+                if not _is_endpoint_failure(e):
+                    raise
+                continue
+            except BaseException:
+                self.release_trial(url)
+                raise
+            self.record_success(url, (time.perf_counter() - started) * 1000.0)
+            return data, url
+        raise busy or last_exc
+
+    async def stream(self, payload: dict, priority: int, pinned: str = None, observe=None, info: dict = None):
+        # yields content deltas; fails over only while nothing has been yielded yet.
+        # info['url'] is set to the endpoint that is streaming.
+        last_exc = None
+        busy = None
+        for url in self.attempts(pinned):
+            started = time.perf_counter()
+            if info is not None:
+                info['url'] = url
+            yielded = False
+            try:
+                async with self.scheduler.slot(url, priority):
+                    async for delta in lm_client.stream_chat_completion(url, payload):
+                        yielded = True
+                        yield delta
+            except LMBusy as e:
+                self.release_trial(url)
+                busy = e
+                if observe:
+                    observe(url, 'busy', time.perf_counter() - started)
+                continue
+            except httpx.HTTPError as e:
+                self._failed(url, e, started, observe)
+                if yielded or not _is_endpoint_failure(e):
+                    raise
+                last_exc = e
+                continue
+            except BaseException:
+                self.release_trial(url)
+                raise
+            self.record_success(url, (time.perf_counter() - started) * 1000.0)
+            return
+        raise busy or last_exc
+
+    def _failed(self, url: str, e: httpx.HTTPError, started: float, observe):
+        print(f"LM endpoint {url} failed: {type(e).__name__}: {e}")
+        if _is_endpoint_failure(e):
+            self.record_failure(url, f"{type(e).__name__}: {e}")
+        else:
+            self.release_trial(url)
+        if observe:
+            observe(url, error_outcome(e), time.perf_counter() - started)
+
+    async def probe_once(self):
+        results = await asyncio.gather(*(lm_client.probe(url, LM_PROBE_TIMEOUT) for url in self._endpoints))
+        for ep, res in zip(list(self._endpoints.values()), results):
+            ep.last_probe = dict(res, at=time.time())
+            if not res['ok']:
+                ep.failures = max(ep.failures, LM_BREAKER_FAILURES)
+                ep.last_error = f"probe: {res.get('error')}"
+                if ep.state != OPEN:
+                    self._trip(ep)
+            elif ep.state == OPEN:
+                # reachable again: let one real request confirm it
+                ep.state = HALF_OPEN
+
+    async def run_probes(self, interval: float = LM_PROBE_INTERVAL):
+        while True:
+            try:
+                await self.probe_once()
+            except Exception as e:
+                print(f"LM endpoint probe failed: {e}")
+            await asyncio.sleep(interval)
+
+    def stats(self) -> dict:
+        return {
+            'endpoints': {url: ep.stats() for url, ep in self._endpoints.items()},
+            'failovers': self.failovers,
+            'unavailable': self.unavailable,
+            'breaker': {'failures': LM_BREAKER_FAILURES, 'cooldown_s': LM_BREAKER_COOLDOWN},
+            'probe_interval_s': LM_PROBE_INTERVAL,
+        }
+
+
+def open_lm_pool(scheduler) -> LMPool:
+    urls = [u.strip() for u in LM_ENDPOINTS.split(',') if u.strip()]
+    return LMPool(urls or [lm_client.LMSTUDIO_API_URL], scheduler, configured=bool(urls))
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+# Admission control in front of the LM servers.
+#
+# Each LM endpoint gets a bounded number of in-flight completions and a bounded
+# wait queue ordered by priority class, so a burst of submissions queues up
+# (VS grading first) instead of piling onto LMStudio until everything times out.
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+from lm_client import host_key
+
+LM_MAX_IN_FLIGHT = int(os.getenv('LM_MAX_IN_FLIGHT', '4'))
+LM_MAX_QUEUE = int(os.getenv('LM_MAX_QUEUE', '64'))
+# LM hosts tracked at once; the URL comes from the client, so the table must not grow with it
+LM_MAX_ENDPOINTS = int(os.getenv('LM_MAX_ENDPOINTS', '32'))
+LM_MIN_RETRY_MS = 250
+
+# lower value = served first
+PRIORITY_VS = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_PRACTICE = 2
+PRIORITY_NAMES = {PRIORITY_VS: 'vs', PRIORITY_DEFAULT: 'default', PRIORITY_PRACTICE: 'practice'}
+
+
+def priority_for_mode(mode):
+    if mode == 'vs':
+        return PRIORITY_VS
+    if mode in ('practice', 'programming'):
+        return PRIORITY_PRACTICE
+    return PRIORITY_DEFAULT
+
+
+class LMBusy(Exception):
+    def __init__(self, retry_after_ms: int):
+        super().__init__(f"LM endpoint busy, retry in {retry_after_ms} ms")
+        self.retry_after_ms = retry_after_ms
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    idx = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+class EndpointScheduler:
+    def __init__(self, max_in_flight: int = LM_MAX_IN_FLIGHT, max_queue: int = LM_MAX_QUEUE):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self.in_flight = 0
+        self._waiters = []  # heap of [priority, seq, future]
+        self._waiting = 0  # live (not cancelled/evicted) entries in _waiters
+        self._seq = itertools.count()
+        self.admitted = 0
+        self.rejected = 0
+        self.evicted = 0
+        self.completed = 0
+        self._wait_ms = {p: deque(maxlen=512) for p in PRIORITY_NAMES}
+        self._service_ms = deque(maxlen=128)
+
+    def queue_depth(self) -> int:
+        return self._waiting
+
+    def _retry_after_ms(self) -> int:
+        avg_service = (sum(self._service_ms) / len(self._service_ms)) if self._service_ms else 1000.0
+        # time until the queue ahead of a new caller drains through the in-flight slots
+        est = avg_service * (self._waiting + 1) / self.max_in_flight
+        return max(LM_MIN_RETRY_MS, int(est))
+
+    def _evict_lowest(self, priority: int) -> bool:
+        # make room for a more urgent caller by bouncing the least urgent, most recent waiter
+        worst = None
+        for entry in self._waiters:
+            if entry[2].done():
+                continue
+            if worst is None or (entry[0], entry[1]) > (worst[0], worst[1]):
+                worst = entry
+        if worst is None or worst[0] <= priority:
+            return False
+        worst[2].set_exception(LMBusy(self._retry_after_ms()))
+        self._waiting -= 1
+        self.evicted += 1
+        return True
+
+    async def acquire(self, priority: int = PRIORITY_DEFAULT) -> float:
+        start = time.monotonic()
+        if self.in_flight < self.max_in_flight and self._waiting == 0:
+            self.in_flight += 1
+            self.admitted += 1
+            self._wait_ms[priority].append(0.0)
+            return 0.0
+        if self._waiting >= self.max_queue and not self._evict_lowest(priority):
+            self.rejected += 1
+            raise LMBusy(self._retry_after_ms())
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [priority, next(self._seq), fut])
+        self._waiting += 1
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if not fut.done() or fut.cancelled():
+                self._waiting -= 1
+            elif fut.exception() is None:
+                # the slot was handed to us just before the caller went away
+                self.release()
+            # else: evicted just before the caller went away; _evict_lowest already uncounted it
+            raise
+        waited = (time.monotonic() - start) * 1000.0
+        self.admitted += 1
+        self._wait_ms[priority].append(waited)
+        return waited
+
+    def release(self, service_ms: float = None):
+        if service_ms is not None:
+            self._service_ms.append(service_ms)
+            self.completed += 1
+        self.in_flight -= 1
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if fut.done():
+                continue
+            self._waiting -= 1
+            self.in_flight += 1
+            fut.set_result(None)
+            break
+
+    def stats(self) -> dict:
+        waits = {}
+        for prio, values in self._wait_ms.items():
+            vals = sorted(values)
+            waits[PRIORITY_NAMES[prio]] = {
+                'samples': len(vals),
+                'p50_ms': _percentile(vals, 50),
+                'p95_ms': _percentile(vals, 95),
+                'max_ms': vals[-1] if vals else None,
+            }
+        return {
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'queue_depth': self._waiting,
+            'max_queue': self.max_queue,
+            'admitted': self.admitted,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'evicted': self.evicted,
+            'wait_ms': waits,
+        }
+
+
+class LMScheduler:
+    def __init__(self, max_in_flight: int = LM_MAX_IN_FLIGHT, max_queue: int = LM_MAX_QUEUE,
+                 max_endpoints: int = LM_MAX_ENDPOINTS):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_endpoints = max(1, max_endpoints)
+        self._endpoints = OrderedDict()  # "scheme://host:port" -> EndpointScheduler, least recently used first
+
+    def _evict_idle(self) -> bool:
+        for key, sched in self._endpoints.items():
+            if sched.in_flight == 0 and sched.queue_depth() == 0:
+                del self._endpoints[key]
+                return True
+        return False
+
+    def endpoint(self, url: str) -> EndpointScheduler:
+        # one scheduler per LM host, so a different path or query on the same server shares its cap
+        key = host_key(url)
+        sched = self._endpoints.get(key)
+        if sched is not None:
+            self._endpoints.move_to_end(key)
+            return sched
+        if len(self._endpoints) >= self.max_endpoints and not self._evict_idle():
+            raise LMBusy(LM_MIN_RETRY_MS)
+        sched = EndpointScheduler(self.max_in_flight, self.max_queue)
+        self._endpoints[key] = sched
+        return sched
+
+    def load(self, url: str) -> int:
+        # in-flight + queued work on url's host, without starting to track it
+        sched = self._endpoints.get(host_key(url))
+        return sched.in_flight + sched.queue_depth() if sched is not None else 0
+
+    @asynccontextmanager
+    async def slot(self, url: str, priority: int = PRIORITY_DEFAULT):
+        sched = self.endpoint(url)
+        await sched.acquire(priority)
+        started = time.monotonic()
+        try:
+            yield sched
+        finally:
+            sched.release((time.monotonic() - started) * 1000.0)
+
+    def stats(self) -> dict:
+        return {key: s.stats() for key, s in self._endpoints.items()}
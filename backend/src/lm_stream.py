@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+# Helpers for reading model output that may be wrapped in <think> blocks and
+# arrive token by token: reasoning stripping, incremental JSON field extraction
+# and Server-Sent Events framing.
+import json
+import re
+
+THINK_OPEN = '<think>'
+THINK_CLOSE = '</think>'
+_THINK_BLOCK_RE = re.compile(r'<think>.*?(</think>|$)', re.DOTALL)
+
+
+def strip_reasoning(text: str) -> str:
+    return _THINK_BLOCK_RE.sub('', text or '')
+
+
+def extract_json_object(raw: str) -> dict:
+    # parse the first top-level JSON object, ignoring <think> blocks, code fences and chatter
+    text = strip_reasoning(raw).strip()
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    start = text.find('{')
+    end = text.rfind('}')
+    if start < 0 or end <= start:
+        raise ValueError('no JSON object in model output')
+    return json.loads(text[start:end + 1])
+
+
+class ThinkStripper:
+    # streaming counterpart of strip_reasoning; tags may be split across chunks
+    def __init__(self):
+        self._in_think = False
+        self._pending = ''
+
+    def feed(self, chunk: str) -> str:
+        buf = self._pending + chunk
+        self._pending = ''
+        out = []
+        while buf:
+            tag = THINK_CLOSE if self._in_think else THINK_OPEN
+            idx = buf.find(tag)
+            if idx >= 0:
+                if not self._in_think:
+                    out.append(buf[:idx])
+                buf = buf[idx + len(tag):]
+                self._in_think = not self._in_think
+                continue
+            # keep a possible partial tag at the end for the next chunk
+            keep = 0
+            for n in range(min(len(tag) - 1, len(buf)), 0, -1):
+                if tag.startswith(buf[-n:]):
+                    keep = n
+                    break
+            if not self._in_think:
+                out.append(buf[:len(buf) - keep])
+            self._pending = buf[len(buf) - keep:]
+            break
+        return ''.join(out)
+
+
+class JSONFieldScanner:
+    # Incrementally scans a single JSON object and reports each top-level field as
+    # soon as its value is complete, e.g. {"answer": "x", ... yields ('answer', 'x')
+    # before the rest of the object has been generated.
+    def __init__(self):
+        self._buf = []
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key = None
+        self._expect_key = True
+        self._token = []  # characters of the current key or top-level value
+        self.done = False
+
+    def feed(self, chunk: str):
+        fields = []
+        for ch in chunk:
+            if self.done:
+                break
+            if not self._started:
+                if ch == '{':
+                    self._started = True
+                    self._depth = 1
+                continue
+            if self._in_string:
+                self._token.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._finish_string(fields)
+                continue
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    self._token = [ch]
+                else:
+                    self._token.append(ch)
+            elif ch in '{[':
+                self._depth += 1
+                self._token.append(ch)
+            elif ch in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    self._finish_scalar(fields)
+                    self.done = True
+                else:
+                    self._token.append(ch)
+                    if self._depth == 1:
+                        self._emit(fields, ''.join(self._token))
+            elif self._depth == 1 and ch == ':':
+                self._expect_key = False
+                self._token = []
+            elif self._depth == 1 and ch == ',':
+                self._finish_scalar(fields)
+                self._expect_key = True
+                self._key = None
+                self._token = []
+            elif self._depth > 1 or not ch.isspace():
+                self._token.append(ch)
+        return fields
+
+    def _finish_string(self, fields):
+        text = ''.join(self._token)
+        if self._expect_key:
+            try:
+                self._key = json.loads(text)
+            except ValueError:
+                self._key = None
+            self._token = []
+        else:
+            self._emit(fields, text)
+
+    def _finish_scalar(self, fields):
+        # numbers / true / false / null end at the next ',' or '}'
+        if self._key is not None and self._token:
+            self._emit(fields, ''.join(self._token))
+
+    def _emit(self, fields, text):
+        if self._key is None:
+            return
+        try:
+            fields.append((self._key, json.loads(text)))
+        except ValueError:
+            pass
+        self._key = None
+        self._token = []
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
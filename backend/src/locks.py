@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Striped locks for the in-process state (per rule queue, per room, per game).
+#
+# A key such as ('rule', 'classic') or ('game', game_id) hashes to one of a
+# fixed number of stripes, so memory stays bounded no matter how many rooms or
+# games come and go, and unrelated keys rarely contend. hold() takes every
+# stripe it needs at once in ascending stripe order, which gives all callers
+# one global lock order and rules out deadlock between two multi-key holders.
+#
+# Rules for users of a LockTable:
+#   - take all keys for an operation in a single hold() call, never nest hold()
+#   - never call into another component (or publish events) while holding
+#   - small leaf locks (plain threading.Lock guarding one index) may be taken
+#     inside hold(), never the other way round
+import os
+import threading
+from contextlib import contextmanager
+
+STATE_LOCK_STRIPES = int(os.getenv('STATE_LOCK_STRIPES', '64'))
+
+
+class LockTable:
+    def __init__(self, stripes: int = STATE_LOCK_STRIPES):
+        self._locks = [threading.Lock() for _ in range(max(1, stripes))]
+        self.contended = 0
+
+    def __len__(self):
+        return len(self._locks)
+
+    def stripe(self, key) -> int:
+        return hash(key) % len(self._locks)
+
+    @contextmanager
+    def hold(self, *keys):
+        # keys that are None are skipped, so optional keys (e.g. "old room, if any") can be passed as is
+        order = sorted({self.stripe(k) for k in keys if k is not None})
+        taken = []
+        try:
+            for i in order:
+                lock = self._locks[i]
+                if not lock.acquire(blocking=False):
+                    self.contended += 1  # approximate, only for stats
+                    lock.acquire()
+                taken.append(lock)
+            yield
+        finally:
+            for lock in reversed(taken):
+                lock.release()
+
+    def stats(self) -> dict:
+        return {'stripes': len(self._locks), 'contended': self.contended}
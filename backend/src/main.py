@@ -1,55 +1,104 @@
 # -*- coding: utf-8 -*-
 import os
-import json
-import requests
-from fastapi import FastAPI
+import sys
+import asyncio
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 import re
 from fastapi.staticfiles import StaticFiles
 import time
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, Union
 import uuid
-import random
 
-# load question bank for server-side distribution (do not expose answers to clients)
 HERE = os.path.dirname(__file__)
+# sibling modules must be importable both as `main:app` (docker) and `backend.src.main:app` (reboot.sh)
+if HERE not in sys.path:
+    sys.path.insert(0, HERE)
+
+import httpx
+import lm_client
+from lm_scheduler import LMScheduler, LMBusy, priority_for_mode
+from lm_pool import open_lm_pool, LMUnavailable
+from grading_cache import GradingCache, grading_key
+from answer_matcher import AnswerMatcher
+from question_bank import QuestionBank
+from question_source import QuestionSource, validate_questions, validate_programming, watch_sources
+from state_store import open_state_store
+from score_store import open_score_store
+import memory_report
+from metrics import Registry, MetricsMiddleware, watch_loop_lag, LONG_BUCKETS, LAG_BUCKETS
+from lm_stream import ThinkStripper, JSONFieldScanner, extract_json_object, strip_reasoning, sse_event
+
+# load question bank for server-side distribution (do not expose answers to clients).
+# Both question files are watched and hot-swapped (QUESTIONS_WATCH_INTERVAL); a file that
+# fails validation is reported and the previous version keeps serving.
 DATA_PATH = os.path.join(HERE, "data", "questions.json")
-ALL_QUESTIONS = []
-try:
-    with open(DATA_PATH, 'r', encoding='utf-8') as f:
-        ALL_QUESTIONS = json.load(f)
-    print(f"Successfully loaded {len(ALL_QUESTIONS)} questions from {DATA_PATH}")
-except Exception as e:
+PROGRAMMING_QUESTIONS_PATH = os.getenv('PROGRAMMING_QUESTIONS_PATH', os.path.abspath(os.path.join(HERE, '..', '..', 'frontend', 'data', 'programming_questions.json')))
+
+
+class QuestionSet:
+    # one loaded version of questions.json, swapped in as a whole
+    def __init__(self, questions):
+        # normalized records, (category, difficulty) indexes and pre-encoded sanitized payloads
+        self.bank = QuestionBank(questions)
+        # normalized answer index so obvious hits/misses are decided without an LM round-trip
+        self.matcher = AnswerMatcher(questions)
+
 
-    print(f"CRITICAL: Failed to load questions from {DATA_PATH}: {e}")
-    
+QUESTIONS = QuestionSource('questions', DATA_PATH, lambda parsed: QuestionSet(validate_questions(parsed)))
+PROGRAMMING_QUESTIONS = QuestionSource('programming questions', PROGRAMMING_QUESTIONS_PATH, validate_programming)
+QUESTIONS.reload()
+if QUESTIONS.current is None:
+    print(f"CRITICAL: Failed to load questions from {DATA_PATH}: {QUESTIONS.last_error}")
+    QUESTIONS.current = QuestionSet([])
+else:
+    print(f"Successfully loaded {len(QUESTIONS.current.bank)} questions from {DATA_PATH}")
+PROGRAMMING_QUESTIONS.reload()
 
 # server runtime state
 SERVER_ID = str(uuid.uuid4())
-PLAYERS = {}  # player_id -> { nickname, last_seen, session_token }
-
-# helper: find player_id by session_token or validate player_id
-def resolve_player(player_id: Optional[str] = None, session_token: Optional[str] = None):
-    if player_id and player_id in PLAYERS:
-        return player_id
-    if session_token:
-        for pid, pdata in PLAYERS.items():
-            if pdata.get('session_token') == session_token:
-                return pid
-    return None
-# rule -> list of waiting entries {player_id, joined_at}
-WAITING_BY_RULE = {}
-GAMES = {}  # game_id -> { players: [player_id], questions: [q], pointer: int }
 MIN_PLAYERS = 3
-SCORES = {'solo': [], 'rta': [], 'vs': []}  # list of { player, score, time, meta }
 DEFAULT_QUESTIONS_PER_GAME = int(os.getenv('QUESTIONS_PER_GAME', '10'))
-ROOMS = {}  # room_id -> { name, password, max_players, rule, players: [player_id], creator }
-# map player_id -> pending game_id so players who poll later can receive game info
-PLAYER_GAME_MAP = {}
 
 # --- Player activity timeout ---
 PLAYER_TIMEOUT_SECONDS = 30
+# an open push channel refreshes last_seen this often
+CHANNEL_TOUCH_SECONDS = PLAYER_TIMEOUT_SECONDS / 3
+# a VS game ends this long after the first player finishes
+GAME_END_AFTER_FIRST_FINISH_SECONDS = 60
+# games nobody finishes (everyone left) are force-finalized and archived after this long
+GAME_MAX_LIFETIME_SECONDS = int(os.getenv('GAME_MAX_LIFETIME_SECONDS', '1800'))
+
+# lobby/game state: in-process by default, or shared by every worker through STATE_STORE_URL (redis://...)
+STATE = open_state_store(MIN_PLAYERS, pending_ttl=GAME_MAX_LIFETIME_SECONDS)
+PLAYERS = STATE.players  # player_id -> Player(nickname, last_seen, session_token), indexed by token
+# per-rule FIFO queues of waiting entries {player_id, joined_at} + player -> rule index
+MATCHMAKER = STATE.matchmaker
+# room_id -> { name, password, max_players, rule, players: [player_id], creator } + player -> room index
+ROOMS = STATE.rooms
+# live games (pending/active/finalizing) + bounded archive of finished ones (GAME_ARCHIVE_MAX / GAME_ARCHIVE_TTL),
+# and player_id -> pending game_id so players who poll later can receive game info
+GAMES = STATE.games  # game_id -> { players: [player_id], questions: [q], pointer: int, state }
+
+# helper: find player_id by session_token or validate player_id
+def resolve_player(player_id: Optional[str] = None, session_token: Optional[str] = None):
+    return PLAYERS.resolve(player_id, session_token)
+
+# bounded in-flight/queue per LM endpoint (LM_MAX_IN_FLIGHT / LM_MAX_QUEUE)
+LM_SCHEDULER = LMScheduler()
+# LM_ENDPOINTS (default: LMSTUDIO_API_URL) behind health probes, circuit breakers and failover
+LM_POOL = open_lm_pool(LM_SCHEDULER)
+# parsed /ask_ai results keyed on normalized input + mode + model (GRADING_CACHE_SIZE / GRADING_CACHE_TTL)
+GRADING_CACHE = GradingCache()
+# push channel: match found / score / done / countdown / final ranking events per player
+# (fanned out to every worker through the state store when it is shared)
+EVENT_HUB = STATE.events
+# background timers: ('player', pid) inactivity expiry, ('game', gid) end-of-game finalization,
+# ('game_expire', gid) abandoned game cleanup; one shared set of deadlines with a shared store
+DEADLINES = STATE.deadlines
 
 app = FastAPI()
 
@@ -64,6 +113,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Prometheus metrics at /metrics. Only the request histogram runs on every request;
+# depths, counts and cache numbers are read from their owners at scrape time.
+METRICS = Registry()
+HTTP_LATENCY = METRICS.histogram('http_request_duration_seconds', 'HTTP request latency by route template.', ('method', 'route', 'status'))
+LM_LATENCY = METRICS.histogram('lm_request_duration_seconds', 'LM completion latency (admission wait included) by endpoint and outcome.', ('endpoint', 'outcome'))
+LOBBY_WAIT = METRICS.histogram('lobby_wait_seconds', 'Time from lobby join to match.', ('rule',), buckets=(1, 2, 5, 10, 20, 30, 60, 120, 300))
+GAME_DURATION = METRICS.histogram('game_duration_seconds', 'Time from game creation to finalization.', ('rule',), buckets=LONG_BUCKETS)
+LOOP_LAG = METRICS.histogram('event_loop_lag_seconds', 'Event loop wake-up delay.', buckets=LAG_BUCKETS)
+LOOP_LAG_STATE = {'last': 0.0}
+app.add_middleware(MetricsMiddleware, histogram=HTTP_LATENCY)
+
 # Serve BGM static files placed in project-root /bgm directory at /bgm/<filename>
 # HERE is backend/src, go two levels up to reach repository root
 bgm_dir = os.path.abspath(os.path.join(HERE, '..', '..', 'bgm'))
@@ -90,55 +150,111 @@ except Exception as e:
 
 
 
-def cleanup_inactive_players():
+def expire_player(pid: str):
+    # called by the deadline scheduler (in a worker thread) when a player's inactivity deadline passes
+    player = PLAYERS.get(pid)
+    if player is None:
+        return
     now = time.time()
-    inactive_players = [pid for pid, pdata in PLAYERS.items() if now - pdata.get('last_seen', 0) > PLAYER_TIMEOUT_SECONDS]
-    
-    if not inactive_players:
+    if EVENT_HUB.is_connected(pid):
+        # an open push channel counts as liveness, no heartbeat needed
+        DEADLINES.schedule(('player', pid), now + PLAYER_TIMEOUT_SECONDS)
         return
+    if now - player.last_seen <= PLAYER_TIMEOUT_SECONDS:
+        # heartbeats only bump last_seen; push the deadline out lazily here
+        DEADLINES.schedule(('player', pid), player.last_seen + PLAYER_TIMEOUT_SECONDS)
+        return
+    print(f"Cleaning up inactive player: {pid}")
+    PLAYERS.remove(pid)
+    # remove from the rule waiting queue and the room the player is in
+    MATCHMAKER.leave(pid)
+    ROOMS.leave(pid)
+    GAMES.drop_pending(pid)
 
-    print(f"Cleaning up inactive players: {inactive_players}")
-    for pid in inactive_players:
-        PLAYERS.pop(pid, None)
-        # remove from any rule waiting lists
-        for rule, lst in list(WAITING_BY_RULE.items()):
-            newlst = [e for e in lst if e.get('player_id') != pid]
-            if not newlst:
-                WAITING_BY_RULE.pop(rule, None)
-            else:
-                WAITING_BY_RULE[rule] = newlst
-        for room_id, room_data in list(ROOMS.items()):
-            if pid in room_data['players']:
-                room_data['players'].remove(pid)
-                if not room_data['players']:
-                    ROOMS.pop(room_id, None)
-                    print(f"Cleaned up empty room: {room_id}")
-
-LMSTUDIO_API_URL = os.getenv("LMSTUDIO_API_URL", "http://host.docker.internal:1234/v1/chat/completions")
-
-# Scores persistence file (keeps top scores across restarts)
-SCORES_FILE = os.path.join(HERE, 'data', 'scores.json')
-try:
-    if os.path.isfile(SCORES_FILE):
-        with open(SCORES_FILE, 'r', encoding='utf-8') as sf:
-            stored = json.load(sf)
-            # basic validation
-            if isinstance(stored, dict):
-                SCORES = stored
-                # ensure expected modes exist
-                for _mode in ('solo', 'rta', 'vs'):
-                    if _mode not in SCORES or not isinstance(SCORES.get(_mode), list):
-                        SCORES[_mode] = []
-            else:
-                print('scores.json content invalid, starting fresh')
-except Exception as e:
-    print(f'Could not load scores from {SCORES_FILE}: {e}')
+
+def on_deadline(key):
+    kind, ident = key
+    if kind == 'player':
+        expire_player(ident)
+    elif kind == 'game':
+        finalize_game(ident)
+    elif kind == 'game_expire':
+        expire_game(ident)
+
+
+# Scores persistence (keeps top scores across restarts) + finished-game history.
+# SCORE_BACKEND=journal: scores.json snapshot + append-only journal, personal-best boards in memory
+# SCORE_BACKEND=sqlite: SCORES_DB (WAL); imports scores.json on first start
+SCORES_FILE = os.getenv('SCORES_FILE', os.path.join(HERE, 'data', 'scores.json'))
+SCORES_DB = os.getenv('SCORES_DB', os.path.join(HERE, 'data', 'scores.db'))
+SCORE_STORE = open_score_store(SCORES_FILE, SCORES_DB)
+
+
+def record_score(mode: str, rec: dict):
+    # rec: { player (nickname), score, time, meta }
+    SCORE_STORE.record(mode, rec)
 
 class QuestionRequest(BaseModel):
     question: str
     target_answer: str
     lm_server: Optional[str] = None
     mode: Optional[str] = None
+    question_id: Optional[Union[int, str]] = None
+    # VS: answers come from the question set the game was created with, not a newer reload
+    game_id: Optional[str] = None
+    # stream=True answers over Server-Sent Events: answer/score/feedback events, then done
+    stream: Optional[bool] = False
+
+
+def build_ai_result(parsed: dict) -> dict:
+    ai_response_text = parsed.get('answer', '')
+    reasoning = parsed.get('reasoning')
+    valid = parsed.get('valid', True)
+    invalid_reason = parsed.get('invalid_reason')
+    score = parsed.get('score') if isinstance(parsed.get('score'), (int, float)) else None
+    feedback = parsed.get('feedback')
+    # valid: false の場合は is_correct を false にして返す
+    resp = {"ai_response": ai_response_text, "reasoning": reasoning, "valid": bool(valid), "invalid_reason": invalid_reason}
+    if score is not None:
+        try:
+            resp['score'] = int(score)
+        except Exception:
+            resp['score'] = None
+    if feedback is not None:
+        resp['feedback'] = feedback
+    if valid is False:
+        resp['is_correct'] = False
+    return resp
+
+
+def lm_busy_response(e: LMBusy) -> dict:
+    print(f"LMStudio busy, rejected request (retry in {e.retry_after_ms} ms)")
+    return {"ai_response": "", "valid": False, "is_correct": False, "busy": True, "retry_after_ms": e.retry_after_ms, "invalid_reason": "lm_busy", "invalid_message": f"AIサーバーが混雑しています。{e.retry_after_ms / 1000:.1f}秒後に再試行してください。"}
+
+
+def observe_lm_attempt(url: str, outcome: str, seconds: float):
+    LM_LATENCY.observe(seconds, lm_client.host_key(url), outcome)
+
+
+def game_answers(game_id: Optional[str], question_id):
+    # accepted answers of a question as of the game's question set; None when not a game question
+    if not game_id or question_id is None:
+        return None
+    g = GAMES.get(game_id)
+    found = (g or {}).get('answers', {}).get(str(question_id))
+    return frozenset(found) if found else None
+
+
+def sse_response(events):
+    return StreamingResponse(events, media_type='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def with_correctness(resp: dict, answers) -> dict:
+    # judge the model's answer against every accepted answer of the question; only a certain
+    # hit is reported, otherwise is_correct stays unset and the client's own check decides
+    if answers and 'is_correct' not in resp and QUESTIONS.current.matcher.judge(resp.get('ai_response') or '', answers):
+        resp['is_correct'] = True
+    return resp
 
 
 class ProbeRequest(BaseModel):
@@ -168,12 +284,28 @@ async def ask_ai(request: QuestionRequest):
                 return True
         return False
 
+    def reply(resp: dict):
+        # streaming callers always get an event stream, even for locally decided results
+        if request.stream:
+            return sse_response(iter([sse_event('done', resp)]))
+        return resp
+
     qtxt = request.question or ''
     # Skip obfuscation check for programming mode
     if request.mode != 'programming' and is_obfuscated(qtxt):
-        return {"ai_response": "", "valid": False, "is_correct": False, "invalid_reason": "input_looks_obfuscated", "invalid_message": "入力が難読化されているようです。普通の日本語で再入力してください。"}
+        return reply({"ai_response": "", "valid": False, "is_correct": False, "invalid_reason": "input_looks_obfuscated", "invalid_message": "入力が難読化されているようです。普通の日本語で再入力してください。"})
     if request.mode != 'programming' and contains_dangerous(qtxt):
-        return {"ai_response": "", "valid": False, "is_correct": False, "invalid_reason": "disallowed_content", "invalid_message": "危険または違法な行為を示唆する内容には回答できません。"}
+        return reply({"ai_response": "", "valid": False, "is_correct": False, "invalid_reason": "disallowed_content", "invalid_message": "危険または違法な行為を示唆する内容には回答できません。"})
+    matcher = QUESTIONS.current.matcher
+    answers = frozenset()
+    if request.mode != 'programming':
+        answers = await run_in_threadpool(game_answers, request.game_id, request.question_id)
+        if answers is None:
+            answers = matcher.answers_for(request.question_id, request.target_answer)
+    # VS mode lets a question containing the answer through to the LM, as the frontend always did
+    if request.mode != 'vs' and matcher.precheck(qtxt, answers) is False:
+        # the model would only echo the answer back: decided locally, no LM call
+        return reply({"ai_response": "", "valid": False, "is_correct": False, "local": True, "invalid_reason": "answer_in_question", "invalid_message": "質問に答えが含まれています。"})
     # Instruct the model to return a strict JSON object with score/feedback so frontend can display a 0-100 score and textual feedback.
     # Expected JSON schema the model should return exactly (no extra text outside JSON):
     # {
@@ -207,124 +339,286 @@ async def ask_ai(request: QuestionRequest):
     "max_tokens": 800,
     }
 
+    # the pool picks (and fails over); a client-chosen LM server outside the pool is only used as is
+    # when no LM_ENDPOINTS are configured
+    pinned_url = LM_POOL.pin(request.lm_server)
+    cache_key = grading_key(request.question, request.mode, payload['model'], pinned_url or 'pool')
+    cached = GRADING_CACHE.get(cache_key)
+    if cached is not None:
+        cached['cached'] = True
+        return reply(with_correctness(cached, answers))
+
+    if request.stream:
+        return sse_response(stream_ask_ai(request, payload, pinned_url, cache_key, answers))
+
     ai_response_text = ""
+    started = time.perf_counter()
+    outcome = None  # failed attempts are observed by the pool
+    used_url = None
     try:
-        # determine LMStudio URL: prefer the one provided by the client, otherwise use env/default
-        target_lm_url = request.lm_server or LMSTUDIO_API_URL
-        # Special rule: domains under 'りん.com' (and its punycode xn--nbks) use ?p= for port and ?a= for path
-        try:
-            from urllib.parse import urlparse, parse_qs, urlunparse
-            up = urlparse(target_lm_url)
-            host = up.hostname or ''
-            # convert unicode host to ascii punycode for comparison
-            try:
-                host_ascii = host.encode('idna').decode()
-            except Exception:
-                host_ascii = host
-            if host_ascii.endswith('りん.com') or host_ascii.endswith('xn--nbks') or host_ascii.endswith('.りん.com') or host_ascii.endswith('.xn--nbks'):
-                qs = parse_qs(up.query)
-                port_vals = qs.get('p') or qs.get('port') or []
-                a_vals = qs.get('a') or qs.get('path') or []
-                port = None
-                if port_vals:
-                    try:
-                        port = int(port_vals[0])
-                    except Exception:
-                        port = None
-                # rebuild netloc with explicit port if provided
-                netloc = up.hostname or ''
-                if port:
-                    netloc = f"{netloc}:{port}"
-                # determine base path from 'a' param or default to v1/chat/completions
-                a_path = a_vals[0] if a_vals else 'v1/chat/completions'
-                # ensure a_path doesn't start with /
-                a_path = a_path.lstrip('/')
-                target_lm_url = urlunparse((up.scheme or 'http', netloc, '/' + a_path, '', '', ''))
-            else:
-                # normalize: if caller gave base URL without path, append the common LMStudio path
-                if 'v1' not in target_lm_url:
-                    target_lm_url = target_lm_url.rstrip('/') + '/v1/chat/completions'
-        except Exception:
-            # fallback behavior
-            if 'v1' not in target_lm_url:
-                target_lm_url = target_lm_url.rstrip('/') + '/v1/chat/completions'
-        print(f"Using LMStudio URL: {target_lm_url}")
-        response = requests.post(target_lm_url, json=payload, timeout=30)
-        response.raise_for_status()
-        data = response.json()
+        # queue behind other requests for the endpoint; VS grading is served before practice/programming.
+        # pooled async client: a slow completion no longer blocks the event loop
+        data, used_url = await LM_POOL.complete(payload, priority_for_mode(request.mode), pinned_url, observe_lm_attempt)
+        outcome = 'error'
         raw = data['choices'][0]['message']['content']
-        # try to parse JSON from model output
+        # try to parse JSON from model output (reasoning models wrap it in <think>...</think>)
         try:
-            parsed = json.loads(raw)
-            ai_response_text = parsed.get('answer', '')
-            reasoning = parsed.get('reasoning')
-            valid = parsed.get('valid', True)
-            invalid_reason = parsed.get('invalid_reason')
-            score = parsed.get('score') if isinstance(parsed.get('score'), (int, float)) else None
-            feedback = parsed.get('feedback')
-            # valid: false の場合は is_correct を false にして返す
-            resp = {"ai_response": ai_response_text, "reasoning": reasoning, "valid": bool(valid), "invalid_reason": invalid_reason}
-            if score is not None:
-                try:
-                    resp['score'] = int(score)
-                except Exception:
-                    resp['score'] = None
-            if feedback is not None:
-                resp['feedback'] = feedback
-            if valid is False:
-                resp['is_correct'] = False
-            return resp
+            resp = build_ai_result(extract_json_object(raw))
+            outcome = 'success'
+            GRADING_CACHE.put(cache_key, resp)
+            return with_correctness(resp, answers)
         except Exception as ex:
+            outcome = 'parse_error'
             print(f"Failed to parse model JSON output: {ex}\nraw:{raw}")
             ai_response_text = raw
-    except requests.exceptions.RequestException as e:
+    except LMBusy as e:
+        return lm_busy_response(e)
+    except (httpx.HTTPError, LMUnavailable) as e:
         print(f"LMStudio connection error: {e}")
         ai_response_text = "AIサーバー（LMStudio）に接続できません。起動しているか確認してください。"
     except Exception as e:
         print(f"Unknown server error: {e}")
         ai_response_text = "サーバー内部で不明なエラーが発生しました。"
+    finally:
+        if outcome:
+            observe_lm_attempt(used_url, outcome, time.perf_counter() - started)
 
     return {"ai_response": ai_response_text}
 
+
+async def stream_ask_ai(request: QuestionRequest, payload: dict, pinned_url: str, cache_key, answers):
+    # forward answer/score/feedback as soon as each JSON field is complete, then the full result
+    stripper = ThinkStripper()
+    scanner = JSONFieldScanner()
+    raw_parts = []
+    started = time.perf_counter()
+    outcome = None  # failed attempts are observed by the pool
+    used = {}
+    try:
+        deltas = LM_POOL.stream(dict(payload, stream=True), priority_for_mode(request.mode), pinned_url, observe_lm_attempt, used)
+        async for delta in deltas:
+            raw_parts.append(delta)
+            for key, value in scanner.feed(stripper.feed(delta)):
+                if key in ('answer', 'score', 'feedback'):
+                    yield sse_event(key, {key: value})
+        outcome = 'error'
+        raw = ''.join(raw_parts)
+        try:
+            resp = build_ai_result(extract_json_object(raw))
+            outcome = 'success'
+            GRADING_CACHE.put(cache_key, resp)
+            resp = with_correctness(resp, answers)
+        except Exception as ex:
+            outcome = 'parse_error'
+            print(f"Failed to parse streamed model JSON output: {ex}\nraw:{raw}")
+            resp = {"ai_response": strip_reasoning(raw).strip()}
+    except LMBusy as e:
+        resp = lm_busy_response(e)
+    except (httpx.HTTPError, LMUnavailable) as e:
+        print(f"LMStudio connection error: {e}")
+        resp = {"ai_response": "AIサーバー（LMStudio）に接続できません。起動しているか確認してください。"}
+    except Exception as e:
+        print(f"Unknown server error: {e}")
+        resp = {"ai_response": "サーバー内部で不明なエラーが発生しました。"}
+    if outcome:
+        observe_lm_attempt(used['url'], outcome, time.perf_counter() - started)
+    yield sse_event('done', resp)
+
+
+@app.on_event('startup')
+async def bind_event_hub():
+    EVENT_HUB.bind_loop(asyncio.get_running_loop())
+
+
+@app.on_event('startup')
+async def start_deadline_scheduler():
+    app.state.deadline_task = asyncio.ensure_future(DEADLINES.run(on_deadline))
+
+
+@app.on_event('shutdown')
+async def stop_deadline_scheduler():
+    task = getattr(app.state, 'deadline_task', None)
+    if task:
+        task.cancel()
+
+
+@app.on_event('startup')
+async def start_question_watcher():
+    app.state.question_watch_task = asyncio.ensure_future(watch_sources([QUESTIONS, PROGRAMMING_QUESTIONS]))
+
+
+@app.on_event('shutdown')
+async def stop_question_watcher():
+    task = getattr(app.state, 'question_watch_task', None)
+    if task:
+        task.cancel()
+
+
+@app.on_event('startup')
+async def start_score_journal():
+    SCORE_STORE.start()
+
+
+@app.on_event('shutdown')
+async def stop_score_journal():
+    # drain pending records; the blocking fsync runs off the event loop
+    await asyncio.get_running_loop().run_in_executor(None, SCORE_STORE.stop)
+
+
+@app.on_event('startup')
+async def start_lm_probes():
+    app.state.lm_probe_task = asyncio.ensure_future(LM_POOL.run_probes())
+
+
+@app.on_event('shutdown')
+async def stop_lm_probes():
+    task = getattr(app.state, 'lm_probe_task', None)
+    if task:
+        task.cancel()
+
+
+@app.on_event('shutdown')
+async def close_lm_clients():
+    await lm_client.close_clients()
+
+
 @app.get("/")
 def read_root():
     return {"message": "Rush-Maximizer server is running."}
 
 
+def _lm_endpoint_stats(field: str) -> dict:
+    return {host: s[field] for host, s in LM_SCHEDULER.stats().items()}
+
+
+METRICS.gauge('players_active', 'Registered players not yet timed out.', lambda: len(PLAYERS))
+METRICS.gauge('lobby_waiting_players', 'Players waiting for a random match.', lambda: MATCHMAKER.stats(), ('rule',))
+METRICS.gauge('rooms_open', 'Private rooms waiting to fill.', lambda: len(ROOMS))
+METRICS.gauge('games_live', 'Games not finished yet.', lambda: GAMES.live_count())
+METRICS.gauge('games_archived', 'Finished games kept for late polls.', lambda: GAMES.archive_count())
+METRICS.gauge('push_connections', 'Open WebSocket push channels.', lambda: EVENT_HUB.connection_count())
+METRICS.gauge('deadlines_scheduled', 'Pending player/game deadlines.', lambda: len(DEADLINES))
+METRICS.gauge('lm_in_flight', 'LM completions in flight.', lambda: _lm_endpoint_stats('in_flight'), ('endpoint',))
+METRICS.gauge('lm_queue_depth', 'LM requests waiting for an admission slot.', lambda: _lm_endpoint_stats('queue_depth'), ('endpoint',))
+METRICS.gauge('lm_endpoint_up', 'LM endpoint circuit state (1 closed, 0.5 half-open, 0 open).', lambda: {lm_client.host_key(url): {'closed': 1, 'half_open': 0.5}.get(s['state'], 0) for url, s in LM_POOL.stats()['endpoints'].items()}, ('endpoint',))
+METRICS.scraped_counter('lm_failovers', 'LM calls moved to another endpoint after a failure.', lambda: LM_POOL.failovers)
+METRICS.scraped_counter('lm_admission_rejected', 'LM requests rejected by admission control.', lambda: _lm_endpoint_stats('rejected'), ('endpoint',))
+METRICS.scraped_counter('grading_cache_hits', 'Grading cache hits.', lambda: GRADING_CACHE.hits)
+METRICS.scraped_counter('grading_cache_misses', 'Grading cache misses.', lambda: GRADING_CACHE.misses)
+METRICS.gauge('grading_cache_hit_ratio', 'Grading cache hit ratio since start.', lambda: GRADING_CACHE.stats()['hit_rate'])
+METRICS.gauge('grading_cache_entries', 'Grading cache size.', lambda: GRADING_CACHE.stats()['size'])
+METRICS.gauge('event_loop_lag_last_seconds', 'Most recent event loop wake-up delay.', lambda: LOOP_LAG_STATE['last'])
+METRICS.gauge('questions_version', 'Loaded questions.json version.', lambda: QUESTIONS.version)
+
+
+@app.on_event('startup')
+async def start_loop_lag_watch():
+    app.state.loop_lag_task = asyncio.ensure_future(watch_loop_lag(LOOP_LAG, LOOP_LAG_STATE))
+
+
+@app.on_event('shutdown')
+async def stop_loop_lag_watch():
+    task = getattr(app.state, 'loop_lag_task', None)
+    if task:
+        task.cancel()
+
+
+@app.get('/metrics')
+def metrics():
+    return Response(METRICS.render(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 @app.get('/status')
 def status():
-    return {"server_id": SERVER_ID, "questions_count": len(ALL_QUESTIONS)}
+    return {"server_id": SERVER_ID, "questions_count": len(QUESTIONS.current.bank)}
+
+
+@app.get('/lm/queue')
+def lm_queue():
+    # per-endpoint in-flight count, queue depth and wait-time percentiles by priority class
+    return {'endpoints': LM_SCHEDULER.stats(), 'pool': lm_client.pool_stats()}
+
+
+@app.get('/lm/endpoints')
+def lm_endpoints():
+    # circuit state, observed latency and last probe of each configured endpoint
+    return LM_POOL.stats()
+
+
+@app.get('/ask_ai/cache')
+def ask_ai_cache_stats():
+    return GRADING_CACHE.stats()
+
+
+class CacheInvalidateRequest(BaseModel):
+    mode: Optional[str] = None
+
+
+@app.post('/ask_ai/cache/invalidate')
+def ask_ai_cache_invalidate(req: CacheInvalidateRequest):
+    # e.g. after changing the grading prompt or switching the LM model
+    removed = GRADING_CACHE.invalidate(req.mode)
+    print(f"grading cache invalidated (mode={req.mode}): {removed} entries")
+    return {'ok': True, 'removed': removed}
+
+
+def question_versions() -> dict:
+    return {
+        'questions': dict(QUESTIONS.info(), count=len(QUESTIONS.current.bank)),
+        'programming': dict(PROGRAMMING_QUESTIONS.info(), count=len((PROGRAMMING_QUESTIONS.current or {}).get('questions', []))),
+    }
+
+
+@app.get('/admin/questions/version')
+def admin_questions_version():
+    return question_versions()
+
+
+@app.post('/admin/questions/reload')
+def admin_questions_reload():
+    # re-read both files now instead of waiting for the watcher; games in progress keep their questions
+    changed = {
+        'questions': QUESTIONS.reload(force=True),
+        'programming': PROGRAMMING_QUESTIONS.reload(force=True),
+    }
+    return {'ok': True, 'changed': changed, 'versions': question_versions()}
+
+
+@app.get('/programming/questions')
+def programming_questions():
+    if PROGRAMMING_QUESTIONS.current is None:
+        return {'error': 'no_questions', 'detail': PROGRAMMING_QUESTIONS.last_error}
+    return dict(PROGRAMMING_QUESTIONS.current, version=PROGRAMMING_QUESTIONS.version)
+
+
+@app.get('/ask_ai/matcher')
+def ask_ai_matcher_stats():
+    return QUESTIONS.current.matcher.stats()
 
 
 @app.post('/probe_lm')
-def probe_lm(req: ProbeRequest):
-    url = req.lm_server
+async def probe_lm(req: ProbeRequest):
+    # same check the LM pool's background health probes use
     try:
-        target = url.rstrip('/')
-        # try a common endpoint; if not available, at least attempt base URL
-        test_urls = [target + '/v1/models', target + '/v1/chat/completions', target]
-        last_err = None
-        for t in test_urls:
-            try:
-                r = requests.get(t, timeout=5)
-                if r.status_code >= 200 and r.status_code < 500:
-                    return { 'ok': True, 'checked': t }
-            except Exception as e:
-                last_err = str(e)
-        return { 'ok': False, 'error': last_err }
+        return await lm_client.probe(req.lm_server)
     except Exception as e:
         return { 'ok': False, 'error': str(e) }
 
 
 class RegisterRequest(BaseModel):
     nickname: str
+    # optional: re-register an existing player (same id, new nickname/token)
+    player_id: Optional[str] = None
+    session_token: Optional[str] = None
 
 
 @app.post('/register')
 def register(req: RegisterRequest):
-    pid = str(uuid.uuid4())
-    token = uuid.uuid4().hex
-    PLAYERS[pid] = { 'nickname': req.nickname, 'last_seen': time.time(), 'session_token': token }
+    existing = PLAYERS.get(req.player_id) if req.player_id else None
+    reuse_id = req.player_id if existing and existing.session_token == req.session_token else None
+    player = PLAYERS.register(req.nickname, reuse_id)
+    pid, token = player.player_id, player.session_token
+    DEADLINES.schedule(('player', pid), player.last_seen + PLAYER_TIMEOUT_SECONDS)
     print(f"player registered: {pid} -> {req.nickname} (token={token[:8]})")
     return { 'player_id': pid, 'session_token': token }
 
@@ -336,7 +630,7 @@ class HeartbeatRequest(BaseModel):
 def heartbeat(req: HeartbeatRequest):
     pid = resolve_player(req.player_id, req.session_token)
     if pid:
-        PLAYERS[pid]['last_seen'] = time.time()
+        PLAYERS.touch(pid)
         return { 'ok': True }
     return { 'ok': False, 'error': 'unknown_player' }
 
@@ -347,83 +641,92 @@ class JoinLobbyRequest(BaseModel):
     session_token: Optional[str] = None
 
 
+def questions_for_rule(rule: str, bank: QuestionBank):
+    qcount = DEFAULT_QUESTIONS_PER_GAME
+    if rule == 'speed':
+        qcount = 5
+    elif rule == 'challenge':
+        qcount = 15
+
+    # already in random order; the sanitized dicts are shared, games only read them
+    return bank.sample(qcount)
+
+
+def create_game(players_for_game, rule: str, room_id: Optional[str] = None):
+    gid = str(uuid.uuid4())
+    question_set = QUESTIONS.current
+    sanitized = questions_for_rule(rule, question_set.bank)
+    # track per-game runtime state: scores by player, done flags, first finisher timestamp, finished flag
+    game = {
+        'players': players_for_game,
+        'questions': sanitized,
+        # accepted answers (normalized) as of this question set, so a hot reload can't change
+        # how an in-flight game is judged; server-side only, never sent to clients
+        'answers': {str(q['id']): sorted(question_set.matcher.answers_for(q['id'])) for q in sanitized if q.get('id') is not None},
+        'pointer': 0,
+        'rule': rule,
+        'scores': {p: 0 for p in players_for_game},
+        'done': {p: False for p in players_for_game},
+        'first_finish_at': None,
+        'finished': False,
+        'started_at': int(time.time())
+    }
+    if room_id:
+        game['room'] = room_id
+    # also records the pending game for each chosen player so they receive it on next poll
+    GAMES.add(gid, game)
+    DEADLINES.schedule(('game_expire', gid), game['started_at'] + GAME_MAX_LIFETIME_SECONDS)
+    EVENT_HUB.publish(players_for_game, 'match_found', {'game_id': gid, 'players': players_for_game, 'questions': sanitized, 'rule': rule})
+    return gid, sanitized
+
+
 @app.post('/lobby/join')
 def lobby_join(req: JoinLobbyRequest):
-    cleanup_inactive_players()
     pid = resolve_player(req.player_id, req.session_token)
     if not pid:
         return { 'error': 'unknown_player' }
     # If a game was already created for this player, return it immediately
-    pending_gid = PLAYER_GAME_MAP.get(pid)
+    # deliver pending game and clear mapping for this player (stale pointers are dropped too)
+    pending_gid = GAMES.take_pending(pid)
     if pending_gid:
+        # picked up: the matchmaker's claim on this player (set when the group was popped) ends here
+        MATCHMAKER.release([pid])
         g = GAMES.get(pending_gid)
         if g:
-            # deliver pending game and clear mapping for this player
-            PLAYER_GAME_MAP.pop(pid, None)
+            GAMES.activate(pending_gid)
             return { 'game_id': pending_gid, 'players': g.get('players', []), 'questions': g.get('questions', []), 'rule': g.get('rule') }
     rule = req.rule or 'classic'
-    lst = WAITING_BY_RULE.setdefault(rule, [])
     # prevent duplicate entry for this player in any rule
-    for r, entries in WAITING_BY_RULE.items():
-        if any(e.get('player_id') == pid for e in entries):
-            return { 'waiting': True, 'position': next((i+1 for i,e in enumerate(entries) if e.get('player_id')==pid), 0), 'total_waiting': len(entries), 'info': f'already_waiting_in_{r}'}
+    waiting = MATCHMAKER.position(pid)
+    if waiting:
+        r, position, total = waiting
+        return { 'waiting': True, 'position': position, 'total_waiting': total, 'info': f'already_waiting_in_{r}'}
     # also prevent if player is already inside a room
-    for room in ROOMS.values():
-        if pid in room.get('players', []):
-            return { 'waiting': True, 'position': 0, 'total_waiting': len(lst), 'info': 'in_room' }
-
-    entry = {'player_id': pid, 'joined_at': time.time()}
-    lst.append(entry)
-    print(f"player {pid} in lobby for rule={rule}, total waiting: {len(lst)}")
-
-    # Create games as long as there are enough players for this rule
-    while len(lst) >= MIN_PLAYERS:
-        lst.sort(key=lambda e: e.get('joined_at', 0))
-        chosen = lst[:MIN_PLAYERS]
-        players_for_game = [e.get('player_id') for e in chosen]
-        # remove chosen from list
-        WAITING_BY_RULE[rule] = lst[MIN_PLAYERS:]
-        gid = str(uuid.uuid4())
-        qcount = DEFAULT_QUESTIONS_PER_GAME
-        if rule == 'speed':
-            qcount = 5
-        elif rule == 'challenge':
-            qcount = 15
-
-        qcount = min(len(ALL_QUESTIONS), qcount)
-        sampled = random.sample(ALL_QUESTIONS, qcount) if qcount > 0 else []
-        random.shuffle(sampled)
-        sanitized = []
-        for q in sampled:
-            prompt = q.get('question') or q.get('prompt') or q.get('q') or q.get('text') or str(q.get('id'))
-            answers = q.get('answers') or ([q.get('answer')] if q.get('answer') else [])
-            sanitized.append({'id': q.get('id'), 'prompt': prompt, 'answers': answers, 'answer': answers[0] if answers else None})
-        
-        # track per-game runtime state: scores by player, done flags, first finisher timestamp, finished flag
-        GAMES[gid] = {
-            'players': players_for_game,
-            'questions': sanitized,
-            'pointer': 0,
-            'rule': rule,
-            'scores': {p: 0 for p in players_for_game},
-            'done': {p: False for p in players_for_game},
-            'first_finish_at': None,
-            'finished': False
-        }
-        print(f"created game {gid} for players {players_for_game} with rule {rule} and {len(sanitized)} questions")
+    if ROOMS.room_of(pid):
+        return { 'waiting': True, 'position': 0, 'total_waiting': MATCHMAKER.queue_length(rule), 'info': 'in_room' }
 
-        # record pending game for each chosen player so they receive it on next poll
-        for p in players_for_game:
-            PLAYER_GAME_MAP[p] = gid
+    MATCHMAKER.join(pid, rule)
+    print(f"player {pid} in lobby for rule={rule}, total waiting: {MATCHMAKER.queue_length(rule)}")
 
+    # Create games for every full group of the oldest waiters for this rule
+    my_game = None
+    now = time.time()
+    for group in MATCHMAKER.pop_groups(rule):
+        players_for_game = [e.get('player_id') for e in group]
+        for e in group:
+            LOBBY_WAIT.observe(now - e['joined_at'], rule)
+        gid, sanitized = create_game(players_for_game, rule)
+        print(f"created game {gid} for players {players_for_game} with rule {rule} and {len(sanitized)} questions")
         # For players in the new game, check if they were the one polling
         if pid in players_for_game:
-            return { 'game_id': gid, 'players': players_for_game, 'questions': sanitized, 'rule': rule }
+            my_game = { 'game_id': gid, 'players': players_for_game, 'questions': sanitized, 'rule': rule }
+    if my_game:
+        return my_game
 
     # If the player is still in the waiting list for this rule, return their position
-    for i, e in enumerate(WAITING_BY_RULE.get(rule, [])):
-        if e.get('player_id') == pid:
-            return { 'waiting': True, 'position': i + 1, 'total_waiting': len(WAITING_BY_RULE.get(rule, [])) }
+    waiting = MATCHMAKER.position(pid)
+    if waiting:
+        return { 'waiting': True, 'position': waiting[1], 'total_waiting': waiting[2] }
     # This can happen if the player was just put into a game by another player's poll
     return { 'status': 'game_created_by_other' }
 
@@ -436,16 +739,7 @@ def lobby_leave(req: LobbyLeaveRequest):
     pid = resolve_player(req.player_id, req.session_token)
     if not pid:
         return { 'ok': False, 'error': 'unknown_player' }
-    removed = False
-    for rule, lst in list(WAITING_BY_RULE.items()):
-        newlst = [e for e in lst if e.get('player_id') != pid]
-        if len(newlst) != len(lst):
-            removed = True
-            if newlst:
-                WAITING_BY_RULE[rule] = newlst
-            else:
-                WAITING_BY_RULE.pop(rule, None)
-    if removed:
+    if MATCHMAKER.leave(pid):
         print(f"Player {pid} left the lobby.")
         return { 'ok': True }
     return { 'ok': False, 'error': 'player_not_in_lobby' }
@@ -453,16 +747,15 @@ def lobby_leave(req: LobbyLeaveRequest):
 
 @app.get('/game/{game_id}/question')
 def game_question(game_id: str, player_id: str):
-    g = GAMES.get(game_id)
-    if not g:
+    # deliver next unused question for the game; the pointer advances atomically so
+    # the same question won't be reused in this game
+    nxt = GAMES.next_question(game_id)
+    if nxt is None:
         return { 'error': 'unknown_game' }
-    # deliver next unused question for the game
-    ptr = g.get('pointer', 0)
-    if ptr >= len(g['questions']):
+    GAMES.activate(game_id)
+    ptr, q = nxt
+    if q is None:
         return { 'finished': True }
-    q = g['questions'][ptr]
-    # increment pointer so same question won't be reused in this game
-    g['pointer'] = ptr + 1
     # send prompt only (no answer)
     prompt = q.get('question') or q.get('prompt') or q.get('q') or q.get('text') or q.get('id')
     # build safe object
@@ -475,28 +768,28 @@ def game_submit_answer(game_id: str, payload: dict):
     pid = resolve_player(payload.get('player_id'), payload.get('session_token'))
     if not pid:
         return { 'ok': False, 'error': 'unknown_player' }
-    g = GAMES.get(game_id)
-    if not g:
-        return { 'ok': False, 'error': 'unknown_game' }
-    if g.get('finished'):
-        return { 'ok': False, 'error': 'game_already_finished' }
-    # update score if provided
+    # update score if provided; mark player done if 'correct' is true or explicit 'done' flag
     delta = int(payload.get('score_delta') or 0)
-    if delta:
-        g['scores'][pid] = g['scores'].get(pid, 0) + delta
-    # mark player done if 'correct' is true or explicit 'done' flag
     done_flag = payload.get('done') if 'done' in payload else bool(payload.get('correct') is True)
-    if done_flag and not g['done'].get(pid):
-        g['done'][pid] = True
-        now = int(time.time())
-        if not g.get('first_finish_at'):
-            g['first_finish_at'] = now
-        # if this was the first finisher, record time; clients should poll /game/{id}/state
+    now = int(time.time())
+    res = GAMES.record_answer(game_id, pid, delta, bool(done_flag), now)
+    if res is None:
+        return { 'ok': False, 'error': 'unknown_game' }
+    if res['finished']:
+        return { 'ok': False, 'error': 'game_already_finished' }
+    g = GAMES.get(game_id)
+    if res['first_finish']:
+        # finalize exactly at the deadline even if nobody polls /state
+        DEADLINES.schedule(('game', game_id), now + GAME_END_AFTER_FIRST_FINISH_SECONDS)
+        # first finisher starts the end-of-game countdown for everyone
+        EVENT_HUB.publish(g['players'], 'first_finish', {'game_id': game_id, 'player': pid, 'first_finish_at': now, 'ends_at': now + GAME_END_AFTER_FIRST_FINISH_SECONDS})
     # if all done, finalize immediately
-    if all(g['done'].get(p) for p in g['players']):
+    if res['all_done']:
         finalize_game(game_id)
         return { 'ok': True, 'finished': True }
-    return { 'ok': True, 'finished': False, 'first_finish_at': g.get('first_finish_at') }
+    if res['changed']:
+        EVENT_HUB.publish(g['players'], 'game_state', game_snapshot(game_id, g))
+    return { 'ok': True, 'finished': False, 'first_finish_at': res['first_finish_at'] }
 
 
 @app.get('/game/{game_id}/state')
@@ -506,79 +799,94 @@ def game_state(game_id: str):
         return { 'error': 'unknown_game' }
     # if first finisher exists and 60s have passed, finalize
     if g.get('first_finish_at') and not g.get('finished'):
-        if time.time() - g['first_finish_at'] >= 60:
+        if time.time() - g['first_finish_at'] >= GAME_END_AFTER_FIRST_FINISH_SECONDS:
             finalize_game(game_id)
+            g = GAMES.get(game_id) or g
+    snap = game_snapshot(game_id, g)
+    snap.pop('game_id')
+    if g.get('final_ranking'):
+        snap['final_ranking'] = g['final_ranking']
+    return snap
+
+
+def game_snapshot(game_id: str, g: dict) -> dict:
     # compute ranking snapshot
     scores = g.get('scores', {})
     ranking = sorted([(p, scores.get(p,0)) for p in g['players']], key=lambda x: x[1], reverse=True)
     return {
+        'game_id': game_id,
         'players': g['players'],
         'scores': scores,
         'done': g.get('done', {}),
         'first_finish_at': g.get('first_finish_at'),
         'finished': g.get('finished'),
+        'state': g.get('state'),
         'ranking': [{'player': p, 'score': s} for p,s in ranking]
     }
 
 
 def finalize_game(game_id: str):
-    g = GAMES.get(game_id)
+    # marks the game finished and computes final_ranking; only the first caller (of any worker) gets g
+    g = GAMES.finish(game_id, int(time.time()))
     if not g:
         return
-    if g.get('finished'):
-        return
-    g['finished'] = True
-    # prepare final ranking
-    scores = g.get('scores', {})
-    ranking = sorted([(p, scores.get(p,0)) for p in g['players']], key=lambda x: x[1], reverse=True)
-    g['final_ranking'] = [{'player': p, 'score': s} for p,s in ranking]
-    g['ended_at'] = int(time.time())
-    # save scores to global SCORES for vs mode
-    for p, s in ranking:
-        nickname = PLAYERS.get(p, {}).get('nickname', '匿名')
+    DEADLINES.cancel(('game', game_id))
+    DEADLINES.cancel(('game_expire', game_id))
+    GAME_DURATION.observe(g['ended_at'] - g.get('started_at', g['ended_at']), g.get('rule') or 'classic')
+    # save scores for vs mode and the game itself (with final_ranking) to the score store
+    nicknames = {}
+    for r in g['final_ranking']:
+        p, s = r['player'], r['score']
+        nickname = nicknames[p] = PLAYERS.nickname(p)
         rec = { 'player': nickname, 'score': s, 'time': g.get('ended_at', 0) - g.get('started_at', 0), 'meta': {'game_id': game_id} }
         try:
-            SCORES.setdefault('vs', []).append(rec)
+            record_score('vs', rec)
         except Exception as e:
-            print(f'Warning: failed to append vs score record: {e}. SCORES structure: {type(SCORES)}')
+            print(f'Warning: failed to append vs score record: {e}')
+    try:
+        SCORE_STORE.record_game(game_id, g, nicknames)
+    except Exception as e:
+        print(f'Warning: failed to store finished game {game_id}: {e}')
+    # move to the bounded archive (late /state polls still see final_ranking) and drop
+    # pending-game pointers nobody picked up
+    g = GAMES.archive(game_id) or g
+    MATCHMAKER.release(g['players'])
+    final = game_snapshot(game_id, g)
+    final['final_ranking'] = g['final_ranking']
+    EVENT_HUB.publish(g['players'], 'game_finished', final)
+
+
+def expire_game(game_id: str):
+    # lifetime deadline of a game nobody finished (abandoned or never started): close and archive
+    # it and free its players, but record no scores or history, like an unfinished game never was
+    g = GAMES.finish(game_id, int(time.time()))
+    if not g:
+        return
+    DEADLINES.cancel(('game', game_id))
+    g = GAMES.archive(game_id) or g
+    MATCHMAKER.release(g['players'])
+    print(f"game {game_id} expired unfinished after {GAME_MAX_LIFETIME_SECONDS}s")
 
 
 @app.get('/solo/question')
 def solo_question():
     # return a random question prompt (no answer)
-    if not ALL_QUESTIONS:
+    body = QUESTIONS.current.bank.random_prompt_json()
+    if body is None:
         return { 'error': 'no_questions' }
-    q = random.choice(ALL_QUESTIONS)
-    prompt = q.get('question') or q.get('prompt') or q.get('q') or q.get('text') or q.get('id')
-    return { 'question_id': q.get('id'), 'prompt': prompt }
+    return Response(content=body, media_type='application/json')
 
 
 @app.get('/solo/questions')
 def solo_questions(n: int = 10, category: str = None, difficulty: str = None):
     # return n random sanitized questions, optionally filtered by category and difficulty
-    if not ALL_QUESTIONS:
+    bank = QUESTIONS.current.bank
+    if not len(bank):
         return { 'error': 'no_questions' }
-    
-    # Apply filters
-    filtered_questions = ALL_QUESTIONS
-    if category and category != 'all':
-        filtered_questions = [q for q in filtered_questions if q.get('category') == category]
-    if difficulty and difficulty != 'all':
-        filtered_questions = [q for q in filtered_questions if q.get('difficulty') == difficulty]
-    
-    if not filtered_questions:
-        # If no questions match the filters, return unfiltered questions as fallback
-        filtered_questions = ALL_QUESTIONS
-    
-    count = max(1, min(len(filtered_questions), n))
-    sampled = random.sample(filtered_questions, count)
-    sanitized = []
-    for q in sampled:
-        prompt = q.get('question') or q.get('prompt') or q.get('q') or q.get('text') or str(q.get('id'))
-        # include answer(s) for solo mode so client can validate locally
-        answers = q.get('answers') or ([q.get('answer')] if q.get('answer') else [])
-        sanitized.append({'id': q.get('id'), 'prompt': prompt, 'answers': answers, 'answer': answers[0] if answers else None})
-    return {'questions': sanitized}
+    # index lookup (unmatched filters fall back to the whole bank), then O(n) sampling;
+    # answers are included for solo mode so client can validate locally
+    body = bank.sample_json(max(1, n), category, difficulty)
+    return Response(content='{"questions":' + body + '}', media_type='application/json')
 
 
 class RoomCreateRequest(BaseModel):
@@ -603,16 +911,15 @@ def room_create(req: RoomCreateRequest):
     if not pid:
         return {'error': 'unknown_player'}
     rid = str(uuid.uuid4())
-    ROOMS[rid] = {
+    room = ROOMS.create(rid, {
         'name': req.name or f"room-{rid[:6]}",
         'password': req.password,
         'max_players': max(1, int(req.max_players or 3)),
         'rule': req.rule or 'classic',
-        'players': [pid],
         'creator': pid
-    }
-    print(f"room created {rid} by {pid}: {ROOMS[rid]}")
-    return {'room_id': rid, 'room': ROOMS[rid]}
+    }, pid)
+    print(f"room created {rid} by {pid}: {room}")
+    return {'room_id': rid, 'room': room}
 
 
 @app.post('/room/join')
@@ -621,64 +928,25 @@ def room_join(req: RoomJoinRequest):
     if not pid:
         return {'error': 'unknown_player'}
     # If a game was already created for this player (e.g., room filled by another poll), return it
-    pending_gid = PLAYER_GAME_MAP.get(pid)
+    pending_gid = GAMES.take_pending(pid)
     if pending_gid:
+        MATCHMAKER.release([pid])
         g = GAMES.get(pending_gid)
         if g:
-            PLAYER_GAME_MAP.pop(pid, None)
+            GAMES.activate(pending_gid)
             return { 'game_id': pending_gid, 'players': g.get('players', []), 'questions': g.get('questions', []), 'rule': g.get('rule') }
-    room = ROOMS.get(req.room_id)
-    if not room:
-        return {'error': 'unknown_room'}
-    if room.get('password'):
-        if not req.password or req.password != room.get('password'):
-            return {'error': 'bad_password'}
-    # Return current room state if player is already in it or just successfully joined
-    if pid not in room['players']:
-        if len(room['players']) >= room['max_players']:
-            return {'error': 'room_full'}
-        room['players'].append(pid)
-    
+    # password/capacity check, join and close-when-full happen as one step in the room registry
+    err, room, players_for_game = ROOMS.join(req.room_id, pid, req.password)
+    if err:
+        return {'error': err}
+
     print(f"player {pid} is in room {req.room_id} ({len(room['players'])}/{room['max_players']})")
 
-    # Check if the room is now full and should start a game
-    if len(room['players']) >= room['max_players']:
-        players_for_game = room['players'][:room['max_players']]
-        gid = str(uuid.uuid4())
+    # the room is now full and closed: start a game
+    if players_for_game:
         rule = room.get('rule', 'classic')
-        qcount = DEFAULT_QUESTIONS_PER_GAME
-        if rule == 'speed':
-            qcount = 5
-        elif rule == 'challenge':
-            qcount = 15
-        
-        qcount = min(len(ALL_QUESTIONS), qcount)
-        sampled = random.sample(ALL_QUESTIONS, qcount) if qcount > 0 else []
-        random.shuffle(sampled)
-        sanitized = []
-        for q in sampled:
-            prompt = q.get('question') or q.get('prompt') or q.get('q') or q.get('text') or str(q.get('id'))
-            answers = q.get('answers') or ([q.get('answer')] if q.get('answer') else [])
-            sanitized.append({'id': q.get('id'), 'prompt': prompt, 'answers': answers, 'answer': answers[0] if answers else None})
-        
-        GAMES[gid] = {'players': players_for_game, 'questions': sanitized, 'pointer': 0, 'room': req.room_id, 'rule': rule}
-        # track per-game runtime state for room-created games
-        GAMES[gid] = {
-            'players': players_for_game,
-            'questions': sanitized,
-            'pointer': 0,
-            'room': req.room_id,
-            'rule': rule,
-            'scores': {p: 0 for p in players_for_game},
-            'done': {p: False for p in players_for_game},
-            'first_finish_at': None,
-            'finished': False
-        }
+        gid, sanitized = create_game(players_for_game, rule, room_id=req.room_id)
         print(f"created game {gid} from room {req.room_id} for players {players_for_game}")
-        # Record pending game for each player
-        for p in players_for_game:
-            PLAYER_GAME_MAP[p] = gid
-        ROOMS.pop(req.room_id, None) # Clean up room
         return {'game_id': gid, 'players': players_for_game, 'questions': sanitized}
 
     # Not full yet, return waiting status
@@ -690,13 +958,94 @@ def room_join(req: RoomJoinRequest):
     }
 
 
+@app.websocket('/ws/{player_id}')
+async def player_channel(websocket: WebSocket, player_id: str, session_token: str = ''):
+    # push channel: match_found / game_state / first_finish / game_finished events.
+    # While it is open the player counts as alive; any client message also refreshes last_seen.
+    # the state store may be Redis behind a blocking client: keep its calls off the event loop
+    player = await run_in_threadpool(PLAYERS.get, player_id)
+    if player is None or player.session_token != session_token:
+        await websocket.close(code=4401)
+        return
+    await websocket.accept()
+    queue = EVENT_HUB.subscribe(player_id)
+    await run_in_threadpool(PLAYERS.touch, player_id)
+
+    async def receive_loop():
+        while True:
+            await websocket.receive_text()
+            await run_in_threadpool(PLAYERS.touch, player_id)
+
+    receiver = asyncio.ensure_future(receive_loop())
+    getter = None
+    touched = time.monotonic()
+    try:
+        hello = {'player_id': player_id}
+        pending_gid = await run_in_threadpool(GAMES.pending_for, player_id)
+        if pending_gid:
+            hello['pending_game_id'] = pending_gid
+        waiting = await run_in_threadpool(MATCHMAKER.position, player_id)
+        if waiting:
+            hello['waiting'] = {'rule': waiting[0], 'position': waiting[1], 'total_waiting': waiting[2]}
+        await websocket.send_json({'event': 'hello', 'data': hello})
+        while True:
+            if getter is None:
+                getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({getter, receiver}, timeout=CHANNEL_TOUCH_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                break
+            if getter in done:
+                await websocket.send_json(getter.result())
+                getter = None
+            if time.monotonic() - touched >= CHANNEL_TOUCH_SECONDS:
+                # the inactivity deadline may fire on a worker that doesn't hold this channel
+                # (is_connected is per-process), so keep last_seen fresh while it is open
+                await run_in_threadpool(PLAYERS.touch, player_id)
+                touched = time.monotonic()
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        if getter is not None:
+            getter.cancel()
+        receiver.cancel()
+        if receiver.done() and not receiver.cancelled():
+            receiver.exception()  # disconnect surfaced by receive_loop
+        EVENT_HUB.unsubscribe(player_id, queue)
+        # closing the channel restarts the normal heartbeat timeout
+        await run_in_threadpool(PLAYERS.touch, player_id)
+
+
 @app.get('/server/stats')
 def server_stats():
     return {
         'active_players': len(PLAYERS),
-    'players_waiting_random': sum(len(v) for v in WAITING_BY_RULE.values()),
-        'active_games': len(GAMES),
-        'active_rooms': len(ROOMS)
+    'players_waiting_random': MATCHMAKER.waiting_count(),
+        'active_games': GAMES.live_count(),
+        'archived_games': GAMES.archive_count(),
+        'active_rooms': len(ROOMS),
+        'push_connections': EVENT_HUB.connection_count(),
+        'scheduled_deadlines': len(DEADLINES)
+    }
+
+
+@app.get('/server/memory')
+def server_memory():
+    # steady-state check: every per-player / per-game structure should plateau under sustained load
+    return {
+        'process': memory_report.process_memory(),
+        'structures': {
+            'players': len(PLAYERS),
+            'player_game_map': GAMES.pending_count(),
+            'player_room': ROOMS.member_count(),
+            'rooms': len(ROOMS),
+            'waiting_random': MATCHMAKER.waiting_count(),
+            'push_connections': EVENT_HUB.connection_count(),
+            'deadlines': DEADLINES.stats(),
+            'grading_cache_entries': GRADING_CACHE.stats().get('size'),
+            'score_store': SCORE_STORE.stats(),
+            'state_store': STATE.stats(),
+        },
+        'games': GAMES.stats(),
     }
 
 
@@ -716,7 +1065,7 @@ def submit_score(s: ScoreSubmit):
     pid = resolve_player(s.player_id, s.session_token)
     if not pid:
         return { 'ok': False, 'error': 'unknown_player' }
-    nickname = PLAYERS.get(pid, {}).get('nickname', '匿名')
+    nickname = PLAYERS.nickname(pid)
 
     # Compute canonical score depending on mode
     mode = s.mode or 'solo'
@@ -750,26 +1099,48 @@ def submit_score(s: ScoreSubmit):
         meta = {'correct': correct, 'total': total, 'wrong': wrong, 'accuracy': accuracy}
 
     rec = { 'player': nickname, 'score': canonical, 'time': s.time_seconds, 'meta': meta }
-    SCORES.setdefault(mode, []).append(rec)
-    # persist scores to disk (best-effort)
-    try:
-        with open(SCORES_FILE, 'w', encoding='utf-8') as sf:
-            json.dump(SCORES, sf, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f'Warning: failed to persist scores to {SCORES_FILE}: {e}')
+    # journaled to disk by the background writer (batched fsync), not rewritten here
+    record_score(mode, rec)
 
     print(f"score submitted: player={pid} mode={mode} canonical={canonical} meta={meta}")
     return { 'ok': True, 'canonical_score': canonical }
 
 
+MAX_SCORES_PAGE = 100
+
+
 @app.get('/scores/all')
-def scores_all():
-    # return full scores object for client-side ranking display
-    return { 'scores': SCORES }
+def scores_all(limit: int = MAX_SCORES_PAGE, offset: int = 0):
+    # one leaderboard page (personal bests) per mode for client-side ranking display
+    limit = max(0, min(limit, MAX_SCORES_PAGE))
+    modes = SCORE_STORE.modes()
+    return {
+        'scores': {mode: SCORE_STORE.top(mode, limit, offset) for mode in modes},
+        'totals': {mode: SCORE_STORE.total(mode) for mode in modes},
+    }
 
 
 @app.get('/scores/top')
-def top_scores(mode: str = 'solo'):
-    lst = SCORES.get(mode, [])
-    sorted_list = sorted(lst, key=lambda x: x.get('score',0), reverse=True)[:10]
-    return { 'top': sorted_list }
+def top_scores(mode: str = 'solo', limit: int = 10, offset: int = 0):
+    limit = max(0, min(limit, MAX_SCORES_PAGE))
+    return { 'top': SCORE_STORE.top(mode, limit, offset), 'total': SCORE_STORE.total(mode), 'offset': max(0, offset) }
+
+
+@app.get('/scores/rank')
+def score_rank(mode: str = 'solo', player: Optional[str] = None, score: Optional[int] = None):
+    # rank/percentile of a nickname's personal best, or where a given score would land
+    if player is not None:
+        rank = SCORE_STORE.rank(mode, player)
+        if rank is None:
+            return { 'error': 'no_score', 'total': SCORE_STORE.total(mode) }
+        return dict(rank, player=player)
+    if score is not None:
+        return { 'score': score, 'rank': SCORE_STORE.rank_of_score(mode, score), 'total': SCORE_STORE.total(mode) }
+    return { 'error': 'player_or_score_required' }
+
+
+@app.get('/games/history')
+def games_history(player: str, limit: int = 20):
+    # finished games (with final_ranking) the nickname took part in, newest first
+    limit = max(0, min(limit, MAX_SCORES_PAGE))
+    return { 'player': player, 'games': SCORE_STORE.player_games(player, limit) }
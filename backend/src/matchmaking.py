@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+# Random-match lobby: one FIFO queue per rule plus a player -> rule index.
+#
+# join/leave/membership checks are O(1) dict operations and queue positions
+# come from a Fenwick tree over join tickets (O(log n)), so a lobby poll no
+# longer scans or re-sorts every waiting list.
+#
+# Locking: each rule queue has its own stripe ('rule', rule) and each player one
+# for the player -> rule index ('player', pid). join/leave take both in one
+# hold(); pop_groups takes only the rule stripe, so matching in one rule never
+# blocks polls in another and a waiter can be drawn into exactly one group.
+# Popped players stay claimed (join() refuses them) until the caller
+# release()s them, i.e. until they picked up their game or it ended, so a poll
+# racing the hand-off can't put a just-matched player back into the queue.
+import threading
+import time
+from collections import deque
+
+from locks import LockTable
+
+
+class _Fenwick:
+    def __init__(self, size: int):
+        self.size = size
+        self._tree = [0] * (size + 1)
+
+    def add(self, i: int, delta: int):
+        i += 1
+        while i <= self.size:
+            self._tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i: int) -> int:
+        # number of set slots in [0, i]
+        i += 1
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+
+class RuleQueue:
+    def __init__(self, capacity: int = 64):
+        self._entries = {}  # player_id -> [ticket, joined_at]
+        self._order = deque()  # (ticket, player_id), stale pairs skipped lazily
+        self._next_ticket = 0
+        self._tree = _Fenwick(capacity)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, player_id):
+        return player_id in self._entries
+
+    def _rebuild(self):
+        # renumber live entries 0..n-1 into a tree with room to grow (amortized O(1) per join)
+        live = [(pid, self._entries[pid][1]) for t, pid in self._order
+                if pid in self._entries and self._entries[pid][0] == t]
+        self._tree = _Fenwick(max(64, 2 * len(live) + 1))
+        self._order = deque()
+        self._entries = {}
+        self._next_ticket = 0
+        for pid, joined_at in live:
+            self._append(pid, joined_at)
+
+    def _append(self, player_id: str, joined_at: float):
+        ticket = self._next_ticket
+        self._next_ticket += 1
+        self._entries[player_id] = [ticket, joined_at]
+        self._order.append((ticket, player_id))
+        self._tree.add(ticket, 1)
+
+    def push(self, player_id: str, joined_at: float):
+        if self._next_ticket >= self._tree.size:
+            self._rebuild()
+        self._append(player_id, joined_at)
+
+    def remove(self, player_id: str) -> bool:
+        entry = self._entries.pop(player_id, None)
+        if entry is None:
+            return False
+        self._tree.add(entry[0], -1)
+        # keep the lazy deque from filling up with departed players
+        if len(self._order) > 2 * len(self._entries) + 64:
+            self._rebuild()
+        return True
+
+    def position(self, player_id: str) -> int:
+        entry = self._entries.get(player_id)
+        if entry is None:
+            return 0
+        return self._tree.prefix(entry[0])
+
+    def popleft(self):
+        while self._order:
+            ticket, pid = self._order.popleft()
+            entry = self._entries.get(pid)
+            if entry is not None and entry[0] == ticket:
+                del self._entries[pid]
+                self._tree.add(ticket, -1)
+                return {'player_id': pid, 'joined_at': entry[1]}
+        return None
+
+
+class Matchmaker:
+    def __init__(self, group_size: int, locks: LockTable = None):
+        self.group_size = group_size
+        self._queues = {}  # rule -> RuleQueue
+        self._rule_of = {}  # player_id -> rule
+        self._matched = set()  # popped by pop_groups, game not picked up / not over yet
+        self._locks = locks or LockTable()
+        self._queues_lock = threading.Lock()  # leaf: creating/dropping entries of _queues
+
+    def waiting_count(self) -> int:
+        return len(self._rule_of)
+
+    def queue_length(self, rule: str) -> int:
+        q = self._queues.get(rule)
+        return len(q) if q else 0
+
+    def rule_of(self, player_id: str):
+        return self._rule_of.get(player_id)
+
+    def _drop_if_empty(self, rule: str, q: RuleQueue):
+        # caller holds the rule stripe, so nobody can push into q meanwhile
+        if not len(q):
+            with self._queues_lock:
+                if self._queues.get(rule) is q:
+                    del self._queues[rule]
+
+    def join(self, player_id: str, rule: str, now: float = None) -> bool:
+        # False if the player is already waiting (in any rule)
+        with self._locks.hold(('player', player_id), ('rule', rule)):
+            if player_id in self._rule_of or player_id in self._matched:
+                return False
+            with self._queues_lock:
+                q = self._queues.get(rule)
+                if q is None:
+                    q = self._queues[rule] = RuleQueue()
+            q.push(player_id, now if now is not None else time.time())
+            self._rule_of[player_id] = rule
+            return True
+
+    def leave(self, player_id: str) -> bool:
+        self._matched.discard(player_id)
+        while True:
+            rule = self._rule_of.get(player_id)
+            if rule is None:
+                return False
+            with self._locks.hold(('player', player_id), ('rule', rule)):
+                if self._rule_of.get(player_id) != rule:
+                    continue  # matched or moved meanwhile, look again
+                del self._rule_of[player_id]
+                q = self._queues.get(rule)
+                if q is not None:
+                    q.remove(player_id)
+                    self._drop_if_empty(rule, q)
+                return True
+
+    def position(self, player_id: str):
+        # (rule, 1-based position, queue length) or None when not waiting
+        rule = self._rule_of.get(player_id)
+        if rule is None:
+            return None
+        with self._locks.hold(('rule', rule)):
+            q = self._queues.get(rule)
+            if q is None or player_id not in q:
+                return None
+            return rule, q.position(player_id), len(q)
+
+    def pop_groups(self, rule: str):
+        # take every full group of the oldest waiters for this rule at once
+        groups = []
+        with self._locks.hold(('rule', rule)):
+            q = self._queues.get(rule)
+            while q is not None and len(q) >= self.group_size:
+                group = [q.popleft() for _ in range(self.group_size)]
+                for e in group:
+                    # claim before un-indexing: join() sees the player in one of the two the whole time
+                    self._matched.add(e['player_id'])
+                    self._rule_of.pop(e['player_id'], None)
+                groups.append(group)
+            if q is not None:
+                self._drop_if_empty(rule, q)
+        return groups
+
+    def release(self, player_ids):
+        # these popped players picked up their game (or it ended); they may queue again
+        for pid in player_ids:
+            self._matched.discard(pid)
+
+    def stats(self) -> dict:
+        with self._queues_lock:
+            queues = list(self._queues.items())
+        return {rule: len(q) for rule, q in queues}
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Process-level memory numbers for /server/memory (stdlib only, best-effort per platform).
+import gc
+import os
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _current_rss_bytes():
+    # /proc is Linux-only; elsewhere only the peak from getrusage is available
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+
+def process_memory() -> dict:
+    report = {
+        'rss_bytes': _current_rss_bytes(),
+        'peak_rss_bytes': _peak_rss_bytes(),
+        'gc_objects': len(gc.get_objects()),
+        'gc_counts': gc.get_count(),
+    }
+    # set PYTHONTRACEMALLOC=1 to also get traced Python heap usage
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        report['traced_bytes'] = current
+        report['traced_peak_bytes'] = peak
+    return report
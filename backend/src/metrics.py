@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+# Prometheus text-format metrics without extra dependencies.
+#
+# Counters and histograms are updated inline (one dict lookup + one bisect
+# under a per-metric lock); anything that is already tracked elsewhere
+# (queue depths, cache counters, connection counts) is read from its owner
+# by collector callbacks only when /metrics is scraped, so the hot polling
+# routes pay for the request histogram and nothing else.
+import asyncio
+import bisect
+import math
+import os
+import threading
+import time
+
+METRICS_LOOP_LAG_INTERVAL = float(os.getenv('METRICS_LOOP_LAG_INTERVAL', '0.5'))
+
+# seconds; polling routes sit in the first few buckets, LM calls in the last ones
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LONG_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _num(v) -> str:
+    if v == math.inf:
+        return '+Inf'
+    if isinstance(v, float) and v.is_integer() and abs(v) < 1e15:
+        return str(int(v))
+    return repr(v) if isinstance(v, float) else str(v)
+
+
+class Counter:
+    kind = 'counter'
+    # the exposed family (HELP/TYPE) and its samples are both name_total
+    suffix = '_total'
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}  # label values tuple -> float
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for values, v in items:
+            yield self.name + self.suffix, _labels(self.labels, values), v
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values tuple -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(label_values)
+            if s is None:
+                s = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            s[i] += 1
+            s[-1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for values, s in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), s[:-1]):
+                cumulative += n
+                yield self.name + '_bucket', _labels(self.labels, values, f'le="{_num(float(bound))}"'), cumulative
+            yield self.name + '_count', _labels(self.labels, values), cumulative
+            yield self.name + '_sum', _labels(self.labels, values), s[-1]
+
+
+class Gauge:
+    # value(s) computed at scrape time: fn() -> number, or -> {label values tuple: number}
+    kind = 'gauge'
+
+    def __init__(self, name: str, help: str, fn, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.fn = fn
+
+    def samples(self):
+        value = self.fn()
+        if not isinstance(value, dict):
+            yield self.name, '', value
+            return
+        for values, v in value.items():
+            yield self.name, _labels(self.labels, values if isinstance(values, tuple) else (values,)), v
+
+
+class ScrapedCounter(Gauge):
+    # monotonically increasing count owned by another component, read at scrape time
+    kind = 'counter'
+    suffix = Counter.suffix
+
+    def samples(self):
+        for name, labels, v in super().samples():
+            yield name + self.suffix, labels, v
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, fn, labels=()) -> Gauge:
+        return self.register(Gauge(name, help, fn, labels))
+
+    def scraped_counter(self, name, help, fn, labels=()) -> ScrapedCounter:
+        return self.register(ScrapedCounter(name, help, fn, labels))
+
+    def render(self) -> str:
+        out = []
+        for m in self._metrics:
+            try:
+                samples = list(m.samples())
+            except Exception as e:
+                # one broken collector must not take the whole scrape down
+                print(f"metrics collector {m.name} failed: {e}")
+                continue
+            family = m.name + getattr(m, 'suffix', '')
+            out.append(f'# HELP {family} {m.help}')
+            out.append(f'# TYPE {family} {m.kind}')
+            for name, labels, v in samples:
+                if v is None:
+                    continue
+                out.append(f'{name}{labels} {_num(v)}')
+        return '\n'.join(out) + '\n'
+
+
+class MetricsMiddleware:
+    # pure ASGI (no BaseHTTPMiddleware task/stream overhead); route label is the matched path
+    # template (/game/{game_id}/state), so per-game URLs don't create new series
+    def __init__(self, app, histogram: Histogram, skip_paths=('/metrics',)):
+        self.app = app
+        self.histogram = histogram
+        self.skip_paths = frozenset(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope.get('path') in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get('route')
+            path = getattr(route, 'path', None) or 'unmatched'
+            self.histogram.observe(time.perf_counter() - start, scope['method'], path, str(status[0]))
+
+
+async def watch_loop_lag(histogram: Histogram, state: dict, interval: float = METRICS_LOOP_LAG_INTERVAL):
+    # how late a sleep wakes up = how long the loop was busy with something else
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        state['last'] = lag
+        histogram.observe(lag)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# Text normalization shared by the grading cache and answer matching.
+import re
+import unicodedata
+
+_WS_RE = re.compile(r'\s+')
+
+
+def fold_text(text: str) -> str:
+    # NFKC folds full-width/half-width forms (ＡＢＣ -> ABC, ｶﾞ -> ガ, 全角スペース -> space)
+    text = unicodedata.normalize('NFKC', text or '')
+    return _WS_RE.sub(' ', text).strip()
+
+
+_KATA_START = 0x30A1  # ァ
+_KATA_END = 0x30F6  # ヶ
+_KATA_TO_HIRA = 0x60
+_LONG_VOWEL = 'ー'
+
+
+def _script(ch: str) -> str:
+    # coarse script of a kept character; a match may not cut through a run of one script
+    code = ord(ch)
+    if 0x3041 <= code <= 0x309F:
+        return 'hira'
+    if 0x30A1 <= code <= 0x30FA:
+        return 'kata'
+    if 0x3400 <= code <= 0x4DBF or 0x4E00 <= code <= 0x9FFF or 0xF900 <= code <= 0xFAFF or ch == '々':
+        return 'han'
+    return 'alnum'
+
+
+def match_form(text: str):
+    # (folded text, script of each character, separator-before flag of each character).
+    # Folded text: NFKC, lowercase, katakana -> hiragana, every non letter/digit character
+    # removed; long-vowel marks stay ("ペリー" and "ペリ" are different answers) and take
+    # the script of the character they lengthen.
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    chars, scripts, gaps = [], [], []
+    gap = False
+    for ch in text:
+        if ch == _LONG_VOWEL:
+            script = scripts[-1] if scripts else 'kata'
+        elif unicodedata.category(ch)[0] not in ('L', 'N'):
+            gap = True
+            continue
+        else:
+            script = _script(ch)
+            code = ord(ch)
+            if _KATA_START <= code <= _KATA_END:
+                ch = chr(code - _KATA_TO_HIRA)
+        chars.append(ch)
+        scripts.append(script)
+        gaps.append(gap)
+        gap = False
+    return ''.join(chars), scripts, gaps
+
+
+def normalize_answer(text: str) -> str:
+    # canonical form for answer comparison ("マシュー・ペリー" -> "ましゅーぺりー", "ＤＮＡ" -> "dna")
+    return match_form(text)[0]
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# Registered players with a session_token -> player_id index so every endpoint
+# can resolve a player in O(1) instead of scanning all of PLAYERS.
+import threading
+import time
+import uuid
+
+
+class Player:
+    __slots__ = ('player_id', 'nickname', 'session_token', 'last_seen')
+
+    def __init__(self, player_id: str, nickname: str, session_token: str, last_seen: float):
+        self.player_id = player_id
+        self.nickname = nickname
+        self.session_token = session_token
+        self.last_seen = last_seen
+
+
+class PlayerRegistry:
+    def __init__(self):
+        self._players = {}  # player_id -> Player
+        self._by_token = {}  # session_token -> player_id
+        self._lock = threading.Lock()  # keeps the two dicts in step; reads need no lock
+
+    def __len__(self):
+        return len(self._players)
+
+    def __contains__(self, player_id):
+        return player_id in self._players
+
+    def __iter__(self):
+        return iter(self._players)
+
+    def values(self):
+        return self._players.values()
+
+    def get(self, player_id):
+        return self._players.get(player_id)
+
+    def register(self, nickname: str, player_id: str = None) -> Player:
+        # new player, or re-registration of an existing id with a fresh token
+        pid = player_id or str(uuid.uuid4())
+        player = Player(pid, nickname, uuid.uuid4().hex, time.time())
+        with self._lock:
+            old = self._players.get(pid)
+            if old is not None:
+                self._by_token.pop(old.session_token, None)
+            self._players[pid] = player
+            self._by_token[player.session_token] = pid
+        return player
+
+    def remove(self, player_id: str):
+        with self._lock:
+            player = self._players.pop(player_id, None)
+            if player is not None and self._by_token.get(player.session_token) == player_id:
+                del self._by_token[player.session_token]
+        return player
+
+    def by_token(self, session_token: str):
+        return self._by_token.get(session_token)
+
+    def resolve(self, player_id: str = None, session_token: str = None):
+        if player_id and player_id in self._players:
+            return player_id
+        if session_token:
+            return self._by_token.get(session_token)
+        return None
+
+    def touch(self, player_id: str, now: float = None) -> bool:
+        player = self._players.get(player_id)
+        if player is None:
+            return False
+        player.last_seen = now if now is not None else time.time()
+        return True
+
+    def nickname(self, player_id: str, default: str = '匿名') -> str:
+        player = self._players.get(player_id)
+        return player.nickname if player is not None else default
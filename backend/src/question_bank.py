@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# Question bank built once per load of questions.json.
+#
+# Every record is normalized up front (prompt/answers resolved from whichever
+# keys the entry uses), sanitized payloads are built and JSON-encoded once,
+# and (category, difficulty) -> position arrays make a filtered sample of n
+# questions cost O(n) instead of a pass over the whole bank.
+import json
+import random
+from array import array
+
+ANY = '*'  # wildcard slot in the (category, difficulty) index
+
+
+def _prompt_of(q: dict):
+    return q.get('question') or q.get('prompt') or q.get('q') or q.get('text') or str(q.get('id'))
+
+
+def _answers_of(q: dict):
+    return q.get('answers') or ([q.get('answer')] if q.get('answer') else [])
+
+
+def _key(value):
+    return ANY if value in (None, '', 'all') else value
+
+
+class QuestionBank:
+    def __init__(self, questions):
+        self.questions = [q for q in questions if isinstance(q, dict)]
+        # sanitized forms; shared between callers, treat as read-only
+        self.with_answers = []  # {id, prompt, answers, answer}
+        self.prompt_only = []  # {question_id, prompt}
+        self._json_with_answers = []
+        self._json_prompt_only = []
+        index = {}
+        for i, q in enumerate(self.questions):
+            answers = _answers_of(q)
+            full = {'id': q.get('id'), 'prompt': _prompt_of(q), 'answers': answers, 'answer': answers[0] if answers else None}
+            bare = {'question_id': q.get('id'), 'prompt': full['prompt']}
+            self.with_answers.append(full)
+            self.prompt_only.append(bare)
+            self._json_with_answers.append(json.dumps(full, ensure_ascii=False))
+            self._json_prompt_only.append(json.dumps(bare, ensure_ascii=False))
+            cat, diff = _key(q.get('category')), _key(q.get('difficulty'))
+            for key in {(cat, diff), (cat, ANY), (ANY, diff), (ANY, ANY)}:
+                index.setdefault(key, array('I')).append(i)
+        self._index = index
+        self._by_id = {str(q.get('id')): i for i, q in enumerate(self.questions) if q.get('id') is not None}
+
+    def __len__(self):
+        return len(self.questions)
+
+    def positions(self, category=None, difficulty=None):
+        # positions matching the filter; an unknown combination falls back to the whole bank
+        found = self._index.get((_key(category), _key(difficulty)))
+        return found if found else self._index.get((ANY, ANY), array('I'))
+
+    def sample_positions(self, n: int, category=None, difficulty=None):
+        pool = self.positions(category, difficulty)
+        k = max(0, min(len(pool), n))
+        # random.sample over a sequence only touches k slots when k << len(pool)
+        return random.sample(pool, k) if k else []
+
+    def sample(self, n: int, category=None, difficulty=None):
+        return [self.with_answers[i] for i in self.sample_positions(n, category, difficulty)]
+
+    def sample_json(self, n: int, category=None, difficulty=None) -> str:
+        # JSON array of sanitized questions (with answers) from the pre-encoded fragments
+        return '[' + ','.join(self._json_with_answers[i] for i in self.sample_positions(n, category, difficulty)) + ']'
+
+    def random_prompt_json(self):
+        if not self.questions:
+            return None
+        return self._json_prompt_only[random.randrange(len(self.questions))]
+
+    def get(self, question_id):
+        i = self._by_id.get(str(question_id))
+        return self.questions[i] if i is not None else None
+
+    def stats(self) -> dict:
+        return {
+            'questions': len(self.questions),
+            'categories': sorted({c for c, d in self._index if c != ANY}),
+            'difficulties': sorted({d for c, d in self._index if d != ANY}),
+        }
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# Hot-reloadable JSON question sets.
+#
+# A QuestionSource watches one file (mtime/size), parses and validates a new
+# version off the request path and swaps the built object in with a single
+# reference assignment. Readers grab `source.current` once per request, and
+# games keep the sanitized question list they were created with, so a reload
+# never changes a game in progress. A file that fails to parse or validate is
+# reported and the previous version stays live.
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+
+QUESTIONS_WATCH_INTERVAL = float(os.getenv('QUESTIONS_WATCH_INTERVAL', '2'))
+
+
+class QuestionSetError(ValueError):
+    pass
+
+
+class QuestionSource:
+    def __init__(self, name: str, path: str, build):
+        # build(parsed_json) -> object to serve; raises QuestionSetError when the data is unusable
+        self.name = name
+        self.path = path
+        self.build = build
+        self.current = None
+        self.version = 0
+        self.digest = None
+        self.loaded_at = None
+        self.last_error = None
+        self._stat = None
+        self._lock = threading.Lock()
+
+    def _file_stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def reload(self, force: bool = False) -> bool:
+        # True when a new version was swapped in
+        with self._lock:
+            stat = self._file_stat()
+            if stat is None:
+                if self.current is None:
+                    self.last_error = f"{self.path} not found"
+                return False
+            if not force and stat == self._stat:
+                return False
+            self._stat = stat
+            try:
+                with open(self.path, 'rb') as f:
+                    raw = f.read()
+                digest = hashlib.sha1(raw).hexdigest()[:12]
+                if digest == self.digest:
+                    return False  # touched but unchanged
+                built = self.build(json.loads(raw.decode('utf-8')))
+            except (OSError, ValueError) as e:
+                # keep serving the previous version; ValueError covers JSON and QuestionSetError
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"Failed to load {self.name} from {self.path}: {self.last_error}")
+                return False
+            self.current = built
+            self.digest = digest
+            self.version += 1
+            self.loaded_at = time.time()
+            self.last_error = None
+        print(f"Loaded {self.name} v{self.version} ({digest}) from {self.path}")
+        return True
+
+    def info(self) -> dict:
+        return {
+            'path': self.path,
+            'version': self.version,
+            'digest': self.digest,
+            'loaded_at': self.loaded_at,
+            'last_error': self.last_error,
+        }
+
+
+async def watch_sources(sources, interval: float = QUESTIONS_WATCH_INTERVAL):
+    # poll mtimes; parsing and building run in the default executor, never on the event loop
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        for source in sources:
+            try:
+                await loop.run_in_executor(None, source.reload)
+            except Exception as e:
+                print(f"question watcher failed for {source.name}: {e}")
+
+
+def validate_questions(parsed) -> list:
+    # main bank: non-empty list of {id, prompt-ish, answers/answer}, ids unique
+    if not isinstance(parsed, list) or not parsed:
+        raise QuestionSetError('expected a non-empty JSON array of questions')
+    seen = set()
+    for i, q in enumerate(parsed):
+        if not isinstance(q, dict):
+            raise QuestionSetError(f'entry {i} is not an object')
+        if not (q.get('question') or q.get('prompt') or q.get('q') or q.get('text')):
+            raise QuestionSetError(f'entry {i} (id={q.get("id")}) has no prompt')
+        if not (q.get('answers') or q.get('answer')):
+            raise QuestionSetError(f'entry {i} (id={q.get("id")}) has no answer')
+        qid = q.get('id')
+        if qid is not None:
+            if str(qid) in seen:
+                raise QuestionSetError(f'duplicate question id {qid}')
+            seen.add(str(qid))
+    return parsed
+
+
+def validate_programming(parsed) -> dict:
+    # programming set: {"questions": [{id, title, description, ...}]}
+    questions = parsed.get('questions') if isinstance(parsed, dict) else None
+    if not isinstance(questions, list) or not questions:
+        raise QuestionSetError('expected {"questions": [...]} with at least one question')
+    for i, q in enumerate(questions):
+        if not isinstance(q, dict) or not q.get('id') or not q.get('description'):
+            raise QuestionSetError(f'programming question {i} needs id and description')
+    return parsed
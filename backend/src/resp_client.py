@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+# Minimal blocking client for the Redis protocol (RESP2), stdlib only.
+#
+# One connection per thread (FastAPI's threadpool handlers each get their own),
+# so WATCH ... MULTI ... EXEC sequences issued from one thread never interleave
+# with another thread's commands.
+import socket
+import threading
+from urllib.parse import urlparse, unquote
+
+RESP_TIMEOUT = 5.0
+
+
+class RespError(Exception):
+    pass
+
+
+def _encode(args) -> bytes:
+    out = [b'*%d\r\n' % len(args)]
+    for a in args:
+        if isinstance(a, bytes):
+            b = a
+        elif isinstance(a, str):
+            b = a.encode('utf-8')
+        else:
+            b = str(a).encode('ascii')
+        out.append(b'$%d\r\n%s\r\n' % (len(b), b))
+    return b''.join(out)
+
+
+class _Connection:
+    def __init__(self, host: str, port: int, timeout: float):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.rfile = self.sock.makefile('rb')
+
+    def close(self):
+        try:
+            self.rfile.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+    def send(self, *commands):
+        self.sock.sendall(b''.join(_encode(c) for c in commands))
+
+    def read(self):
+        line = self.rfile.readline()
+        if not line:
+            raise ConnectionError('connection closed by server')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode('utf-8')
+        if kind == b'-':
+            return RespError(rest.decode('utf-8'))
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            n = int(rest)
+            if n < 0:
+                return None
+            data = self.rfile.read(n + 2)
+            return data[:-2].decode('utf-8')
+        if kind == b'*':
+            n = int(rest)
+            if n < 0:
+                return None
+            return [self.read() for _ in range(n)]
+        raise RespError(f'unexpected reply prefix {kind!r}')
+
+
+class RespClient:
+    def __init__(self, url: str, timeout: float = RESP_TIMEOUT):
+        # redis://[:password@]host[:port][/db]
+        up = urlparse(url)
+        self.host = up.hostname or '127.0.0.1'
+        self.port = up.port or 6379
+        self.password = unquote(up.password) if up.password else None
+        self.db = int(up.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self, timeout) -> _Connection:
+        conn = _Connection(self.host, self.port, timeout)
+        if self.password:
+            conn.send(('AUTH', self.password))
+            self._check(conn.read())
+        if self.db:
+            conn.send(('SELECT', self.db))
+            self._check(conn.read())
+        return conn
+
+    def _conn(self) -> _Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect(self.timeout)
+        return conn
+
+    def _drop(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    @staticmethod
+    def _check(reply):
+        if isinstance(reply, RespError):
+            raise reply
+        return reply
+
+    def execute(self, *args):
+        # one reconnect attempt for a dropped idle connection (not inside WATCH, which the drop resets anyway)
+        for attempt in (0, 1):
+            try:
+                conn = self._conn()
+                conn.send(args)
+                return self._check(conn.read())
+            except (ConnectionError, OSError):
+                self._drop()
+                if attempt:
+                    raise
+
+    def pipeline(self, commands):
+        # send several commands in one round trip; errors are returned in place, not raised
+        conn = self._conn()
+        try:
+            conn.send(*commands)
+            return [conn.read() for _ in commands]
+        except (ConnectionError, OSError):
+            self._drop()
+            raise
+
+    def multi_exec(self, commands):
+        # MULTI + queued commands + EXEC in one round trip; None when a WATCHed key changed
+        conn = self._conn()
+        try:
+            conn.send(('MULTI',), *commands, ('EXEC',))
+            replies = [conn.read() for _ in range(len(commands) + 2)]
+        except (ConnectionError, OSError):
+            self._drop()
+            raise
+        for r in replies[:-1]:
+            self._check(r)
+        result = self._check(replies[-1])
+        if result is not None:
+            for r in result:
+                self._check(r)
+        return result
+
+    def listen(self, channel: str):
+        # SUBSCRIBE on a dedicated connection without a read timeout; yields message payloads.
+        # Raises ConnectionError/OSError when the server goes away; the caller reconnects.
+        conn = self._connect(None)
+        try:
+            conn.send(('SUBSCRIBE', channel))
+            self._check(conn.read())
+            while True:
+                reply = self._check(conn.read())
+                if isinstance(reply, list) and len(reply) == 3 and reply[0] == 'message':
+                    yield reply[2]
+        finally:
+            conn.close()
+
+    def close(self):
+        self._drop()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# Private rooms plus a player -> room index.
+#
+# join() does the whole check-and-add (password, capacity, start when full) in
+# one call so the same contract can be served atomically by a shared store.
+#
+# Locking: one stripe per room ('room', room_id). A player moving from room A to
+# room B holds both stripes in one hold() call (ascending stripe order), so two
+# players swapping rooms in opposite directions can't deadlock. Rooms handed
+# back to callers are copies; the live dict only changes under its room lock.
+from locks import LockTable
+
+
+def _copy(room: dict) -> dict:
+    return dict(room, players=list(room['players']))
+
+
+class RoomRegistry:
+    def __init__(self, locks: LockTable = None):
+        self._rooms = {}  # room_id -> { name, password, max_players, rule, players: [player_id], creator }
+        self._room_of = {}  # player_id -> room_id the player is currently in
+        self._locks = locks or LockTable()
+
+    def __len__(self):
+        return len(self._rooms)
+
+    def get(self, room_id: str):
+        with self._locks.hold(('room', room_id)):
+            room = self._rooms.get(room_id)
+            return _copy(room) if room is not None else None
+
+    def room_of(self, player_id: str):
+        return self._room_of.get(player_id)
+
+    def member_count(self) -> int:
+        return len(self._room_of)
+
+    def create(self, room_id: str, room: dict, player_id: str) -> dict:
+        while True:
+            old = self._room_of.get(player_id)
+            with self._locks.hold(('room', room_id), ('room', old) if old else None):
+                if self._room_of.get(player_id) != old:
+                    continue
+                if old:
+                    self._remove_member(old, player_id)
+                room['players'] = [player_id]
+                self._rooms[room_id] = room
+                self._room_of[player_id] = room_id
+                return _copy(room)
+
+    def join(self, room_id: str, player_id: str, password: str = None):
+        # (error, room, players_to_start): players_to_start is set when this join filled the room,
+        # in which case the room is closed and its members released
+        while True:
+            old = self._room_of.get(player_id)
+            with self._locks.hold(('room', room_id), ('room', old) if old else None):
+                if self._room_of.get(player_id) != old:
+                    continue  # moved rooms meanwhile, retake the right pair of locks
+                return self._join_locked(room_id, player_id, password, old if old != room_id else None)
+
+    def _join_locked(self, room_id: str, player_id: str, password: str, old: str):
+        room = self._rooms.get(room_id)
+        if room is None:
+            return 'unknown_room', None, None
+        if room.get('password') and (not password or password != room.get('password')):
+            return 'bad_password', None, None
+        if player_id not in room['players']:
+            if len(room['players']) >= room['max_players']:
+                return 'room_full', None, None
+            if old:
+                self._remove_member(old, player_id)
+            room['players'].append(player_id)
+            self._room_of[player_id] = room_id
+        if len(room['players']) < room['max_players']:
+            return None, _copy(room), None
+        self._rooms.pop(room_id, None)
+        for p in room['players']:
+            if self._room_of.get(p) == room_id:
+                del self._room_of[p]
+        return None, room, room['players'][:room['max_players']]
+
+    def leave(self, player_id: str):
+        while True:
+            room_id = self._room_of.get(player_id)
+            if room_id is None:
+                return
+            with self._locks.hold(('room', room_id)):
+                if self._room_of.get(player_id) != room_id:
+                    continue
+                self._remove_member(room_id, player_id)
+                return
+
+    def _remove_member(self, room_id: str, player_id: str):
+        # caller holds the room's stripe
+        if self._room_of.get(player_id) == room_id:
+            del self._room_of[player_id]
+        room = self._rooms.get(room_id)
+        if room is None:
+            return
+        if player_id in room['players']:
+            room['players'].remove(player_id)
+        if not room['players']:
+            self._rooms.pop(room_id, None)
+            print(f"Cleaned up empty room: {room_id}")
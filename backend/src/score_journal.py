@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+# Append-only score journal with a background group-commit writer.
+#
+# Layout next to the snapshot (data/scores.json):
+#   scores.json                 snapshot: {mode: [records]} + "_generation": N
+#   scores.journal.<gen>.jsonl  one {"mode", "rec"} line per submitted score
+#
+# Startup = snapshot + replay of every journal segment with gen >= N. Compaction
+# rotates to a new segment, writes the snapshot to a temp file and renames it
+# over scores.json, then deletes the older segments, so a crash at any point
+# replays each record exactly once.
+import json
+import os
+import re
+import threading
+
+SCORE_FLUSH_INTERVAL = float(os.getenv('SCORE_FLUSH_INTERVAL', '0.05'))
+SCORE_COMPACT_LINES = int(os.getenv('SCORE_COMPACT_LINES', '5000'))
+
+MODES = ('solo', 'rta', 'vs')
+GENERATION_KEY = '_generation'
+
+
+class ScoreJournal:
+    def __init__(self, snapshot_path: str, flush_interval: float = SCORE_FLUSH_INTERVAL,
+                 compact_lines: int = SCORE_COMPACT_LINES):
+        self.snapshot_path = snapshot_path
+        self.flush_interval = flush_interval
+        self.compact_lines = compact_lines
+        base = os.path.basename(snapshot_path)
+        self._prefix = (base[:-5] if base.endswith('.json') else base) + '.journal.'
+        self._dir = os.path.dirname(snapshot_path) or '.'
+        self.scores = {m: [] for m in MODES}
+        self.generation = 0
+        self._segment = None
+        self._segment_gen = 0
+        self._segment_lines = 0
+        self._pending = []  # encoded lines not yet written
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self.appended = 0
+        self.flushes = 0
+        self.compactions = 0
+        self.write_errors = 0
+
+    def _segment_path(self, gen: int) -> str:
+        return os.path.join(self._dir, f"{self._prefix}{gen}.jsonl")
+
+    def _segments(self):
+        pattern = re.compile(re.escape(self._prefix) + r'(\d+)\.jsonl$')
+        found = []
+        try:
+            names = os.listdir(self._dir)
+        except OSError:
+            return found
+        for name in names:
+            m = pattern.match(name)
+            if m:
+                found.append((int(m.group(1)), os.path.join(self._dir, name)))
+        return sorted(found)
+
+    def read(self) -> dict:
+        # snapshot (legacy scores.json without a generation is generation 0), then journal
+        # replay; writes nothing, so it is safe on a journal someone else appends to
+        try:
+            if os.path.isfile(self.snapshot_path):
+                with open(self.snapshot_path, 'r', encoding='utf-8') as sf:
+                    stored = json.load(sf)
+                if isinstance(stored, dict):
+                    self.generation = int(stored.pop(GENERATION_KEY, 0) or 0)
+                    self.scores = stored
+                else:
+                    print('scores.json content invalid, starting fresh')
+        except Exception as e:
+            print(f'Could not load scores from {self.snapshot_path}: {e}')
+        # ensure expected modes exist
+        for mode in MODES:
+            if not isinstance(self.scores.get(mode), list):
+                self.scores[mode] = []
+        replayed = 0
+        last_gen = self.generation
+        for gen, path in self._segments():
+            if gen < self.generation:
+                continue
+            last_gen = max(last_gen, gen)
+            with open(path, 'r', encoding='utf-8') as jf:
+                for line in jf:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn final line from a crash mid-append
+                    self.scores.setdefault(entry.get('mode') or 'solo', []).append(entry.get('rec'))
+                    replayed += 1
+        if replayed:
+            print(f'Replayed {replayed} score journal entries')
+        self._segment_gen = last_gen
+        self._segment_lines = replayed
+        return self.scores
+
+    def load(self) -> dict:
+        # read, then keep appending to the newest segment
+        self.read()
+        self._open_segment(self._segment_gen)
+        return self.scores
+
+    def _open_segment(self, gen: int):
+        old = self._swap_segment(gen)
+        if old is not None:
+            old.close()
+
+    def _swap_segment(self, gen: int):
+        # start appending to segment gen, handing back the previous one (still open)
+        old = self._segment
+        self._segment_gen = gen
+        self._segment = open(self._segment_path(gen), 'a', encoding='utf-8')
+        return old
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='score-journal', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._flush(self._take())
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+    def append(self, mode: str, rec: dict):
+        # O(1) for the caller: update memory and hand the line to the writer thread
+        line = json.dumps({'mode': mode, 'rec': rec}, ensure_ascii=False) + '\n'
+        with self._cond:
+            self.scores.setdefault(mode, []).append(rec)
+            self._pending.append(line)
+            self.appended += 1
+            if len(self._pending) == 1:
+                self._cond.notify()
+
+    def _take(self):
+        with self._cond:
+            batch, self._pending = self._pending, []
+        return batch
+
+    def _flush(self, batch, segment=None):
+        segment = segment or self._segment
+        if not batch or segment is None:
+            return
+        try:
+            segment.write(''.join(batch))
+            segment.flush()
+            os.fsync(segment.fileno())
+            if segment is self._segment:
+                self._segment_lines += len(batch)
+            self.flushes += 1
+        except OSError as e:
+            self.write_errors += 1
+            print(f'Warning: failed to append to score journal: {e}')
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+            # let concurrent submits pile up so one fsync covers the whole batch
+            if self.flush_interval > 0:
+                threading.Event().wait(self.flush_interval)
+            self._flush(self._take())
+            if self.compact_lines and self._segment_lines >= self.compact_lines:
+                try:
+                    self.compact()
+                except Exception as e:
+                    print(f'Warning: score snapshot compaction failed: {e}')
+
+    def compact(self):
+        # freeze a consistent view: everything appended so far is either in the old
+        # segment or in the snapshot, later appends go to the new segment. Only the
+        # swap happens under the lock; submits never wait for the writes and fsyncs.
+        with self._cond:
+            batch, self._pending = self._pending, []
+            new_gen = self._segment_gen + 1
+            old_segment = self._swap_segment(new_gen)
+            self._segment_lines = 0
+            # the lists are append-only, so their current lengths pin the view
+            lengths = {mode: len(lst) for mode, lst in self.scores.items()}
+        # the old segment must hold its last batch before the snapshot replaces it
+        self._flush(batch, old_segment)
+        if old_segment is not None:
+            old_segment.close()
+        view = {mode: self.scores[mode][:n] for mode, n in lengths.items()}
+        view[GENERATION_KEY] = new_gen
+        tmp = self.snapshot_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as sf:
+            json.dump(view, sf, ensure_ascii=False)
+            sf.flush()
+            os.fsync(sf.fileno())
+        os.replace(tmp, self.snapshot_path)
+        self.generation = new_gen
+        for gen, path in self._segments():
+            if gen < new_gen:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        self.compactions += 1
+
+    def stats(self) -> dict:
+        return {
+            'generation': self.generation,
+            'segment_lines': self._segment_lines,
+            'pending': len(self._pending),
+            'appended': self.appended,
+            'flushes': self.flushes,
+            'compactions': self.compactions,
+            'write_errors': self.write_errors,
+        }
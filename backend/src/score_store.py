@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+# Pluggable persistence for scores and finished-game history.
+#
+#   SCORE_BACKEND=journal  in-memory SCORES + append-only journal + personal-best boards (default)
+#   SCORE_BACKEND=sqlite   SQLite file (SCORES_DB), WAL mode; nothing is loaded into RAM at startup
+#
+# Both expose the same methods, so /scores/* and finalize_game don't care which one is active.
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from score_journal import ScoreJournal
+from leaderboard import Leaderboards
+
+SCORE_BACKEND = os.getenv('SCORE_BACKEND', 'journal').lower()
+# finished games kept in memory by the journal backend (the sqlite backend keeps all of them)
+GAME_HISTORY_MAX = int(os.getenv('GAME_HISTORY_MAX', '1000'))
+
+
+def percentile(rank: int, total: int) -> float:
+    # share of ranked players at or below this rank, 0-100
+    return round((total - rank + 1) / total * 100, 2) if total else 0.0
+
+
+def game_record(game_id: str, game: dict, nicknames: dict) -> dict:
+    return {
+        'game_id': game_id,
+        'rule': game.get('rule'),
+        'room': game.get('room'),
+        'started_at': game.get('started_at'),
+        'ended_at': game.get('ended_at'),
+        'final_ranking': [
+            {'player': r['player'], 'nickname': nicknames.get(r['player']), 'score': r['score']}
+            for r in game.get('final_ranking', [])
+        ],
+    }
+
+
+class JournalScoreStore:
+    name = 'journal'
+
+    def __init__(self, snapshot_path: str):
+        self.journal = ScoreJournal(snapshot_path)
+        self.scores = self.journal.load()
+        self.boards = Leaderboards(self.scores)
+        self._games = deque(maxlen=GAME_HISTORY_MAX)
+
+    def start(self):
+        self.journal.start()
+
+    def stop(self):
+        self.journal.stop()
+
+    def modes(self):
+        return sorted(set(self.scores) | set(self.boards.modes()))
+
+    def record(self, mode: str, rec: dict):
+        self.journal.append(mode, rec)
+        self.boards.add(mode, rec)
+
+    def top(self, mode: str, limit: int, offset: int = 0):
+        return self.boards.board(mode).top(limit, offset)
+
+    def total(self, mode: str) -> int:
+        return len(self.boards.board(mode))
+
+    def rank(self, mode: str, player: str):
+        board = self.boards.board(mode)
+        r = board.rank(player)
+        if r is None:
+            return None
+        return {'rank': r, 'total': len(board), 'percentile': percentile(r, len(board)), 'best': board.best(player)}
+
+    def rank_of_score(self, mode: str, score: int) -> int:
+        return self.boards.board(mode).rank_of_score(score)
+
+    def record_game(self, game_id: str, game: dict, nicknames: dict):
+        self._games.append(game_record(game_id, game, nicknames))
+
+    def player_games(self, nickname: str, limit: int = 20):
+        out = []
+        for g in reversed(self._games):
+            if any(r['nickname'] == nickname for r in g['final_ranking']):
+                out.append(g)
+                if len(out) >= limit:
+                    break
+        return out
+
+    def stats(self) -> dict:
+        return {
+            'backend': self.name,
+            'records': {mode: len(lst) for mode, lst in self.scores.items()},
+            'boards': self.boards.stats(),
+            'games_kept': len(self._games),
+            'journal': self.journal.stats(),
+        }
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    id INTEGER PRIMARY KEY,
+    mode TEXT NOT NULL,
+    player TEXT,
+    score INTEGER NOT NULL,
+    time REAL,
+    meta TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_scores_mode_score ON scores(mode, score DESC);
+CREATE INDEX IF NOT EXISTS idx_scores_player ON scores(player, mode);
+CREATE INDEX IF NOT EXISTS idx_scores_created ON scores(created_at);
+CREATE TABLE IF NOT EXISTS best_scores (
+    mode TEXT NOT NULL,
+    player TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    score_id INTEGER NOT NULL,
+    PRIMARY KEY (mode, player)
+);
+CREATE INDEX IF NOT EXISTS idx_best_rank ON best_scores(mode, score DESC, score_id);
+-- players per board, kept by triggers in the same transaction as the upsert so totals are O(1);
+-- an upsert that takes the DO UPDATE path fires only the update trigger, i.e. no count change
+CREATE TABLE IF NOT EXISTS best_counts (
+    mode TEXT PRIMARY KEY,
+    players INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS best_scores_count_insert AFTER INSERT ON best_scores BEGIN
+    INSERT INTO best_counts (mode, players) VALUES (new.mode, 1)
+        ON CONFLICT(mode) DO UPDATE SET players = players + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS best_scores_count_delete AFTER DELETE ON best_scores BEGIN
+    UPDATE best_counts SET players = players - 1 WHERE mode = old.mode;
+END;
+-- databases created before best_counts existed
+INSERT OR IGNORE INTO best_counts (mode, players) SELECT mode, COUNT(*) FROM best_scores GROUP BY mode;
+CREATE TABLE IF NOT EXISTS games (
+    game_id TEXT PRIMARY KEY,
+    rule TEXT,
+    room TEXT,
+    started_at REAL,
+    ended_at REAL,
+    final_ranking TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_games_ended ON games(ended_at);
+CREATE TABLE IF NOT EXISTS game_players (
+    game_id TEXT NOT NULL,
+    player_id TEXT NOT NULL,
+    nickname TEXT,
+    score INTEGER,
+    rank INTEGER,
+    PRIMARY KEY (game_id, player_id)
+);
+CREATE INDEX IF NOT EXISTS idx_game_players_nickname ON game_players(nickname);
+"""
+
+# statement text is constant so sqlite3's per-connection statement cache reuses the prepared form
+_INSERT_SCORE = 'INSERT INTO scores (mode, player, score, time, meta, created_at) VALUES (?, ?, ?, ?, ?, ?)'
+_UPSERT_BEST = ('INSERT INTO best_scores (mode, player, score, score_id) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(mode, player) DO UPDATE SET score = excluded.score, score_id = excluded.score_id '
+                'WHERE excluded.score > best_scores.score')
+_TOP = ('SELECT s.player, s.score, s.time, s.meta FROM best_scores b JOIN scores s ON s.id = b.score_id '
+        'WHERE b.mode = ? ORDER BY b.score DESC, b.score_id LIMIT ? OFFSET ?')
+_TOTAL = 'SELECT players FROM best_counts WHERE mode = ?'
+_BEST = ('SELECT b.score, b.score_id, s.time, s.meta FROM best_scores b JOIN scores s ON s.id = b.score_id '
+         'WHERE b.mode = ? AND b.player = ?')
+_AHEAD = 'SELECT COUNT(*) FROM best_scores WHERE mode = ? AND (score > ? OR (score = ? AND score_id < ?))'
+_AT_OR_ABOVE = 'SELECT COUNT(*) FROM best_scores WHERE mode = ? AND score >= ?'
+_INSERT_GAME = ('INSERT OR REPLACE INTO games (game_id, rule, room, started_at, ended_at, final_ranking) '
+                'VALUES (?, ?, ?, ?, ?, ?)')
+_INSERT_GAME_PLAYER = ('INSERT OR REPLACE INTO game_players (game_id, player_id, nickname, score, rank) '
+                       'VALUES (?, ?, ?, ?, ?)')
+_PLAYER_GAMES = ('SELECT g.game_id, g.rule, g.room, g.started_at, g.ended_at, g.final_ranking '
+                 'FROM game_players p JOIN games g ON g.game_id = p.game_id '
+                 'WHERE p.nickname = ? ORDER BY g.ended_at DESC LIMIT ?')
+
+
+class SQLiteScoreStore:
+    name = 'sqlite'
+
+    def __init__(self, db_path: str, import_snapshot: str = None):
+        self.db_path = db_path
+        # one shared connection; handlers run in the threadpool so access is serialized here
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, cached_statements=64)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            # WAL + NORMAL: commits don't fsync, checkpoints do; a crash can lose only the last commits
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(_SCHEMA)
+        if import_snapshot:
+            self._import_snapshot(import_snapshot)
+
+    def _import_snapshot(self, path: str):
+        # first start on sqlite: carry over scores.json (+ journal) once
+        with self._lock:
+            if self._conn.execute('SELECT 1 FROM scores LIMIT 1').fetchone():
+                return
+        if not os.path.isfile(path):
+            return
+        scores = ScoreJournal(path).read()
+        n = 0
+        with self._lock:
+            self._conn.execute('BEGIN')
+            for mode, records in scores.items():
+                for rec in records if isinstance(records, list) else ():
+                    if isinstance(rec, dict):
+                        self._insert(mode, rec)
+                        n += 1
+            self._conn.execute('COMMIT')
+        print(f'Imported {n} score records from {path} into {self.db_path}')
+
+    def start(self):
+        pass
+
+    def stop(self):
+        with self._lock:
+            self._conn.close()
+
+    def modes(self):
+        with self._lock:
+            rows = self._conn.execute('SELECT DISTINCT mode FROM best_scores').fetchall()
+        return sorted({'solo', 'rta', 'vs'} | {r[0] for r in rows})
+
+    def _insert(self, mode: str, rec: dict):
+        try:
+            score = int(rec.get('score') or 0)
+        except (TypeError, ValueError):
+            score = 0
+        player = rec.get('player')
+        cur = self._conn.execute(_INSERT_SCORE, (mode, player, score, rec.get('time'),
+                                                 json.dumps(rec.get('meta') or {}, ensure_ascii=False), time.time()))
+        if player is not None:
+            self._conn.execute(_UPSERT_BEST, (mode, player, score, cur.lastrowid))
+
+    def record(self, mode: str, rec: dict):
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                self._insert(mode, rec)
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    @staticmethod
+    def _row_record(player, score, t, meta):
+        try:
+            meta = json.loads(meta) if meta else {}
+        except ValueError:
+            meta = {}
+        return {'player': player, 'score': score, 'time': t, 'meta': meta}
+
+    def top(self, mode: str, limit: int, offset: int = 0):
+        with self._lock:
+            rows = self._conn.execute(_TOP, (mode, max(0, limit), max(0, offset))).fetchall()
+        return [self._row_record(*r) for r in rows]
+
+    def _total(self, mode: str) -> int:
+        row = self._conn.execute(_TOTAL, (mode,)).fetchone()
+        return row[0] if row else 0
+
+    def total(self, mode: str) -> int:
+        with self._lock:
+            return self._total(mode)
+
+    def rank(self, mode: str, player: str):
+        with self._lock:
+            best = self._conn.execute(_BEST, (mode, player)).fetchone()
+            if best is None:
+                return None
+            score, score_id, t, meta = best
+            ahead = self._conn.execute(_AHEAD, (mode, score, score, score_id)).fetchone()[0]
+            total = self._total(mode)
+        r = ahead + 1
+        return {'rank': r, 'total': total, 'percentile': percentile(r, total),
+                'best': self._row_record(player, score, t, meta)}
+
+    def rank_of_score(self, mode: str, score: int) -> int:
+        with self._lock:
+            return self._conn.execute(_AT_OR_ABOVE, (mode, score)).fetchone()[0] + 1
+
+    def record_game(self, game_id: str, game: dict, nicknames: dict):
+        rec = game_record(game_id, game, nicknames)
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                self._conn.execute(_INSERT_GAME, (game_id, rec['rule'], rec['room'], rec['started_at'], rec['ended_at'],
+                                                  json.dumps(rec['final_ranking'], ensure_ascii=False)))
+                for i, r in enumerate(rec['final_ranking'], 1):
+                    self._conn.execute(_INSERT_GAME_PLAYER, (game_id, r['player'], r['nickname'], r['score'], i))
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def player_games(self, nickname: str, limit: int = 20):
+        with self._lock:
+            rows = self._conn.execute(_PLAYER_GAMES, (nickname, max(0, limit))).fetchall()
+        return [{'game_id': gid, 'rule': rule, 'room': room, 'started_at': s, 'ended_at': e,
+                 'final_ranking': json.loads(fr)} for gid, rule, room, s, e, fr in rows]
+
+    def stats(self) -> dict:
+        with self._lock:
+            records = dict(self._conn.execute('SELECT mode, COUNT(*) FROM scores GROUP BY mode').fetchall())
+            games = self._conn.execute('SELECT COUNT(*) FROM games').fetchone()[0]
+        return {'backend': self.name, 'db_path': self.db_path, 'records': records, 'games': games}
+
+
+def open_score_store(snapshot_path: str, db_path: str, backend: str = SCORE_BACKEND):
+    if backend == 'sqlite':
+        return SQLiteScoreStore(db_path, import_snapshot=snapshot_path)
+    if backend != 'journal':
+        print(f"Unknown SCORE_BACKEND={backend!r}, using journal")
+    return JournalScoreStore(snapshot_path)
@@ -0,0 +1,577 @@
+# -*- coding: utf-8 -*-
+# Shared lobby/game state in a Redis-protocol server, so several uvicorn workers
+# (or hosts) see the same players, queues, rooms and games.
+#
+# Each class mirrors the in-process one it replaces (PlayerRegistry, Matchmaker,
+# RoomRegistry, GameStore). Single-key counters use atomic commands (HINCRBY,
+# HSETNX, INCR); multi-key changes (forming a match group, filling a room) run
+# as WATCH/MULTI/EXEC transactions and retry when another worker got there first.
+#
+# Push events and deadlines are shared too: every worker PUBLISHes events on one
+# channel and delivers the ones meant for its own WebSocket subscribers, and
+# deadlines live in one sorted set that any worker may claim and fire.
+import json
+import threading
+import time
+import uuid
+
+from players import Player
+from games import PENDING, ACTIVE, FINALIZING, ARCHIVED, GAME_ARCHIVE_TTL
+from events import EventHub
+from deadlines import DeadlineScheduler
+from resp_client import RespError
+
+MAX_TX_RETRIES = 50
+
+
+class Keys:
+    def __init__(self, prefix: str):
+        self.p = prefix
+
+    def __call__(self, *parts) -> str:
+        return self.p + ':'.join(str(x) for x in parts)
+
+
+class RedisPlayerRegistry:
+    def __init__(self, client, keys: Keys):
+        self.r = client
+        self.k = keys
+
+    def __len__(self):
+        return self.r.execute('SCARD', self.k('players'))
+
+    def __contains__(self, player_id):
+        return bool(player_id) and bool(self.r.execute('SISMEMBER', self.k('players'), player_id))
+
+    def get(self, player_id):
+        if not player_id:
+            return None
+        h = self.r.execute('HGETALL', self.k('player', player_id))
+        if not h:
+            return None
+        h = dict(zip(h[::2], h[1::2]))
+        return Player(player_id, h.get('nickname'), h.get('session_token'), float(h.get('last_seen') or 0))
+
+    def register(self, nickname: str, player_id: str = None) -> Player:
+        pid = player_id or str(uuid.uuid4())
+        player = Player(pid, nickname, uuid.uuid4().hex, time.time())
+        old = self.r.execute('HGET', self.k('player', pid), 'session_token')
+        commands = []
+        if old:
+            commands.append(('DEL', self.k('token', old)))
+        commands += [
+            ('HSET', self.k('player', pid), 'nickname', nickname, 'session_token', player.session_token, 'last_seen', player.last_seen),
+            ('SET', self.k('token', player.session_token), pid),
+            ('SADD', self.k('players'), pid),
+        ]
+        self.r.multi_exec(commands)
+        return player
+
+    def remove(self, player_id: str):
+        player = self.get(player_id)
+        if player is None:
+            return None
+        self.r.multi_exec([
+            ('DEL', self.k('player', player_id)),
+            ('DEL', self.k('token', player.session_token)),
+            ('SREM', self.k('players'), player_id),
+        ])
+        return player
+
+    def by_token(self, session_token: str):
+        return self.r.execute('GET', self.k('token', session_token)) if session_token else None
+
+    def resolve(self, player_id: str = None, session_token: str = None):
+        if player_id and player_id in self:
+            return player_id
+        if session_token:
+            return self.by_token(session_token)
+        return None
+
+    def touch(self, player_id: str, now: float = None) -> bool:
+        if not player_id or not self.r.execute('EXISTS', self.k('player', player_id)):
+            return False
+        self.r.execute('HSET', self.k('player', player_id), 'last_seen', now if now is not None else time.time())
+        return True
+
+    def nickname(self, player_id: str, default: str = '匿名') -> str:
+        name = self.r.execute('HGET', self.k('player', player_id), 'nickname') if player_id else None
+        return name if name is not None else default
+
+
+# rule_of value for players popped into a group and not released yet (see Matchmaker.release)
+MATCHED = ''
+
+
+class RedisMatchmaker:
+    # per-rule sorted set (score = global join ticket) + player -> rule / joined_at hashes
+    def __init__(self, client, keys: Keys, group_size: int):
+        self.r = client
+        self.k = keys
+        self.group_size = group_size
+
+    def waiting_count(self) -> int:
+        # queued members only; rule_of also holds MATCHED claims
+        return sum(self.stats().values())
+
+    def queue_length(self, rule: str) -> int:
+        return self.r.execute('ZCARD', self.k('mm', 'q', rule))
+
+    def rule_of(self, player_id: str):
+        return self.r.execute('HGET', self.k('mm', 'rule_of'), player_id) or None
+
+    def join(self, player_id: str, rule: str, now: float = None) -> bool:
+        # the rule_of claim and the queue entry land together, so a concurrent leave()
+        # never sees a claim without its entry; a ticket burnt by a retry only leaves a gap
+        key = self.k('mm', 'rule_of')
+        ticket = self.r.execute('INCR', self.k('mm', 'ticket'))
+        for _ in range(MAX_TX_RETRIES):
+            self.r.execute('WATCH', key)
+            if self.r.execute('HEXISTS', key, player_id):
+                self.r.execute('UNWATCH')
+                return False
+            done = self.r.multi_exec([
+                ('HSET', key, player_id, rule),
+                ('ZADD', self.k('mm', 'q', rule), ticket, player_id),
+                ('HSET', self.k('mm', 'joined_at'), player_id, now if now is not None else time.time()),
+                ('SADD', self.k('mm', 'rules'), rule),
+            ])
+            if done is not None:
+                return True
+        return False
+
+    def leave(self, player_id: str) -> bool:
+        key = self.k('mm', 'rule_of')
+        for _ in range(MAX_TX_RETRIES):
+            self.r.execute('WATCH', key)
+            rule = self.r.execute('HGET', key, player_id)
+            if rule is None or rule == MATCHED:
+                self.r.execute('UNWATCH')
+                if rule == MATCHED:
+                    self.release([player_id])
+                return False
+            # fails if the player was matched (or left) between the read and EXEC
+            done = self.r.multi_exec([
+                ('HDEL', key, player_id),
+                ('ZREM', self.k('mm', 'q', rule), player_id),
+                ('HDEL', self.k('mm', 'joined_at'), player_id),
+            ])
+            if done is not None:
+                return True
+        return False
+
+    def position(self, player_id: str):
+        rule = self.rule_of(player_id)
+        if rule is None:
+            return None
+        rank, total = self.r.pipeline([
+            ('ZRANK', self.k('mm', 'q', rule), player_id),
+            ('ZCARD', self.k('mm', 'q', rule)),
+        ])
+        if rank is None:
+            return None  # matched between the two reads
+        return rule, rank + 1, total
+
+    def pop_groups(self, rule: str):
+        # take every full group of the oldest waiters; a concurrent pop by another worker retries
+        qkey = self.k('mm', 'q', rule)
+        for _ in range(MAX_TX_RETRIES):
+            self.r.execute('WATCH', qkey)
+            n = self.r.execute('ZCARD', qkey)
+            count = (n // self.group_size) * self.group_size
+            if not count:
+                self.r.execute('UNWATCH')
+                return []
+            members = self.r.execute('ZRANGE', qkey, 0, count - 1)
+            joined = self.r.execute('HMGET', self.k('mm', 'joined_at'), *members)
+            # rule_of keeps a MATCHED claim so join()'s HSETNX keeps refusing them until release()
+            done = self.r.multi_exec([
+                ('ZREM', qkey, *members),
+                ('HSET', self.k('mm', 'rule_of'), *[x for pid in members for x in (pid, MATCHED)]),
+                ('HDEL', self.k('mm', 'joined_at'), *members),
+            ])
+            if done is not None:
+                entries = [{'player_id': pid, 'joined_at': float(t or 0)} for pid, t in zip(members, joined)]
+                return [entries[i:i + self.group_size] for i in range(0, count, self.group_size)]
+        return []
+
+    def release(self, player_ids):
+        # drop MATCHED claims only; a player who already left and re-joined keeps the new entry
+        key = self.k('mm', 'rule_of')
+        for pid in player_ids:
+            for _ in range(MAX_TX_RETRIES):
+                self.r.execute('WATCH', key)
+                if self.r.execute('HGET', key, pid) != MATCHED:
+                    self.r.execute('UNWATCH')
+                    break
+                if self.r.multi_exec([('HDEL', key, pid)]) is not None:
+                    break
+
+    def stats(self) -> dict:
+        rules = self.r.execute('SMEMBERS', self.k('mm', 'rules')) or []
+        counts = self.r.pipeline([('ZCARD', self.k('mm', 'q', rule)) for rule in rules]) if rules else []
+        return {rule: n for rule, n in zip(rules, counts) if n}
+
+
+class RedisRoomRegistry:
+    def __init__(self, client, keys: Keys):
+        self.r = client
+        self.k = keys
+
+    def __len__(self):
+        return self.r.execute('SCARD', self.k('rooms'))
+
+    def _meta(self, room_id: str):
+        raw = self.r.execute('GET', self.k('room', room_id))
+        return json.loads(raw) if raw else None
+
+    def get(self, room_id: str):
+        meta = self._meta(room_id)
+        if meta is None:
+            return None
+        meta['players'] = self.r.execute('LRANGE', self.k('room', room_id, 'players'), 0, -1)
+        return meta
+
+    def room_of(self, player_id: str):
+        return self.r.execute('HGET', self.k('room_of'), player_id)
+
+    def member_count(self) -> int:
+        return self.r.execute('HLEN', self.k('room_of'))
+
+    def create(self, room_id: str, room: dict, player_id: str) -> dict:
+        self.leave(player_id)
+        meta = {k: v for k, v in room.items() if k != 'players'}
+        self.r.multi_exec([
+            ('SET', self.k('room', room_id), json.dumps(meta, ensure_ascii=False)),
+            ('RPUSH', self.k('room', room_id, 'players'), player_id),
+            ('HSET', self.k('room_of'), player_id, room_id),
+            ('SADD', self.k('rooms'), room_id),
+        ])
+        return dict(meta, players=[player_id])
+
+    def _close_commands(self, room_id: str, players):
+        commands = [
+            ('DEL', self.k('room', room_id), self.k('room', room_id, 'players')),
+            ('SREM', self.k('rooms'), room_id),
+        ]
+        if players:
+            commands.append(('HDEL', self.k('room_of'), *players))
+        return commands
+
+    def join(self, room_id: str, player_id: str, password: str = None):
+        # same contract as RoomRegistry.join; the capacity check and the add commit together
+        current = self.room_of(player_id)
+        if current not in (None, room_id):
+            self.leave(player_id)
+        pkey = self.k('room', room_id, 'players')
+        for _ in range(MAX_TX_RETRIES):
+            self.r.execute('WATCH', pkey, self.k('room', room_id))
+            meta = self._meta(room_id)
+            if meta is None:
+                self.r.execute('UNWATCH')
+                return 'unknown_room', None, None
+            if meta.get('password') and (not password or password != meta.get('password')):
+                self.r.execute('UNWATCH')
+                return 'bad_password', None, None
+            players = self.r.execute('LRANGE', pkey, 0, -1)
+            commands = []
+            if player_id not in players:
+                if len(players) >= meta['max_players']:
+                    self.r.execute('UNWATCH')
+                    return 'room_full', None, None
+                players = players + [player_id]
+                commands += [('RPUSH', pkey, player_id), ('HSET', self.k('room_of'), player_id, room_id)]
+            start = players[:meta['max_players']] if len(players) >= meta['max_players'] else None
+            if start:
+                commands += self._close_commands(room_id, players)
+            if not commands:
+                self.r.execute('UNWATCH')
+                return None, dict(meta, players=players), None
+            if self.r.multi_exec(commands) is not None:
+                return None, dict(meta, players=players), start
+        return 'room_busy', None, None
+
+    def leave(self, player_id: str):
+        room_id = self.room_of(player_id)
+        if room_id is None:
+            return
+        pkey = self.k('room', room_id, 'players')
+        for _ in range(MAX_TX_RETRIES):
+            self.r.execute('WATCH', pkey)
+            players = self.r.execute('LRANGE', pkey, 0, -1)
+            remaining = [p for p in players if p != player_id]
+            commands = [('HDEL', self.k('room_of'), player_id), ('LREM', pkey, 0, player_id)]
+            if not remaining:
+                commands += self._close_commands(room_id, [])
+            if self.r.multi_exec(commands) is not None:
+                if not remaining:
+                    print(f"Cleaned up empty room: {room_id}")
+                return
+
+
+class RedisGameStore:
+    # game:{id} hash (static JSON + pointer/state/first_finish_at/finished/...),
+    # game:{id}:scores and game:{id}:done hashes; finished games expire after GAME_ARCHIVE_TTL
+    def __init__(self, client, keys: Keys, archive_ttl: float = GAME_ARCHIVE_TTL, pending_ttl: int = 3600):
+        self.r = client
+        self.k = keys
+        self.archive_ttl = archive_ttl
+        self.pending_ttl = pending_ttl
+
+    def __contains__(self, game_id):
+        return bool(self.r.execute('EXISTS', self.k('game', game_id)))
+
+    def live_count(self) -> int:
+        return self.r.execute('SCARD', self.k('games', 'live'))
+
+    def archive_count(self) -> int:
+        # games still kept for late polls; the archive index mirrors the keys' EXPIRE
+        akey = self.k('games', 'archive')
+        _, n = self.r.pipeline([
+            ('ZREMRANGEBYSCORE', akey, '-inf', time.time() - self.archive_ttl),
+            ('ZCARD', akey),
+        ])
+        return n
+
+    def add(self, game_id: str, game: dict):
+        static = {k: game[k] for k in ('players', 'questions', 'answers', 'rule', 'room', 'started_at') if k in game}
+        game['state'] = PENDING
+        commands = [
+            ('HSET', self.k('game', game_id), 'static', json.dumps(static, ensure_ascii=False), 'pointer', 0, 'state', PENDING),
+            ('HSET', self.k('game', game_id, 'scores'), *[x for p in game['players'] for x in (p, 0)]),
+            ('SADD', self.k('games', 'live'), game_id),
+            ('INCR', self.k('games', 'created')),
+        ]
+        for p in game['players']:
+            commands.append(('SET', self.k('pending', p), game_id, 'EX', self.pending_ttl))
+        self.r.multi_exec(commands)
+
+    def get(self, game_id: str):
+        h, scores, done = self.r.pipeline([
+            ('HGETALL', self.k('game', game_id)),
+            ('HGETALL', self.k('game', game_id, 'scores')),
+            ('HGETALL', self.k('game', game_id, 'done')),
+        ])
+        if not h:
+            return None
+        h = dict(zip(h[::2], h[1::2]))
+        g = json.loads(h['static'])
+        g.update({
+            'pointer': int(h.get('pointer') or 0),
+            'state': h.get('state'),
+            'scores': {p: int(s) for p, s in zip(scores[::2], scores[1::2])},
+            'done': {p: True for p in done[::2]},
+            'first_finish_at': int(h['first_finish_at']) if h.get('first_finish_at') else None,
+            'finished': h.get('finished') == '1',
+        })
+        if h.get('ended_at'):
+            g['ended_at'] = int(h['ended_at'])
+        if h.get('final_ranking'):
+            g['final_ranking'] = json.loads(h['final_ranking'])
+        return g
+
+    def get_live(self, game_id: str):
+        if not self.r.execute('SISMEMBER', self.k('games', 'live'), game_id):
+            return None
+        return self.get(game_id)
+
+    def set_state(self, game_id: str, state: str):
+        self.r.execute('HSET', self.k('game', game_id), 'state', state)
+
+    def activate(self, game_id: str):
+        if self.r.execute('HGET', self.k('game', game_id), 'state') == PENDING:
+            self.set_state(game_id, ACTIVE)
+
+    def pending_for(self, player_id: str):
+        game_id = self.r.execute('GET', self.k('pending', player_id))
+        if game_id and self.r.execute('SISMEMBER', self.k('games', 'live'), game_id):
+            return game_id
+        return None
+
+    def take_pending(self, player_id: str):
+        # GET + DEL in one transaction: each pointer is delivered once even across workers
+        result = self.r.multi_exec([('GET', self.k('pending', player_id)), ('DEL', self.k('pending', player_id))])
+        game_id = result[0] if result else None
+        if game_id and self.r.execute('SISMEMBER', self.k('games', 'live'), game_id):
+            return game_id
+        return None
+
+    def drop_pending(self, player_id: str):
+        self.r.execute('DEL', self.k('pending', player_id))
+
+    def pending_count(self) -> int:
+        return 0  # pointers expire on their own (pending_ttl); not enumerated
+
+    def next_question(self, game_id: str):
+        static = self.r.execute('HGET', self.k('game', game_id), 'static')
+        if static is None:
+            return None
+        questions = json.loads(static)['questions']
+        ptr = self.r.execute('HINCRBY', self.k('game', game_id), 'pointer', 1) - 1
+        if ptr >= len(questions):
+            return ptr, None
+        return ptr, questions[ptr]
+
+    def record_answer(self, game_id: str, player_id: str, delta: int, done: bool, now: int):
+        # WATCH the game and its done flags: a finish() or another player's done between the
+        # read and EXEC retries, so no score lands after the game finished and exactly one
+        # caller sees first_finish / all_done
+        gkey = self.k('game', game_id)
+        dkey = self.k('game', game_id, 'done')
+        for _ in range(MAX_TX_RETRIES):
+            self.r.execute('WATCH', gkey, dkey)
+            static, finished, state, first_at = self.r.execute('HMGET', gkey, 'static', 'finished', 'state', 'first_finish_at')
+            if static is None or finished == '1':
+                self.r.execute('UNWATCH')
+                return None if static is None else {'finished': True}
+            players = json.loads(static)['players']
+            done_flags = dict(zip(players, self.r.execute('HMGET', dkey, *players)))
+            commands = []
+            changed = bool(delta)
+            if delta:
+                commands.append(('HINCRBY', self.k('game', game_id, 'scores'), player_id, delta))
+            first = False
+            if done and not done_flags.get(player_id):
+                done_flags[player_id] = '1'
+                commands.append(('HSET', dkey, player_id, 1))
+                changed = True
+                if not first_at:
+                    first, first_at = True, now
+                    commands.append(('HSET', gkey, 'first_finish_at', now, 'state', FINALIZING))
+            if state == PENDING and not first:
+                commands.append(('HSET', gkey, 'state', ACTIVE))
+            result = {
+                'finished': False,
+                'changed': changed,
+                'first_finish': first,
+                'first_finish_at': int(first_at) if first_at else None,
+                'all_done': all(done_flags.values()),
+            }
+            if not commands:
+                self.r.execute('UNWATCH')
+                return result
+            if self.r.multi_exec(commands) is not None:
+                return result
+        raise RuntimeError(f'game {game_id}: answer not recorded after {MAX_TX_RETRIES} conflicting updates')
+
+    def finish(self, game_id: str, now: int):
+        # HSETNX on `finished` is the compare-and-set: exactly one worker finalizes a game
+        gkey = self.k('game', game_id)
+        if not self.r.execute('EXISTS', gkey) or not self.r.execute('HSETNX', gkey, 'finished', 1):
+            return None
+        g = self.get(game_id)
+        scores = g.get('scores', {})
+        ranking = sorted([(p, scores.get(p, 0)) for p in g['players']], key=lambda x: x[1], reverse=True)
+        g['final_ranking'] = [{'player': p, 'score': s} for p, s in ranking]
+        g['ended_at'] = now
+        self.r.execute('HSET', gkey, 'final_ranking', json.dumps(g['final_ranking'], ensure_ascii=False), 'ended_at', now)
+        return g
+
+    def archive(self, game_id: str):
+        if not self.r.execute('SREM', self.k('games', 'live'), game_id):
+            return None
+        ttl = max(1, int(self.archive_ttl))
+        gkey = self.k('game', game_id)
+        self.r.pipeline([
+            ('HSET', gkey, 'state', ARCHIVED),
+            ('EXPIRE', gkey, ttl),
+            ('EXPIRE', self.k('game', game_id, 'scores'), ttl),
+            ('EXPIRE', self.k('game', game_id, 'done'), ttl),
+            ('ZADD', self.k('games', 'archive'), time.time(), game_id),
+            ('INCR', self.k('games', 'archived')),
+        ])
+        return self.get(game_id)
+
+    def stats(self) -> dict:
+        return {
+            'live': self.live_count(),
+            'created': int(self.r.execute('GET', self.k('games', 'created')) or 0),
+            'archive_size': self.archive_count(),
+            'archived': int(self.r.execute('GET', self.k('games', 'archived')) or 0),
+            'archive_ttl_seconds': self.archive_ttl,
+        }
+
+
+# how long the event listener waits before resubscribing after losing the server
+EVENT_RESUBSCRIBE_SECONDS = 1.0
+# deadlines claimed per round trip
+DEADLINE_BATCH = 100
+
+
+class RedisEventHub(EventHub):
+    # a player's WebSocket may be open on any worker: publish to every worker, fan out locally
+    def __init__(self, client, keys: Keys):
+        super().__init__()
+        self.r = client
+        self.channel = keys('events')
+        self._listener = None
+
+    def bind_loop(self, loop):
+        super().bind_loop(loop)
+        if self._listener is None:
+            self._listener = threading.Thread(target=self._listen, name='event-listener', daemon=True)
+            self._listener.start()
+
+    def publish(self, player_ids, event: str, data: dict):
+        self.r.execute('PUBLISH', self.channel, json.dumps({'players': list(player_ids), 'event': event, 'data': data}))
+
+    def _listen(self):
+        while True:
+            try:
+                for raw in self.r.listen(self.channel):
+                    msg = json.loads(raw)
+                    self._fan_out(msg['players'], msg['event'], msg['data'])
+            except (ConnectionError, OSError, RespError) as e:
+                # events published meanwhile are lost; clients catch up on their next poll or hello
+                print(f"event channel lost: {e}; resubscribing")
+                time.sleep(EVENT_RESUBSCRIBE_SECONDS)
+
+
+class RedisDeadlineScheduler(DeadlineScheduler):
+    # member = JSON of the key tuple, score = due time; removing a due member is the claim to fire it
+    def __init__(self, client, keys: Keys):
+        super().__init__()
+        self.r = client
+        self.key = keys('deadlines')
+
+    @staticmethod
+    def _member(key) -> str:
+        return json.dumps(list(key))
+
+    def __len__(self):
+        return self.r.execute('ZCARD', self.key)
+
+    def schedule(self, key, due: float):
+        self.r.execute('ZADD', self.key, due, self._member(key))
+        self._notify()
+
+    def cancel(self, key):
+        self.r.execute('ZREM', self.key, self._member(key))
+
+    def due_at(self, key):
+        due = self.r.execute('ZSCORE', self.key, self._member(key))
+        return float(due) if due is not None else None
+
+    def pop_due(self, now: float):
+        # WATCH so a deadline re-scheduled by another worker between the read and the claim is left alone
+        for _ in range(MAX_TX_RETRIES):
+            self.r.execute('WATCH', self.key)
+            members = self.r.execute('ZRANGEBYSCORE', self.key, '-inf', now, 'LIMIT', 0, DEADLINE_BATCH)
+            if not members:
+                self.r.execute('UNWATCH')
+                return []
+            if self.r.multi_exec([('ZREM', self.key, *members)]) is not None:
+                return [tuple(json.loads(m)) for m in members]
+        return []
+
+    def next_due(self):
+        first = self.r.execute('ZRANGE', self.key, 0, 0, 'WITHSCORES')
+        return float(first[1]) if first else None
+
+    def stats(self) -> dict:
+        nxt = self.next_due()
+        return {
+            'scheduled': len(self),
+            'fired': self.fired,  # by this worker
+            'next_due_in': (nxt - time.time()) if nxt is not None else None,
+        }
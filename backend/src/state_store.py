@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# Where lobby/game state lives.
+#
+#   STATE_STORE_URL unset          -> in-process dicts (single uvicorn worker)
+#   STATE_STORE_URL=redis://h:p/db -> shared Redis-protocol server, so any number of
+#                                     workers behind a load balancer see one lobby
+#
+# Both variants expose the same parts: players, matchmaker, rooms, games, plus the
+# push event hub and the deadline scheduler (per-process in memory, shared in Redis).
+import os
+
+from players import PlayerRegistry
+from matchmaking import Matchmaker
+from rooms import RoomRegistry
+from games import GameStore
+from locks import LockTable
+from events import EventHub
+from deadlines import DeadlineScheduler
+from resp_client import RespClient
+from state_redis import (Keys, RedisPlayerRegistry, RedisMatchmaker, RedisRoomRegistry, RedisGameStore,
+                         RedisEventHub, RedisDeadlineScheduler)
+
+STATE_STORE_URL = os.getenv('STATE_STORE_URL', '')
+STATE_KEY_PREFIX = os.getenv('STATE_KEY_PREFIX', 'rm:')
+
+
+class MemoryStateStore:
+    name = 'memory'
+    shared = False
+
+    def __init__(self, group_size: int):
+        # one striped table for rule queues, rooms and games; keys are namespaced so they never collide
+        self.locks = LockTable()
+        self.players = PlayerRegistry()
+        self.matchmaker = Matchmaker(group_size, locks=self.locks)
+        self.rooms = RoomRegistry(locks=self.locks)
+        self.games = GameStore(locks=self.locks)
+        self.events = EventHub()
+        self.deadlines = DeadlineScheduler()
+
+    def stats(self) -> dict:
+        return {'backend': self.name, 'locks': self.locks.stats()}
+
+
+class RedisStateStore:
+    name = 'redis'
+    shared = True
+
+    def __init__(self, url: str, group_size: int, prefix: str = STATE_KEY_PREFIX, pending_ttl: int = 3600):
+        self.url = url
+        self.client = RespClient(url)
+        self.client.execute('PING')  # fail at startup, not on the first request
+        keys = Keys(prefix)
+        self.players = RedisPlayerRegistry(self.client, keys)
+        self.matchmaker = RedisMatchmaker(self.client, keys, group_size)
+        self.rooms = RedisRoomRegistry(self.client, keys)
+        self.games = RedisGameStore(self.client, keys, pending_ttl=pending_ttl)
+        self.events = RedisEventHub(self.client, keys)
+        self.deadlines = RedisDeadlineScheduler(self.client, keys)
+
+    def stats(self) -> dict:
+        up = self.url.split('@')[-1]  # never echo a password
+        return {'backend': self.name, 'server': up}
+
+
+def open_state_store(group_size: int, url: str = STATE_STORE_URL, **kwargs):
+    if url:
+        store = RedisStateStore(url, group_size, **kwargs)
+        print(f"Shared state store: {store.stats()['server']}")
+        return store
+    return MemoryStateStore(group_size)
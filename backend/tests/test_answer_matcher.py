@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from answer_matcher import AnswerMatcher  # noqa: E402
+
+QUESTIONS = [
+    {'id': 3, 'answers': ['ペリー', 'マシュー・ペリー']},
+    {'id': 112, 'answers': ['OS', 'オペレーティングシステム']},
+    {'id': 'ram', 'answers': ['RAM']},
+    {'id': 'year', 'answers': ['200']},
+    {'id': 'bio', 'answers': ['光合成']},
+]
+
+
+@pytest.fixture
+def matcher():
+    return AnswerMatcher(QUESTIONS)
+
+
+@pytest.mark.parametrize('text, qid', [
+    ('ペリーです', 3),
+    ('マシューペリー', 3),
+    ('ﾍﾟﾘｰ', 3),
+    ('OSです', 112),
+    ('Windows OS', 112),
+    ('RAMについて', 'ram'),
+    ('200年', 'year'),
+    ('光合成です', 'bio'),
+])
+def test_whole_word_answers_are_hits(matcher, text, qid):
+    assert matcher.judge(text, matcher.answers_for(qid)) is True
+
+
+@pytest.mark.parametrize('text, qid', [
+    ('ペリカンです', 3),
+    ('ペリ', 3),
+    ('Microsoft', 112),
+    ('programについて教えて', 'ram'),
+    ('2000', 'year'),
+    ('光合成反応', 'bio'),
+])
+def test_partial_words_are_left_undecided(matcher, text, qid):
+    answers = matcher.answers_for(qid)
+    assert matcher.judge(text, answers) is None
+    assert matcher.precheck(text, answers) is None
+
+
+def test_precheck_rejects_a_question_naming_the_answer(matcher):
+    assert matcher.precheck('黒船で来航したのはペリーですか', matcher.answers_for(3)) is False
+    assert matcher.precheck('黒船で来航したのは誰？ペリカンではない', matcher.answers_for(3)) is None
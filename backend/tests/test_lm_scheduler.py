@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from lm_scheduler import EndpointScheduler, LMBusy, LMScheduler, PRIORITY_PRACTICE, PRIORITY_VS  # noqa: E402
+
+
+def test_evicted_waiter_cancelled_before_resuming():
+    async def scenario():
+        sched = EndpointScheduler(max_in_flight=1, max_queue=1)
+        await sched.acquire()  # holds the only slot
+
+        practice = asyncio.ensure_future(sched.acquire(PRIORITY_PRACTICE))
+        await asyncio.sleep(0)
+        assert sched.queue_depth() == 1
+
+        vs = asyncio.ensure_future(sched.acquire(PRIORITY_VS))
+        await asyncio.sleep(0)  # the VS caller evicts the practice waiter ...
+        practice.cancel()  # ... which is cancelled before it gets to see LMBusy
+        with pytest.raises(asyncio.CancelledError):
+            await practice
+        assert sched.queue_depth() == 1
+
+        sched.release(10.0)
+        await vs
+        sched.release(10.0)
+        assert sched.queue_depth() == 0
+        assert sched.in_flight == 0
+        # the fast path still works: a new caller is admitted without queueing
+        assert await asyncio.wait_for(sched.acquire(), 1.0) == 0.0
+
+    asyncio.run(scenario())
+
+
+def test_evicted_waiter_gets_busy():
+    async def scenario():
+        sched = EndpointScheduler(max_in_flight=1, max_queue=1)
+        await sched.acquire()
+        practice = asyncio.ensure_future(sched.acquire(PRIORITY_PRACTICE))
+        await asyncio.sleep(0)
+        vs = asyncio.ensure_future(sched.acquire(PRIORITY_VS))
+        with pytest.raises(LMBusy):
+            await practice
+        sched.release(10.0)
+        await vs
+        sched.release(10.0)
+        assert (sched.queue_depth(), sched.in_flight, sched.evicted) == (0, 0, 1)
+
+    asyncio.run(scenario())
+
+
+def test_endpoints_are_keyed_by_host():
+    sched = LMScheduler()
+    a = sched.endpoint('http://lm.local:1234/v1/chat/completions')
+    assert sched.endpoint('http://lm.local:1234/other?x=1') is a
+    assert list(sched.stats()) == ['http://lm.local:1234']
+
+
+def test_endpoint_table_is_bounded():
+    async def scenario():
+        sched = LMScheduler(max_endpoints=2)
+        async with sched.slot('http://a:1/v1/chat/completions'):
+            sched.endpoint('http://b:1/')
+            sched.endpoint('http://c:1/')  # evicts the idle b, never the busy a
+            assert list(sched.stats()) == ['http://a:1', 'http://c:1']
+            async with sched.slot('http://c:1/'):
+                with pytest.raises(LMBusy):
+                    sched.endpoint('http://d:1/')
+        assert sched.load('http://d:1/') == 0
+        assert 'http://d:1' not in sched.stats()
+
+    asyncio.run(scenario())
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from score_store import SQLiteScoreStore  # noqa: E402
+
+
+def test_snapshot_import_leaves_the_journal_files_alone(tmp_path):
+    snapshot = tmp_path / 'scores.json'
+    snapshot.write_text(json.dumps({'solo': [{'player': 'a', 'score': 3}], '_generation': 2}), encoding='utf-8')
+    segment = tmp_path / 'scores.journal.2.jsonl'
+    segment.write_text(json.dumps({'mode': 'solo', 'rec': {'player': 'b', 'score': 5}}) + '\n', encoding='utf-8')
+    before = sorted(os.listdir(tmp_path))
+
+    store = SQLiteScoreStore(str(tmp_path / 'scores.db'), import_snapshot=str(snapshot))
+    try:
+        assert sorted(r['player'] for r in store.top('solo', 10)) == ['a', 'b']
+    finally:
+        store.stop()
+    after = [n for n in sorted(os.listdir(tmp_path)) if not n.startswith('scores.db')]
+    assert after == before
+
+
+def test_legacy_snapshot_import_creates_no_journal_segment(tmp_path):
+    snapshot = tmp_path / 'scores.json'
+    snapshot.write_text(json.dumps({'solo': [{'player': 'a', 'score': 3}]}), encoding='utf-8')
+
+    store = SQLiteScoreStore(str(tmp_path / 'scores.db'), import_snapshot=str(snapshot))
+    store.stop()
+    assert not [n for n in os.listdir(tmp_path) if '.journal.' in n]
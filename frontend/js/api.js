@@ -51,6 +51,76 @@
             }
             
             return await safeFetchJson(url);
+        },
+
+        // POST /ask_ai with stream=true. onEvent(name, data) is called for each
+        // answer/score/feedback event as soon as it arrives; resolves with the final result.
+        async askAIStream(server, payload, onEvent) {
+            const base = server.replace(/\/$/, '');
+            const res = await fetch(`${base}/ask_ai`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+                body: JSON.stringify({ ...payload, stream: true })
+            });
+            if (!res.ok) {
+                const errorText = await res.text().catch(() => res.statusText);
+                throw new Error(`サーバーエラー: ${res.status} ${res.statusText}. ${errorText}`);
+            }
+            const ctype = res.headers.get('content-type') || '';
+            if (!ctype.includes('text/event-stream') || !res.body) return await res.json();
+
+            const reader = res.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let result = null;
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                let sep;
+                while ((sep = buffer.indexOf('\n\n')) >= 0) {
+                    const block = buffer.slice(0, sep);
+                    buffer = buffer.slice(sep + 2);
+                    let name = 'message', data = '';
+                    block.split('\n').forEach(line => {
+                        if (line.startsWith('event:')) name = line.slice(6).trim();
+                        else if (line.startsWith('data:')) data += line.slice(5).trim();
+                    });
+                    let parsed = null;
+                    try { parsed = JSON.parse(data); } catch (e) { continue; }
+                    if (name === 'done') result = parsed;
+                    else if (onEvent) {
+                        try { onEvent(name, parsed); } catch (e) { console.warn('[GameAPI] stream handler failed', e); }
+                    }
+                }
+            }
+            if (!result) throw new Error('AIの応答ストリームが途中で終了しました');
+            return result;
+        },
+
+        // Open the per-player push channel (/ws/{player_id}). onEvent(name, data) receives
+        // match_found / game_state / first_finish / game_finished; pings keep the player alive.
+        openPushChannel(server, playerId, sessionToken, onEvent, onStatus) {
+            const base = server.replace(/\/$/, '').replace(/^http/, 'ws');
+            const url = `${base}/ws/${encodeURIComponent(playerId)}?session_token=${encodeURIComponent(sessionToken || '')}`;
+            const ws = new WebSocket(url);
+            let pingTimer = null;
+            ws.onopen = () => {
+                pingTimer = setInterval(() => { try { ws.send('ping'); } catch (e) {} }, 15000);
+                if (onStatus) onStatus(true);
+            };
+            ws.onmessage = (msg) => {
+                let parsed = null;
+                try { parsed = JSON.parse(msg.data); } catch (e) { return; }
+                if (parsed && parsed.event && onEvent) {
+                    try { onEvent(parsed.event, parsed.data || {}); } catch (e) { console.warn('[GameAPI] push handler failed', e); }
+                }
+            };
+            ws.onclose = () => {
+                if (pingTimer) clearInterval(pingTimer);
+                if (onStatus) onStatus(false);
+            };
+            return ws;
         }
     };
 })();
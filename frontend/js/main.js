@@ -1069,6 +1069,7 @@ class GameManager {
             }
             
             this.startHeartbeat();
+            this.startPushChannel();
             this.startServerStatsPolling();
             // Removed automatic matchmaking resume on connection - user must manually start matchmaking
 
@@ -1084,6 +1085,8 @@ class GameManager {
         if (this.heartbeatInterval) clearInterval(this.heartbeatInterval);
         this.heartbeatInterval = setInterval(async () => {
             if (!this.playerId || !this.gameServerUrl) return;
+            // the open push channel already keeps us alive on the server
+            if (this.pushConnected) return;
             try {
                 const hbPayload = { player_id: this.playerId };
                 if (this.sessionToken) hbPayload.session_token = this.sessionToken;
@@ -1098,6 +1101,47 @@ class GameManager {
         }, 15000);
     }
 
+    // Server push (WebSocket): match found / score / countdown / final ranking arrive as events,
+    // so lobby and game-state polling drop to a slow fallback while it is open.
+    startPushChannel() {
+        this.stopPushChannel();
+        if (!this.playerId || !this.gameServerUrl || !window.GameAPI || typeof WebSocket === 'undefined') return;
+        try {
+            this.pushSocket = window.GameAPI.openPushChannel(this.gameServerUrl, this.playerId, this.sessionToken,
+                (event, data) => this.handlePushEvent(event, data),
+                (connected) => {
+                    this.pushConnected = connected;
+                    if (!connected && this.pushSocket) {
+                        // retry later; polling keeps working in the meantime
+                        this.pushSocket = null;
+                        this.pushRetryTimer = setTimeout(() => this.startPushChannel(), 10000);
+                    }
+                });
+        } catch (e) {
+            console.warn('Push channel unavailable:', e);
+            this.pushConnected = false;
+        }
+    }
+
+    stopPushChannel() {
+        if (this.pushRetryTimer) clearTimeout(this.pushRetryTimer);
+        this.pushRetryTimer = null;
+        const ws = this.pushSocket;
+        this.pushSocket = null;
+        this.pushConnected = false;
+        if (ws) { try { ws.close(); } catch (e) {} }
+    }
+
+    handlePushEvent(event, data) {
+        if (event === 'match_found') {
+            if (this.isMatchmaking && data.game_id) this.handleMatchFound(data);
+        } else if (event === 'game_state' || event === 'game_finished') {
+            if (data.game_id && data.game_id === this.currentGameId) this.handleGameStateResponse(data);
+        } else if (event === 'first_finish') {
+            if (data.game_id && data.game_id === this.currentGameId) this.fetchAndHandleGameState();
+        }
+    }
+
     stopHeartbeat() {
         if (this.heartbeatInterval) clearInterval(this.heartbeatInterval);
         this.heartbeatInterval = null;
@@ -1755,6 +1799,7 @@ class GameManager {
         let consecutiveErrors = 0;
         const maxConsecutiveErrors = 3;
         let pollCount = 0;
+        let pushSkips = 0;
 
         // Ensure we have a valid playerId before starting polling. If missing, attempt a one-time re-registration.
         const ensurePlayerId = async () => {
@@ -1786,6 +1831,8 @@ class GameManager {
                 console.log('[Lobby] Stopping polling - matchmaking cancelled');
                 return this.stopLobbyPolling();
             }
+            // match_found is pushed while the channel is open; keep only a slow fallback poll
+            if (this.pushConnected && pollCount > 0 && (++pushSkips % 5) !== 0) return;
 
             pollCount++;
             console.log(`[Lobby] Poll attempt #${pollCount}`);
@@ -2289,10 +2336,6 @@ class GameManager {
             this.isProcessingAI = true;
             if (this.el.submitQuestionBtn) this.el.submitQuestionBtn.disabled = true;
             
-            // Update counters
-            this.questionCount++;
-            this.appendQuestionHistory(text);
-            
             // Clear input fields
             if (this.el.playerQuestion) this.el.playerQuestion.value = '';
             if (newPlayerTextarea) newPlayerTextarea.value = '';
@@ -2305,33 +2348,50 @@ class GameManager {
             const requestPayload = {
                 question: text,
                 target_answer: (q.answers && q.answers[0]) ? q.answers[0] : '',
-                lm_server: this.lmServerUrl
+                lm_server: this.lmServerUrl,
+                // lets the server prioritise VS grading when the LM is congested
+                mode: this.currentMode,
+                question_id: q.id,
+                // VS answers are judged against the question set the game started with
+                game_id: this.currentMode === 'vs' ? this.currentGameId : null
             };
 
             console.log('Submitting question:', requestPayload);
 
-            const res = await fetch(`${this.gameServerUrl}/ask_ai`, {
-                method: 'POST',
-                headers: { 
-                    'Content-Type': 'application/json',
-                    'Accept': 'application/json'
-                },
-                body: JSON.stringify(requestPayload),
-                timeout: 30000 // 30 second timeout
+            // Stream the answer so it shows up before the model finishes its feedback
+            const aiOutputModernEl = document.getElementById('ai-output-modern');
+            const data = await window.GameAPI.askAIStream(this.gameServerUrl, requestPayload, (event, payload) => {
+                if (event === 'answer' && payload.answer) {
+                    if (this.el.aiOutput) this.el.aiOutput.textContent = payload.answer;
+                    if (aiOutputModernEl) aiOutputModernEl.textContent = payload.answer;
+                }
             });
-
-            if (!res.ok) {
-                const errorText = await res.text().catch(() => 'レスポンスの読み取りに失敗');
-                throw new Error(`サーバーエラー: ${res.status} ${res.statusText}. ${errorText}`);
-            }
-
-            const data = await res.json();
             
             // Validate response data
             if (!data || typeof data !== 'object') {
                 throw new Error('無効なレスポンス形式です');
             }
 
+            // Server-side LM queue is full: don't count this as an attempt, just ask to retry
+            if (data.busy) {
+                this.setAIStatus('混雑中', '#ffaa00');
+                this.resumeQuestionTimer();
+                this.showNotification(data.invalid_message || 'AIサーバーが混雑しています。少し待ってから再試行してください。', 'warning');
+                return false;
+            }
+
+            // Update counters (only for questions the server actually took)
+            this.questionCount++;
+            this.appendQuestionHistory(text);
+
+            // Answer leaked in the question (decided by the server without asking the AI)
+            if (data.local && data.invalid_reason === 'answer_in_question') {
+                this.setAIStatus('待機中', '#ccc');
+                this.resumeQuestionTimer();
+                this.showNotification(data.invalid_message || '質問に答えが含まれています', 'error');
+                return false;
+            }
+
             // Update AI output safely
             let aiResponse = data.ai_response || '(応答なし)';
             
@@ -2376,6 +2436,8 @@ class GameManager {
             let isCorrect = false;
             if (data.valid !== false && q.answers) {
                 isCorrect = this.checkAnswer(parsedResponse, q.answers);
+                // the server's verdict can only confirm a match found here, never turn a miss into a hit
+                if (isCorrect && data.is_correct === false) isCorrect = false;
             }
             
             // Resume timer after AI response is received - only pause during processing
@@ -2589,7 +2651,12 @@ class GameManager {
         this.currentGameId = gameId;
         // immediately fetch once
         this.fetchAndHandleGameState();
-        this.gameStateInterval = setInterval(() => this.fetchAndHandleGameState(), 2000); // increased to 2s to reduce load
+        let pushSkips = 0;
+        this.gameStateInterval = setInterval(() => {
+            // state changes are pushed while the channel is open; poll every 10s as a fallback
+            if (this.pushConnected && (++pushSkips % 5) !== 0) return;
+            this.fetchAndHandleGameState();
+        }, 2000); // increased to 2s to reduce load
     }
 
     stopGameStatePolling() {
@@ -3235,6 +3302,7 @@ ${codeText}
                     throw new Error(`サーバーエラー ${res.status}: ${et}`);
                 }
                 const data = await res.json();
+                if (data.busy) throw new Error(data.invalid_message || 'AIサーバーが混雑しています');
                 // prefer structured fields from /ask_ai
                 let aiText = data.ai_response || data.answer || data.message || JSON.stringify(data);
                 // Remove <think> tags if present
@@ -8,6 +8,13 @@ import os
 import json
 import logging
 import base64
+import itertools
+import struct
+import threading
+import time
+import uuid
+from functools import lru_cache
+from math import gcd
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
@@ -18,6 +25,12 @@ import numpy as np
 from scipy.io import wavfile
 import soundfile as sf
 
+try:
+    # cffi handle of the vosk binding: lets AcceptWaveform read straight out of a memoryview
+    from vosk import _ffi as vosk_ffi
+except ImportError:
+    vosk_ffi = None
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -29,6 +42,37 @@ socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet')
 # Global model variable
 model = None
 
+# Recognition sessions (one per Socket.IO client)
+VOICE_MAX_SESSIONS = int(os.getenv('VOICE_MAX_SESSIONS', '16'))
+VOICE_POOL_SIZE = int(os.getenv('VOICE_POOL_SIZE', '4'))
+VOICE_SESSION_IDLE_SECONDS = float(os.getenv('VOICE_SESSION_IDLE_SECONDS', '60'))
+# /recognize/stream sessions share the manager; their keys carry this prefix instead of a sid
+HTTP_STREAM_PREFIX = 'http:'
+# an HTTP stream closed for idleness is finalized; /recognize/stream/end can fetch its text this long
+VOICE_STREAM_RESULT_GRACE_SECONDS = float(os.getenv('VOICE_STREAM_RESULT_GRACE_SECONDS', '60'))
+
+# Audio ingestion: 'raw' feeds 16 kHz int16 PCM to the recognizer as is,
+# 'wav' keeps the old per-chunk WAV re-encode (for comparison)
+VOICE_SAMPLE_RATE = 16000
+VOICE_INGEST = os.getenv('VOICE_INGEST', 'raw')
+PCM_FORMATS = {'s16le': np.int16, 'f32le': np.float32}
+# input rates a client may send; each needs its own filter bank, so arbitrary rates are refused
+SUPPORTED_SAMPLE_RATES = frozenset((8000, 11025, 16000, 22050, 24000, 32000, 44100, 48000))
+# polyphase low-pass: taps per phase (in input samples) for each unit of decimation, Kaiser beta
+RESAMPLER_TAPS_PER_RATIO = 16
+RESAMPLER_KAISER_BETA = 8.0
+
+# Binary audio frames ('audio_frame' event, one bytes argument):
+#   u8 version (1) | u8 format (0 = s16le, 1 = f32le) | u16 flags (0)
+#   u32 session id (from recognition_started; 0 = whatever session is current)
+#   u32 sequence number (per session, from 0) | u32 sample rate (one of SUPPORTED_SAMPLE_RATES)
+# all little-endian, followed by the PCM samples. Frames of an older session are
+# ignored; a jump in sequence numbers is reported as lost audio and frames that
+# arrive after a later one are dropped. The base64 'audio_data' event still works.
+AUDIO_FRAME_HEADER = struct.Struct('<BBHIII')
+AUDIO_FRAME_VERSION = 1
+AUDIO_FRAME_FORMATS = {0: 's16le', 1: 'f32le'}
+
 def load_model():
     """Load Vosk Japanese model"""
     global model
@@ -47,6 +91,372 @@ def load_model():
         logger.error(f"Failed to load model: {e}")
         return False
 
+class RecognizerPool:
+    """Pre-created KaldiRecognizers that are reset and reused between sessions"""
+
+    def __init__(self, size=VOICE_POOL_SIZE):
+        self.size = size
+        self._idle = []
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def fill(self):
+        """Create recognizers up front so the first speakers don't pay for it"""
+        while len(self._idle) < self.size:
+            self._idle.append(self._create())
+
+    def _create(self):
+        self.created += 1
+        return vosk.KaldiRecognizer(model, 16000)
+
+    def acquire(self):
+        with self._lock:
+            if self._idle:
+                self.reused += 1
+                return self._idle.pop()
+        return self._create()
+
+    def release(self, rec):
+        rec.Reset()
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(rec)
+
+    def stats(self):
+        return {'idle': len(self._idle), 'size': self.size, 'created': self.created, 'reused': self.reused}
+
+
+class RecognitionSession:
+    """Decoder state of one client"""
+
+    def __init__(self, sid, recognizer, session_id=0):
+        self.sid = sid
+        self.id = session_id
+        self.recognizer = recognizer
+        self.lock = threading.Lock()
+        self.created = time.monotonic()
+        self.last_active = self.created
+        self.chunks = 0
+        self.resampler = None
+        self.next_seq = 0
+        self.missing = 0
+        self.late = 0
+
+    def check_sequence(self, seq):
+        """Number of chunks skipped before seq, or -1 if seq arrives after a later chunk"""
+        with self.lock:
+            if seq < self.next_seq:
+                self.late += 1
+                return -1
+            skipped = seq - self.next_seq
+            self.missing += skipped
+            self.next_seq = seq + 1
+            return skipped
+
+    def resampler_for(self, sample_rate):
+        """Streaming resampler for this client's input rate (replaced if the rate changes)"""
+        if sample_rate == VOICE_SAMPLE_RATE:
+            return None
+        if self.resampler is None or self.resampler.src_rate != sample_rate:
+            self.resampler = StreamResampler(sample_rate)
+        return self.resampler
+
+
+class SessionManager:
+    """Recognition sessions keyed by Socket.IO sid (or HTTP stream key), capped and reaped when idle"""
+
+    def __init__(self, pool, max_sessions=VOICE_MAX_SESSIONS, idle_seconds=VOICE_SESSION_IDLE_SECONDS,
+                 result_grace_seconds=VOICE_STREAM_RESULT_GRACE_SECONDS):
+        self.pool = pool
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.result_grace_seconds = result_grace_seconds
+        self._sessions = {}
+        self._expired_results = {}  # HTTP stream key -> (kept until, final text)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.rejected = 0
+        self.expired = 0
+        self.missing = 0
+        self.late = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def open(self, sid):
+        """Return the client's session, starting one if needed; None when at capacity"""
+        with self._lock:
+            session = self._sessions.get(sid)
+            if session is None:
+                if len(self._sessions) >= self.max_sessions:
+                    self.rejected += 1
+                    return None
+                session = self._sessions[sid] = RecognitionSession(sid, None, next(self._ids) & 0xffffffff or 1)
+        if session.recognizer is None:
+            with session.lock:
+                if session.recognizer is None:
+                    session.recognizer = self.pool.acquire()
+        session.last_active = time.monotonic()
+        return session
+
+    def get(self, sid):
+        session = self._sessions.get(sid)
+        if session is not None:
+            session.last_active = time.monotonic()
+        return session
+
+    def close(self, sid):
+        return self._close(sid, False) is not None
+
+    def finish(self, sid):
+        """Close a session, returning the text of its last utterance (None if there was no session).
+
+        An HTTP stream that idled out was finalized then; its text is returned once within the grace period.
+        """
+        text = self._close(sid, True)
+        if text is None:
+            with self._lock:
+                kept = self._expired_results.pop(sid, None)
+            if kept is not None and kept[0] >= time.monotonic():
+                text = kept[1]
+        return text
+
+    def _close(self, sid, final):
+        with self._lock:
+            session = self._sessions.pop(sid, None)
+        if session is None:
+            return None
+        text = ''
+        with session.lock:
+            rec, session.recognizer = session.recognizer, None
+            self.missing += session.missing
+            self.late += session.late
+            if final and rec is not None:
+                text = json.loads(rec.FinalResult()).get('text', '').strip()
+        if rec is not None:
+            self.pool.release(rec)
+        return text
+
+    def expire_idle(self):
+        """Close sessions without audio for idle_seconds; returns their sids.
+
+        HTTP streams are finalized rather than dropped, since their client may still
+        call /recognize/stream/end; the text is kept for result_grace_seconds.
+        """
+        now = time.monotonic()
+        cutoff = now - self.idle_seconds
+        stale = [sid for sid, s in list(self._sessions.items()) if s.last_active < cutoff]
+        closed = []
+        for sid in stale:
+            if not sid.startswith(HTTP_STREAM_PREFIX):
+                if self.close(sid):
+                    closed.append(sid)
+                continue
+            text = self._close(sid, True)
+            if text is not None:
+                with self._lock:
+                    self._expired_results[sid] = (now + self.result_grace_seconds, text)
+                closed.append(sid)
+        with self._lock:
+            for sid in [k for k, (until, _) in self._expired_results.items() if until < now]:
+                del self._expired_results[sid]
+        self.expired += len(closed)
+        return closed
+
+    def stats(self):
+        return {
+            'active': len(self._sessions),
+            'max_sessions': self.max_sessions,
+            'idle_timeout_seconds': self.idle_seconds,
+            'rejected': self.rejected,
+            'expired': self.expired,
+            'expired_results_kept': len(self._expired_results),
+            'frames_missing': self.missing + sum(s.missing for s in list(self._sessions.values())),
+            'frames_late': self.late + sum(s.late for s in list(self._sessions.values())),
+            'pool': self.pool.stats(),
+        }
+
+
+sessions = SessionManager(RecognizerPool())
+
+
+def expire_idle_sessions():
+    """Background task: free recognizers of clients that stopped sending audio"""
+    while True:
+        socketio.sleep(max(1.0, sessions.idle_seconds / 4))
+        for sid in sessions.expire_idle():
+            logger.info(f"Recognition session {sid} closed after {sessions.idle_seconds:.0f}s idle")
+            if sid.startswith(HTTP_STREAM_PREFIX):
+                continue
+            socketio.emit('recognition_stopped', {'message': 'Recognition stopped (idle timeout)'}, to=sid)
+
+
+def supported_sample_rate(rate):
+    """rate as an int if it is one of SUPPORTED_SAMPLE_RATES, otherwise None"""
+    if isinstance(rate, bool):
+        return None
+    try:
+        rate = int(rate)
+    except (TypeError, ValueError):
+        return None
+    return rate if rate in SUPPORTED_SAMPLE_RATES else None
+
+
+@lru_cache(maxsize=16)
+def polyphase_filter(src_rate, dst_rate):
+    """(up, down, bank) for resampling src_rate -> dst_rate.
+
+    bank[p] holds phase p of a Kaiser-windowed sinc low-pass (cut at the lower
+    Nyquist of the two rates), reversed so it lines up with a window of input
+    samples that ends at the newest one. Only SUPPORTED_SAMPLE_RATES are accepted:
+    the bank grows with the reduced up/down ratio, so an odd rate would be costly.
+    """
+    if src_rate not in SUPPORTED_SAMPLE_RATES or dst_rate not in SUPPORTED_SAMPLE_RATES:
+        raise ValueError(f"Unsupported sample rate: {src_rate} -> {dst_rate}")
+    g = gcd(src_rate, dst_rate)
+    up, down = dst_rate // g, src_rate // g
+    taps = RESAMPLER_TAPS_PER_RATIO * max(1, -(-down // up))
+    length = taps * up
+    cutoff = 1.0 / max(up, down)
+    n = np.arange(length) - (length - 1) / 2.0
+    h = cutoff * np.sinc(cutoff * n) * np.kaiser(length, RESAMPLER_KAISER_BETA)
+    h *= up / h.sum()
+    bank = h.reshape(taps, up).T[:, ::-1]
+    return up, down, np.ascontiguousarray(bank, dtype=np.float32)
+
+
+class StreamResampler:
+    """Polyphase resampler to 16kHz that keeps its filter history between chunks,
+    so a stream cut into chunks comes out the same as if resampled in one piece"""
+
+    def __init__(self, src_rate, dst_rate=VOICE_SAMPLE_RATE):
+        self.src_rate = src_rate
+        self.dst_rate = dst_rate
+        self.up, self.down, self.bank = polyphase_filter(src_rate, dst_rate)
+        self.taps = self.bank.shape[1]
+        self._history = np.zeros(self.taps - 1, dtype=np.float32)
+        self._next = 0  # upsampled position of the next output, relative to the next chunk
+
+    def process(self, samples):
+        """float32 input chunk -> float32 output chunk"""
+        samples = np.asarray(samples, dtype=np.float32)
+        span = len(samples) * self.up
+        positions = np.arange(self._next, span, self.down)
+        buf = np.concatenate((self._history, samples))
+        self._history = buf[len(buf) - (self.taps - 1):]
+        self._next = (positions[-1] + self.down if len(positions) else self._next) - span
+        if not len(positions):
+            return np.zeros(0, dtype=np.float32)
+        # output n reads the window of input ending at sample positions[n] // up
+        windows = np.lib.stride_tricks.sliding_window_view(buf, self.taps)
+        if self.up == 1:
+            # plain decimation: the windows are a strided view, no gather needed
+            return windows[positions[0]::self.down][:len(positions)] @ self.bank[0]
+        return np.einsum('nk,nk->n', windows[positions // self.up], self.bank[positions % self.up])
+
+
+def resample_to_16k(audio_float, sample_rate, resampler=None):
+    """Resample float32 audio to 16kHz (one-shot unless a StreamResampler is passed)"""
+    if resampler is not None:
+        return resampler.process(audio_float)
+    out = StreamResampler(sample_rate).process(audio_float)
+    if len(out) == 0:
+        logger.error("Audio too short to resample")
+        return None
+    return out
+
+
+def to_recognizer_pcm(audio_data, sample_rate=VOICE_SAMPLE_RATE, fmt='s16le', resampler=None):
+    """Raw 16kHz int16 PCM for the recognizer.
+
+    Input that already is 16kHz int16 comes back as a memoryview over the caller's
+    buffer (no copy); anything else is converted once. Streams pass their session's
+    resampler so filter state carries over between chunks.
+    """
+    dtype = PCM_FORMATS.get(fmt)
+    if dtype is None:
+        logger.error(f"Unsupported PCM format: {fmt}")
+        return None
+    view = memoryview(audio_data).cast('B')
+    itemsize = np.dtype(dtype).itemsize
+    view = view[:len(view) - len(view) % itemsize]
+    if len(view) == 0:
+        logger.error("Audio data is empty")
+        return None
+    if dtype is np.int16 and sample_rate == VOICE_SAMPLE_RATE:
+        return view
+
+    samples = np.frombuffer(view, dtype=dtype)
+    if dtype is np.int16:
+        samples = samples.astype(np.float32) / 32768.0
+    if sample_rate != VOICE_SAMPLE_RATE:
+        samples = resample_to_16k(samples, sample_rate, resampler)
+        if samples is None:
+            return None
+    return memoryview(np.clip(samples * 32767.0, -32768, 32767).astype(np.int16)).cast('B')
+
+
+def accept_audio(rec, audio):
+    """AcceptWaveform on bytes or a PCM memoryview, without copying the view"""
+    if isinstance(audio, memoryview):
+        audio = vosk_ffi.from_buffer(audio) if vosk_ffi is not None else audio.tobytes()
+    return rec.AcceptWaveform(audio)
+
+
+def prepare_audio(audio_data, sample_rate=VOICE_SAMPLE_RATE, fmt='s16le', resampler=None):
+    """Chunk in the form the configured ingestion path feeds to accept_audio"""
+    if VOICE_INGEST == 'wav' and fmt == 's16le':
+        return convert_audio_to_wav(audio_data, sample_rate)
+    return to_recognizer_pcm(audio_data, sample_rate, fmt, resampler)
+
+
+def feed_session(session, audio_data, sample_rate=VOICE_SAMPLE_RATE, fmt='s16le'):
+    """Run one chunk through a session's recognizer.
+
+    Returns (text, is_final): the finished utterance, or the running partial.
+    None if the chunk could not be converted or the session was closed meanwhile.
+    """
+    with session.lock:
+        rec = session.recognizer
+        if rec is None:
+            return None
+        pcm = prepare_audio(audio_data, sample_rate, fmt, session.resampler_for(sample_rate))
+        if pcm is None:
+            return None
+        session.chunks += 1
+
+        # Process audio chunk
+        if len(pcm) and accept_audio(rec, pcm):
+            result = json.loads(rec.Result())
+            return result.get('text', '').strip(), True
+        result = json.loads(rec.PartialResult())
+        return result.get('partial', '').strip(), False
+
+
+def parse_audio_frame(frame):
+    """(session id, seq, sample rate, format, PCM memoryview) of a binary audio frame, or None"""
+    if not isinstance(frame, (bytes, bytearray, memoryview)) or len(frame) <= AUDIO_FRAME_HEADER.size:
+        return None
+    version, fmt, _flags, session_id, seq, sample_rate = AUDIO_FRAME_HEADER.unpack_from(frame)
+    if version != AUDIO_FRAME_VERSION or fmt not in AUDIO_FRAME_FORMATS or sample_rate not in SUPPORTED_SAMPLE_RATES:
+        return None
+    return session_id, seq, sample_rate, AUDIO_FRAME_FORMATS[fmt], memoryview(frame)[AUDIO_FRAME_HEADER.size:]
+
+
+def split_wav(data):
+    """(pcm, sample_rate) of a mono 16-bit WAV file, or None if it is something else"""
+    if not data.startswith(b'RIFF'):
+        return None
+    try:
+        with wave.open(io.BytesIO(data)) as w:
+            if w.getnchannels() != 1 or w.getsampwidth() != 2:
+                return None
+            return w.readframes(w.getnframes()), w.getframerate()
+    except (wave.Error, EOFError):
+        return None
+
+
 def convert_audio_to_wav(audio_data, sample_rate=16000):
     """Convert audio data to WAV format required by Vosk"""
     try:
@@ -55,21 +465,26 @@ def convert_audio_to_wav(audio_data, sample_rate=16000):
             logger.error("Audio data is None")
             return None
 
-        if isinstance(audio_data, bytes) and len(audio_data) == 0:
+        # raw PCM arrives as bytes, or as a bytearray / memoryview over a received frame
+        is_buffer = isinstance(audio_data, (bytes, bytearray, memoryview))
+        if is_buffer:
+            audio_data = memoryview(audio_data).cast('B')
+
+        if is_buffer and len(audio_data) == 0:
             logger.error("Audio data is empty bytes")
             return None
 
-        if not isinstance(audio_data, bytes) and len(audio_data) == 0:
+        if not is_buffer and len(audio_data) == 0:
             logger.error("Audio data array is empty")
             return None
 
         # Convert to numpy array if needed
-        if isinstance(audio_data, bytes):
+        if is_buffer:
             # Assume 16-bit PCM
             if len(audio_data) < 2:
                 logger.error(f"Audio data too small: {len(audio_data)} bytes")
                 return None
-            audio_np = np.frombuffer(audio_data, dtype=np.int16)
+            audio_np = np.frombuffer(audio_data, dtype=np.int16, count=len(audio_data) // 2)
         else:
             audio_np = np.array(audio_data, dtype=np.int16)
 
@@ -89,14 +504,9 @@ def convert_audio_to_wav(audio_data, sample_rate=16000):
 
         # Resample if necessary (Vosk expects 16kHz)
         if sample_rate != 16000:
-            # Simple resampling (in production, use better resampling)
-            ratio = 16000 / sample_rate
-            new_length = int(len(audio_float) * ratio)
-            if new_length <= 0:
-                logger.error(f"Invalid resampled length: {new_length}")
+            audio_float = resample_to_16k(audio_float, sample_rate)
+            if audio_float is None:
                 return None
-            indices = np.linspace(0, len(audio_float) - 1, new_length)
-            audio_float = np.interp(indices, np.arange(len(audio_float)), audio_float)
 
         # Convert back to 16-bit PCM
         audio_16bit = (audio_float * 32767).astype(np.int16)
@@ -117,7 +527,8 @@ def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
-        'model_loaded': model is not None
+        'model_loaded': model is not None,
+        'sessions': sessions.stats()
     })
 
 @app.route('/recognize', methods=['POST'])
@@ -154,16 +565,25 @@ def recognize_speech():
                 'success': False
             }), 400
 
-        # Convert audio to WAV format
-        wav_data = convert_audio_to_wav(audio_data)
-        if wav_data is None:
+        # Uploaded WAV files are read by their header; anything else is taken as 16kHz int16 PCM
+        sample_rate = VOICE_SAMPLE_RATE
+        wav = split_wav(audio_data)
+        if wav is not None:
+            audio_data, sample_rate = wav
+        if supported_sample_rate(sample_rate) is None:
+            return jsonify({
+                'error': f'Unsupported sample rate: {sample_rate}',
+                'success': False
+            }), 400
+        pcm = prepare_audio(audio_data, sample_rate)
+        if pcm is None:
             return jsonify({
                 'error': 'Audio conversion failed',
                 'success': False
             }), 400
 
-        # Validate WAV data size
-        if len(wav_data) < 100:
+        # Validate converted data size
+        if len(pcm) < 100:
             return jsonify({
                 'error': 'Converted audio too small',
                 'success': False
@@ -173,7 +593,7 @@ def recognize_speech():
         rec = vosk.KaldiRecognizer(model, 16000)
 
         # Process audio
-        rec.AcceptWaveform(wav_data)
+        accept_audio(rec, pcm)
 
         # Get result
         result = json.loads(rec.Result())
@@ -195,9 +615,57 @@ def recognize_speech():
             'success': False
         }), 500
 
+@app.route('/recognize/stream/start', methods=['POST'])
+def recognize_stream_start():
+    """Open a streaming session for /recognize/stream?stream=<stream_id>"""
+    if model is None:
+        return jsonify({
+            'error': 'Model not loaded',
+            'success': False
+        }), 500
+
+    stream_id = uuid.uuid4().hex
+    session = sessions.open(HTTP_STREAM_PREFIX + stream_id)
+    if session is None:
+        logger.warning(f"Recognition session limit reached ({sessions.max_sessions})")
+        return jsonify({
+            'error': 'Too many concurrent recognition sessions',
+            'success': False
+        }), 503
+
+    logger.info(f"Started HTTP recognition stream {stream_id}")
+    return jsonify({
+        'success': True,
+        'stream_id': stream_id,
+        'idle_timeout_seconds': sessions.idle_seconds
+    })
+
+@app.route('/recognize/stream/end', methods=['POST'])
+def recognize_stream_end():
+    """Finalize a streaming session and return the text of its last utterance"""
+    stream_id = request.args.get('stream', '')
+    text = sessions.finish(HTTP_STREAM_PREFIX + stream_id) if stream_id else None
+    if text is None:
+        return jsonify({
+            'error': 'Unknown or expired stream',
+            'success': False
+        }), 404
+
+    logger.info(f"Finished HTTP recognition stream {stream_id}: '{text}'")
+    return jsonify({
+        'success': True,
+        'stream_id': stream_id,
+        'text': text
+    })
+
 @app.route('/recognize/stream', methods=['POST'])
 def recognize_stream():
-    """Streaming speech recognition endpoint"""
+    """Streaming speech recognition endpoint.
+
+    With ?stream=<id> (from /recognize/stream/start) chunks go to that session's
+    live recognizer, so partials grow across requests; ?seq= enables lost/late
+    chunk detection. Without it each chunk is recognized on its own.
+    """
     try:
         if model is None:
             return jsonify({
@@ -222,31 +690,53 @@ def recognize_stream():
                 'success': False
             }), 400
 
-        # Convert audio to WAV format for consistent processing
-        wav_data = convert_audio_to_wav(audio_data)
-        if wav_data is None:
+        # Raw PCM; ?sample_rate= and ?format= (s16le, f32le) describe it when it isn't 16kHz int16
+        sample_rate = supported_sample_rate(request.args.get('sample_rate', VOICE_SAMPLE_RATE))
+        if sample_rate is None:
             return jsonify({
-                'error': 'Audio conversion failed',
+                'error': f"Unsupported sample rate: {request.args.get('sample_rate')}",
                 'success': False
             }), 400
-
-        # Create recognizer
-        rec = vosk.KaldiRecognizer(model, 16000)
-
-        # Process audio
-        if rec.AcceptWaveform(wav_data):
-            result = json.loads(rec.Result())
+        fmt = request.args.get('format', 's16le')
+        stream_id = request.args.get('stream')
+
+        if stream_id:
+            session = sessions.get(HTTP_STREAM_PREFIX + stream_id)
+            if session is None:
+                return jsonify({
+                    'error': 'Unknown or expired stream',
+                    'success': False
+                }), 404
+            response = {'success': True, 'stream_id': stream_id}
+            seq = request.args.get('seq', type=int)
+            if seq is not None:
+                skipped = session.check_sequence(seq)
+                if skipped < 0:
+                    logger.warning(f"Stream {stream_id}: dropped late chunk {seq}")
+                    return jsonify(dict(response, dropped=True, text='', partial=''))
+                if skipped:
+                    logger.warning(f"Stream {stream_id}: {skipped} chunks lost before {seq}")
+                    response['missing'] = skipped
+            result = feed_session(session, audio_data, sample_rate, fmt)
         else:
-            result = json.loads(rec.PartialResult())
+            # One-shot chunk on a pooled recognizer
+            response = {'success': True}
+            one_shot = RecognitionSession(None, sessions.pool.acquire())
+            try:
+                result = feed_session(one_shot, audio_data, sample_rate, fmt)
+            finally:
+                sessions.pool.release(one_shot.recognizer)
+
+        if result is None:
+            return jsonify({
+                'error': 'Audio conversion failed',
+                'success': False
+            }), 400
 
-        text = result.get('text', '').strip()
-        partial = result.get('partial', '').strip()
-
-        return jsonify({
-            'success': True,
-            'text': text,
-            'partial': partial
-        })
+        text, is_final = result
+        response['text'] = text if is_final else ''
+        response['partial'] = '' if is_final else text
+        return jsonify(response)
 
     except Exception as e:
         logger.error(f"Stream recognition error: {e}")
@@ -265,6 +755,7 @@ def handle_connect():
 def handle_disconnect():
     """Handle WebSocket disconnection"""
     logger.info("Client disconnected")
+    sessions.close(request.sid)
 
 @socketio.on('start_recognition')
 def handle_start_recognition(data):
@@ -274,11 +765,17 @@ def handle_start_recognition(data):
             emit('error', {'message': 'Model not loaded'})
             return
 
-        logger.info("Starting real-time speech recognition")
-        emit('recognition_started', {'message': 'Recognition started'})
+        # Start from a clean decoder even if this client already had a session
+        sessions.close(request.sid)
+        session = sessions.open(request.sid)
+        if session is None:
+            logger.warning(f"Recognition session limit reached ({sessions.max_sessions})")
+            emit('error', {'message': 'Too many concurrent recognition sessions'})
+            return
 
-        # Create recognizer for this session
-        rec = vosk.KaldiRecognizer(model, 16000)
+        logger.info("Starting real-time speech recognition")
+        # session id goes into the header of binary audio frames
+        emit('recognition_started', {'message': 'Recognition started', 'session': session.id})
 
     except Exception as e:
         logger.error(f"Failed to start recognition: {e}")
@@ -313,53 +810,85 @@ def handle_audio_data(data):
             logger.warning(f"Audio chunk too small: {len(audio_data)} bytes")
             return
 
-        # Convert audio to WAV format for consistent processing
-        wav_data = convert_audio_to_wav(audio_data)
-        if wav_data is None:
-            logger.warning("Audio conversion failed for WebSocket data")
+        # Fed as is when it already is 16kHz int16; sample_rate/format describe other input
+        sample_rate = supported_sample_rate(data.get('sample_rate') or VOICE_SAMPLE_RATE)
+        if sample_rate is None:
+            emit('error', {'message': f"Unsupported sample rate: {data.get('sample_rate')}"})
+            return
+        recognize_chunk(audio_data, sample_rate, data.get('format') or 's16le', data.get('seq'))
+
+    except Exception as e:
+        logger.error(f"Audio processing error: {e}")
+        emit('error', {'message': str(e)})
+
+@socketio.on('audio_frame')
+def handle_audio_frame(frame):
+    """Process a binary audio frame (header + raw PCM, see AUDIO_FRAME_HEADER)"""
+    try:
+        if model is None:
+            emit('error', {'message': 'Model not loaded'})
             return
 
-        # Create recognizer if not exists (per connection)
-        if not hasattr(handle_audio_data, 'recognizer'):
-            handle_audio_data.recognizer = vosk.KaldiRecognizer(model, 16000)
+        parsed = parse_audio_frame(frame)
+        if parsed is None:
+            emit('error', {'message': 'Invalid audio frame'})
+            return
+        session_id, seq, sample_rate, fmt, pcm = parsed
 
-        rec = handle_audio_data.recognizer
+        current = sessions.get(request.sid)
+        if session_id and (current is None or current.id != session_id):
+            return  # straggler from a session that was stopped or restarted
 
-        # Process audio chunk
-        if rec.AcceptWaveform(wav_data):
-            result = json.loads(rec.Result())
-            text = result.get('text', '').strip()
-            if text:
-                logger.info(f"Recognized: {text}")
-                emit('recognition_result', {
-                    'text': text,
-                    'is_final': True
-                })
-        else:
-            partial_result = json.loads(rec.PartialResult())
-            partial_text = partial_result.get('partial', '').strip()
-            if partial_text:
-                emit('recognition_result', {
-                    'text': partial_text,
-                    'is_final': False
-                })
+        recognize_chunk(pcm, sample_rate, fmt, seq)
 
     except Exception as e:
-        logger.error(f"Audio processing error: {e}")
+        logger.error(f"Audio frame processing error: {e}")
         emit('error', {'message': str(e)})
 
+def recognize_chunk(audio, sample_rate, fmt, seq=None):
+    """Feed one chunk of the calling client's stream and emit the result"""
+    # Recognizer of this connection (started implicitly if the client skipped start_recognition)
+    session = sessions.open(request.sid)
+    if session is None:
+        emit('error', {'message': 'Too many concurrent recognition sessions'})
+        return
+
+    if seq is not None:
+        skipped = session.check_sequence(seq)
+        if skipped < 0:
+            logger.warning(f"Dropped late audio chunk {seq} (expected {session.next_seq})")
+            return
+        if skipped:
+            logger.warning(f"{skipped} audio chunks lost before {seq}")
+            emit('audio_gap', {'seq': seq, 'missing': skipped})
+
+    result = feed_session(session, audio, sample_rate, fmt)
+    if result is None:
+        logger.warning("Audio conversion failed for WebSocket data")
+        return
+
+    text, is_final = result
+    if text:
+        if is_final:
+            logger.info(f"Recognized: {text}")
+        emit('recognition_result', {
+            'text': text,
+            'is_final': is_final
+        })
+
 @socketio.on('stop_recognition')
 def handle_stop_recognition():
     """Stop speech recognition"""
     logger.info("Stopping speech recognition")
     emit('recognition_stopped', {'message': 'Recognition stopped'})
 
-    # Clean up recognizer
-    if hasattr(handle_audio_data, 'recognizer'):
-        delattr(handle_audio_data, 'recognizer')
+    # Return this client's recognizer to the pool
+    sessions.close(request.sid)
 
 if __name__ == '__main__':
     if load_model():
+        sessions.pool.fill()
+        socketio.start_background_task(expire_idle_sessions)
         logger.info("Starting Vosk voice recognition server on port 5000")
         socketio.run(app, host='0.0.0.0', port=5000, debug=False)
     else: